@@ -12,6 +12,7 @@ import traceback
 from xml.dom import minidom, Node
 
 from Component import Component
+from ConfigRegistry import ConfigRegistry
 from i3helper import Comparable, reraise_excinfo
 from locate_pdaq import find_pdaq_config
 from xmlparser import XMLBadFileError, XMLFormatError, XMLParser
@@ -57,6 +58,10 @@ class ConfigXMLBase(XMLParser):
     def config_name(self):
         return self.__config_name
 
+    @property
+    def path(self):
+        return self.__path
+
     def extract_from(self, dom):
         raise NotImplementedError('extract_from method is not implemented')
 
@@ -737,6 +742,24 @@ class ClusterDescription(ConfigXMLBase):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def get(cls, config_dir=None, config_name=None):
+        """
+        Return the cluster description, reusing the cached copy if the
+        file hasn't changed
+        """
+        if config_name is None:
+            config_name = cls.get_cluster_name()
+        if config_dir is None:
+            config_dir = find_pdaq_config()
+
+        def loader():
+            cdesc = ClusterDescription(config_dir, config_name)
+            return cdesc, (cdesc.path, )
+
+        return ConfigRegistry.instance().get(("cluster", config_dir,
+                                              config_name), loader)
+
     @classmethod
     def __parse_component_node(cls, cluster_name, defaults, host, node):
         "Parse a <component> node from a cluster configuration file"
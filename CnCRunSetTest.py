@@ -12,9 +12,9 @@ from CnCExceptions import CnCServerException, MissingComponentException
 from CnCServer import CnCServer
 from DAQConst import DAQPort
 from DAQLog import LogSocketServer
-from DAQMocks import MockClusterConfig, MockDefaultDomGeometryFile, \
-    MockIntervalTimer, MockLeapsecondFile, MockLogger, MockRunConfigFile, \
-    RunXMLValidator, SocketReader
+from DAQMocks import MockCacheDirectory, MockClusterConfig, \
+    MockDefaultDomGeometryFile, MockIntervalTimer, MockLeapsecondFile, \
+    MockLogger, MockRunConfigFile, RunXMLValidator, SocketReader
 from DAQTime import PayloadTime
 from LiveImports import LIVE_IMPORT
 from MonitorTask import MonitorTask
@@ -350,7 +350,8 @@ class MyRunSet(RunSet):
     @classmethod
     def cycle_components(cls, comp_list, config_dir, daq_data_dir, logger,
                          verbose=False, kill_with_9=False, event_check=False,
-                         check_exists=True):
+                         check_exists=True, registered=None,
+                         max_parallel=None):
         comp_str = ComponentManager.format_component_list(comp_list)
         logger.error("Cycling components %s" % comp_str)
 
@@ -1185,5 +1186,14 @@ class CnCRunSetTest(unittest.TestCase):
         live_moni.stop_serving()
 
 
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
+
 if __name__ == '__main__':
     unittest.main()
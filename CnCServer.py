@@ -26,6 +26,7 @@ from CnCLogger import CnCLogger
 from CompOp import ComponentGroup, OpClose, OpGetConnectionInfo, OpGetState, \
     OpResetComponent
 from ComponentManager import ComponentManager
+from ComponentStateBoard import ComponentStateBoard
 from DAQClient import ComponentName, DAQClient, DAQClientState
 from DAQConfig import DAQConfigException, DAQConfigParser
 from DAQConst import DAQPort
@@ -34,10 +35,12 @@ from DAQLog import LogSocketServer
 from DAQRPC import RPCClient, RPCServer
 from Daemon import Daemon
 from DumpThreads import DumpThreadsOnSignal
+from FinalizeQueue import FinalizeQueue
 from ListOpenFiles import ListOpenFiles
 from Process import find_python_process
 from RunSet import RunSet
 from RunSetState import RunSetState
+from RunTimeline import RunTimeline, timed_step, timeline_span
 from i3helper import reraise_excinfo
 from locate_pdaq import find_pdaq_config, find_pdaq_trunk
 from scmversion import get_scmversion, get_scmversion_str
@@ -55,6 +58,13 @@ PDAQ_HOME = find_pdaq_trunk()
 class DAQPool(object):
     "Pool of DAQClients and RunSets"
 
+    # components which pushed their state this recently are known to be
+    # alive and aren't polled by monitor_clients()...
+    PUSHED_STATE_SECS = 10.0
+    # ...unless they haven't been polled for this long, since a hung
+    # component may still be pushing from its ping thread
+    PUSHER_POLL_SECS = 60.0
+
     def __init__(self):
         "Create an empty pool"
         self.__pool = {}
@@ -63,8 +73,15 @@ class DAQPool(object):
         self.__sets = []
         self.__sets_lock = threading.RLock()
 
+        # stopped runset which is still configured and connected, and which
+        # will be reused if the next run uses the same run configuration
+        self.__warm_runset = None
+
         self.__starting = False
 
+        # (name, num) -> time of the last monitor_clients() poll
+        self.__last_polled = {}
+
         super(DAQPool, self).__init__()
 
     def __add_to_pool(self, comp):
@@ -187,6 +204,13 @@ class DAQPool(object):
                                      (run_config_name, run_config_dir), ex)
         logger.info("Loaded run configuration \"%s\"" % run_config_name)
 
+        with timeline_span("reuseRunset", "cnc"):
+            runset = self.__reuse_warm_runset(run_config, logger)
+        if runset is not None:
+            cstr = ComponentManager.format_component_list(runset.components)
+            logger.info("Reusing warm runset #%d: %s" % (runset.id, cstr))
+            return runset
+
         name_list = []
         for comp in run_config.components:
             name_list.append(comp.fullname)
@@ -268,6 +292,8 @@ class DAQPool(object):
         This method can throw ValueError if the runset is not found
         """
         with self.__sets_lock:
+            if runset is self.__warm_runset:
+                self.__warm_runset = None
             self.__sets.remove(runset)
 
     def __restart_missing_components(self, wait_list, run_config, logger,
@@ -296,6 +322,49 @@ class DAQPool(object):
             for comp in comp_list:
                 self.__add_to_pool(comp)
 
+    def __reuse_warm_runset(self, run_config, logger):
+        """
+        If the warm runset (if any) was built from this exact run
+        configuration and all its components are still ready, return it.
+        Otherwise return the warm runset's components to the pool so they
+        can be used to build a new runset, and return None.
+        """
+        with self.__sets_lock:
+            runset = self.__warm_runset
+            self.__warm_runset = None
+
+        if runset is None:
+            return None
+
+        # the parser returns the cached configuration object until one of
+        # its files changes, so a different object means a different config
+        if runset.run_config_data is not run_config:
+            reason = "run configuration changed"
+        elif not runset.is_ready:
+            reason = "runset is %s" % (runset.state, )
+        else:
+            reason = None
+            for comp, state in list(runset.status().items()):
+                if state != RunSetState.READY:
+                    reason = "%s is %s" % (comp.fullname, state)
+                    break
+
+        if reason is None:
+            try:
+                if run_config.update_hitspool_times:
+                    runset.init_replay_hubs()
+                return runset
+            except:  # pylint: disable=bare-except
+                reason = "cannot initialize replay hubs: " + exc_string()
+
+        logger.info("Not reusing warm runset #%d (%s)" % (runset.id, reason))
+        try:
+            self.return_runset(runset, logger)
+        except:  # pylint: disable=bare-except
+            logger.error("Failed to return warm %s: %s" %
+                         (runset, exc_string()))
+        return None
+
     def add(self, comp):
         "Add the component to the config server's pool"
         with self.__pool_lock:
@@ -314,13 +383,19 @@ class DAQPool(object):
     def create_runset(self, run_config, comp_list, logger):
         return RunSet(self, run_config, comp_list, logger)
 
-    # pylint: disable=no-self-use
+    @property
+    def finalize_queue(self):  # pylint: disable=no-self-use
+        "Queue used to send stopped runs' files to JADE (None if unused)"
+        return None
+
     def cycle_components(self, comp_list, run_config_dir, daq_data_dir, logger,
                          verbose=False, kill_with_9=False, event_check=False):
         RunSet.cycle_components(comp_list, run_config_dir, daq_data_dir,
                                 logger, verbose=verbose,
                                 kill_with_9=kill_with_9,
-                                event_check=event_check)
+                                event_check=event_check,
+                                registered=self.registered_names,
+                                max_parallel=self.restart_parallel)
 
     def find_runset(self, rsid):
         "Find the runset with the specified ID"
@@ -346,6 +421,24 @@ class DAQPool(object):
     def is_starting(self):
         return self.__starting
 
+    def keep_runset_warm(self, runset, logger):
+        """
+        Leave a stopped runset configured and connected so the next
+        make_runset() for the same run configuration can reuse it.  Only one
+        runset is kept warm; any previous one is returned to the pool.
+        """
+        with self.__sets_lock:
+            old_runset = self.__warm_runset
+            self.__warm_runset = runset
+
+        if old_runset is not None and old_runset is not runset:
+            self.return_runset(old_runset, logger)
+
+    @property
+    def warm_runset(self):
+        return self.__warm_runset
+
+    @timed_step("makeRunset", "cnc")
     def make_runset(self, run_config_dir, run_config_name, run_num, timeout,
                     logger, daq_data_dir, force_restart=True, strict=False):
         "Build a runset from the specified run configuration"
@@ -363,10 +456,25 @@ class DAQPool(object):
         "check that all components in the pool are still alive"
         count = 0
 
+        board = ComponentStateBoard.instance()
+        now = time.time()
+
         clients = []
+        last_polled = {}
         for pool_bin in list(self.__pool.values()):
             for client in pool_bin:
-                clients.append(client)
+                key = (client.name, client.num)
+                polled = self.__last_polled.get(key)
+                if polled is not None and \
+                  now - polled < self.PUSHER_POLL_SECS and \
+                  board.pushed_within(client.name, client.num,
+                                      self.PUSHED_STATE_SECS):
+                    last_polled[key] = polled
+                    count += 1
+                else:
+                    last_polled[key] = now
+                    clients.append(client)
+        self.__last_polled = last_polled
 
         states = ComponentGroup.run_simple(OpGetState, clients, (), logger)
         for client in clients:
@@ -413,6 +521,10 @@ class DAQPool(object):
     def release(self):
         return (None, None)
 
+    def registered_names(self):
+        "Return the full names of all components waiting in the pool"
+        return [comp.fullname for comp in self.components]
+
     def remove(self, comp):
         "Remove a component from the pool"
         with self.__pool_lock:
@@ -424,6 +536,11 @@ class DAQPool(object):
 
         return comp
 
+    @property
+    def restart_parallel(self):  # pylint: disable=no-self-use
+        "Maximum number of hosts whose components are restarted at once"
+        return None
+
     def restart_runset(self, runset, logger, verbose=False, kill_with_9=False,
                        event_check=False):
         try:
@@ -459,6 +576,7 @@ class DAQPool(object):
                     return False
             removed = self.__sets[:]
             del self.__sets[:]
+            self.__warm_runset = None
 
         saved_exc = None
         for runset in removed:
@@ -596,12 +714,17 @@ class CnCServer(DAQPool):
     # max time to wait for components to register
     REGISTRATION_TIMEOUT = 60
 
+    # subdirectory of the log directory holding pending finalize jobs
+    FINALIZE_SPOOL = ".finalize"
+    # max time to wait for running finalize jobs when closing the server
+    FINALIZE_CLOSE_SECS = 10.0
+
     def __init__(self, name="GenericServer", cluster_desc=None, copy_dir=None,
                  dash_dir=None, default_log_dir=None, run_config_dir=None,
                  daq_data_dir=None, jade_dir=None, log_host=None,
                  log_port=None, live_host=None, live_port=None,
-                 restart_on_error=True, force_restart=True, test_only=False,
-                 quiet=False):
+                 restart_on_error=True, force_restart=True, keep_warm=False,
+                 restart_parallel=None, test_only=False, quiet=False):
         "Create a DAQ command and configuration server"
         self.__name = name
         self.__version_info = get_scmversion()
@@ -621,6 +744,8 @@ class CnCServer(DAQPool):
 
         self.__restart_on_error = restart_on_error
         self.__force_restart = force_restart
+        self.__keep_warm = keep_warm
+        self.__restart_parallel = restart_parallel
         self.__quiet = quiet
 
         self.__monitoring = False
@@ -655,6 +780,14 @@ class CnCServer(DAQPool):
 
         self.__log.open_log(log_host, log_port, live_host, live_port)
 
+        if default_log_dir is None:
+            self.__finalize_queue = None
+        else:
+            spool_dir = os.path.join(default_log_dir, self.FINALIZE_SPOOL)
+            self.__finalize_queue = \
+                FinalizeQueue(self.__log, spool_dir,
+                              use_processes=not test_only)
+
         if test_only:
             self.__server = None
         else:
@@ -677,8 +810,10 @@ class CnCServer(DAQPool):
                 self.rpc_component_list_bean_fields)
             self.__server.register_function(self.rpc_component_list_dicts)
             self.__server.register_function(self.rpc_component_register)
+            self.__server.register_function(self.rpc_component_state)
             self.__server.register_function(self.rpc_cycle_live)
             self.__server.register_function(self.rpc_end_all)
+            self.__server.register_function(self.rpc_finalize_status)
             self.__server.register_function(self.rpc_list_open_files)
             self.__server.register_function(self.rpc_ping)
             self.__server.register_function(self.rpc_register_component)
@@ -863,6 +998,8 @@ class CnCServer(DAQPool):
         try:
             if self.__force_restart or (had_error and self.__restart_on_error):
                 self.restart_runset(runset, self.__log)
+            elif self.__keep_warm and not had_error and runset.is_ready:
+                self.keep_runset_warm(runset, self.__log)
             else:
                 self.return_runset(runset, self.__log)
         except:  # pylint: disable=bare-except
@@ -892,6 +1029,9 @@ class CnCServer(DAQPool):
         ComponentGroup.run_simple(OpClose, self.components, (), self.__log,
                                   report_errors=True)
 
+        if self.__finalize_queue is not None:
+            self.__finalize_queue.stop(self.FINALIZE_CLOSE_SECS)
+
         self.__log.close_final()
         if self.__log_server is not None:
             self.__log_server.stop_serving()
@@ -939,6 +1079,10 @@ class CnCServer(DAQPool):
 
         return self.__cluster_config
 
+    @property
+    def finalize_queue(self):
+        return self.__finalize_queue
+
     @property
     def release(self):
         return (self.__version_info["release"],
@@ -1001,6 +1145,10 @@ class CnCServer(DAQPool):
         log_name = os.path.join(log_dir, "catchall.log")
         return LogSocketServer(port, "CnCServer", log_name, quiet=self.__quiet)
 
+    @property
+    def restart_parallel(self):
+        return self.__restart_parallel
+
     def restart_runset_components(self, runset, verbose=False,
                                   kill_with_9=True, event_check=False):
         clu_cfg = self.get_cluster_config(run_config=runset.run_config_data)
@@ -1149,6 +1297,9 @@ class CnCServer(DAQPool):
                 raise CnCServerException(errmsg)
             connectors.append(Connector(conn[0], conn[1], conn_port))
 
+        # forget any state pushed by a previous incarnation
+        ComponentStateBoard.instance().forget(name, num)
+
         client = self.create_client(name, num, host, port, mbean_port,
                                     connectors)
 
@@ -1182,6 +1333,25 @@ class CnCServer(DAQPool):
                 "livePort": live_port,
                 "serverId": self.__id}
 
+    def rpc_component_state(self, name, num, state, transition=None):
+        """
+        remote method for components to report a state change (also
+        serves as a ping).  Components which number their transitions
+        should pass the number of the transition which reached 'state'.
+        """
+        if not isinstance(name, str) or name == "":
+            raise CnCServerException("Bad component name (should be a string)")
+        if not isinstance(num, int):
+            raise CnCServerException("Bad component number" +
+                                     " (should be an integer)")
+        if transition is not None and not isinstance(transition, int):
+            raise CnCServerException("Bad transition number" +
+                                     " (should be an integer)")
+
+        ComponentStateBoard.instance().update(name, num, str(state),
+                                              transition=transition)
+        return self.__id
+
     def rpc_cycle_live(self):
         "Restart DAQLive thread"
         self.__live.close()
@@ -1195,6 +1365,12 @@ class CnCServer(DAQPool):
                                   self.__log, report_errors=True)
         return 1
 
+    def rpc_finalize_status(self):
+        "return the status of the queue of stopped runs' JADE files"
+        if self.__finalize_queue is None:
+            return {}
+        return self.__finalize_queue.status()
+
     def rpc_list_open_files(self):
         "list open files"
         of_list = self.__list_cnc_open_files()
@@ -1422,6 +1598,14 @@ class CnCServer(DAQPool):
         thrd.setDaemon(True)
         thrd.start()
 
+        # finish queueing runs which were left over by the last CnCServer
+        if self.__finalize_queue is not None:
+            try:
+                self.__finalize_queue.recover()
+            except:  # pylint: disable=bare-except
+                self.__log.error("Cannot recover finalize jobs: " +
+                                 exc_string())
+
         try:
             self.__live = self.start_live_thread()
         except:  # pylint: disable=bare-except
@@ -1471,12 +1655,20 @@ class CnCServer(DAQPool):
         clu_cfg = self.get_cluster_config(run_config=runset.run_config_data)
         success = False
 
+        # continue the caller's timeline (if any) so the trace written to
+        # the run directory also covers building the runset
+        timeline = RunTimeline.active()
+        if timeline is None:
+            timeline = RunTimeline("run %d" % (run_num, ))
+
         failed_trace = None
         try:
-            runset.start_run(run_num, clu_cfg, run_options,
-                             self.__version_info, self.__jade_dir,
-                             copy_dir=self.__copy_dir, log_dir=log_dir,
-                             quiet=self.__quiet)
+            with RunTimeline.activated(timeline), \
+              timeline_span("startRun", "cnc"):
+                runset.start_run(run_num, clu_cfg, run_options,
+                                 self.__version_info, self.__jade_dir,
+                                 copy_dir=self.__copy_dir, log_dir=log_dir,
+                                 quiet=self.__quiet)
             success = True
         except:  # pylint: disable=bare-except
             failed_trace = traceback.format_exc()
@@ -1559,6 +1751,10 @@ def main():
                         dest="default_log_dir",
                         default="/mnt/data/pdaq/log",
                         help="Default directory for pDAQ log/monitoring files")
+    parser.add_argument("-P", "--restart-parallel", type=int,
+                        dest="restart_parallel",
+                        help=("Maximum number of hosts whose components are"
+                              " restarted at the same time"))
     parser.add_argument("-q", "--data-dir", dest="daq_data_dir",
                         default="/mnt/data/pdaqlocal",
                         help="Directory holding physics/tcal/moni/sn files")
@@ -1575,8 +1771,17 @@ def main():
     parser.add_argument("-v", "--verbose", dest="quiet",
                         action="store_false", default=True,
                         help="Write catchall messages to console")
+    parser.add_argument("-w", "--keep-warm", dest="keep_warm",
+                        action="store_true", default=False,
+                        help=("Keep stopped runsets configured so the next"
+                              " run with the same run configuration can"
+                              " reuse them (requires -F)"))
     args = parser.parse_args()
 
+    if args.keep_warm and args.force_restart:
+        print("WARNING: --keep-warm has no effect without"
+              " --no-force-restart", file=sys.stderr)
+
     pids = list(find_python_process(os.path.basename(sys.argv[0])))
 
     if args.kill:
@@ -1650,7 +1855,9 @@ def main():
                     default_log_dir=args.default_log_dir,
                     log_host=log_host, log_port=log_port, live_host=live_host,
                     live_port=live_port, force_restart=args.force_restart,
-                    test_only=False, quiet=args.quiet)
+                    keep_warm=args.keep_warm,
+                    restart_parallel=args.restart_parallel, test_only=False,
+                    quiet=args.quiet)
     try:
         cnc.run()
     except KeyboardInterrupt:
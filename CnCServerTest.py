@@ -28,9 +28,9 @@ from RunSet import RunData, RunSet
 from locate_pdaq import set_pdaq_config_dir
 
 from DAQMocks \
-    import MockClusterConfig, MockCnCLogger, MockDefaultDomGeometryFile, \
-    MockLeapsecondFile, MockLogger, MockRunConfigFile, SocketReaderFactory, \
-    SocketWriter
+    import MockCacheDirectory, MockClusterConfig, MockCnCLogger, \
+    MockDefaultDomGeometryFile, MockLeapsecondFile, MockLogger, \
+    MockRunConfigFile, SocketReaderFactory, SocketWriter
 
 
 class MostlyDAQClient(DAQClient):
@@ -144,6 +144,9 @@ class MostlyRunSet(RunSet):
     LOGFACTORY = SocketReaderFactory()
     LOGDICT = {}
 
+    # end-of-run steps, in the order they were run
+    FINISH_STEPS = []
+
     def __init__(self, parent, run_config, cluster_config, components,
                  catchall, dashlog):
         self.__run_config = run_config
@@ -187,11 +190,14 @@ class MostlyRunSet(RunSet):
 
     def cycle_components(self, comp_list, config_dir, daq_data_dir, logger,
                          verbose=False, kill_with_9=False, event_check=False,
-                         check_exists=True):
+                         check_exists=True, registered=None,
+                         max_parallel=None):
         logger.error("Cycling components %s" %
                      (ComponentManager.format_component_list(comp_list), ))
 
     def final_report(self, comps, run_data, had_error=False, switching=False):
+        MostlyRunSet.FINISH_STEPS.append("final_report")
+
         num_evts = 600
         num_moni = 0
         num_sn = 0
@@ -289,7 +295,7 @@ class MostlyCnCServer(CnCServer):
                                                   start_server=False)
 
     def save_catchall(self, run_dir):
-        pass
+        MostlyRunSet.FINISH_STEPS.append("save_catchall")
 
     def start_live_thread(self):
         return None
@@ -952,6 +958,8 @@ class CnCServerTest(unittest.TestCase):
             dashlog.add_expected_exact("Not logging to file so cannot queue"
                                        " to JADE")
 
+            del MostlyRunSet.FINISH_STEPS[:]
+
             self.cnc.rpc_runset_switch_run(set_id, new_num)
 
             _ = rate_tracker.get_totals()
@@ -964,6 +972,10 @@ class CnCServerTest(unittest.TestCase):
                 for log in comp.loggers:
                     log.check_status(100)
 
+            # catchall.log is moved after the final report is logged
+            self.assertEqual(["final_report", "save_catchall"],
+                             MostlyRunSet.FINISH_STEPS)
+
             rate_tracker.reset()
 
         for _ in range(5):
@@ -1043,5 +1055,14 @@ class CnCServerTest(unittest.TestCase):
         self.__run_everything(switch_run=True)
 
 
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,6 +4,7 @@
 """
 
 from DAQClient import BeanTimeoutException
+from RunTimeline import RunTimeline, timeline_span
 from ThreadGroup import GThread, ThreadGroup
 from decorators import classproperty
 
@@ -250,11 +251,20 @@ class ComponentThread(GThread):
         self.__logger = logger
         self.__result = None
 
+        # record the operation in the creator's run timeline (if any)
+        self.__timeline = RunTimeline.active()
+
         name = "%s->%s" % (self.__comp, self.__operation.name)
         super(ComponentThread, self).__init__(target=self.__execute, name=name)
 
     def __execute(self):
-        self.__result = self.__operation.execute(self.__comp, self.__args)
+        if self.__timeline is None:
+            self.__result = self.__operation.execute(self.__comp, self.__args)
+        else:
+            with self.__timeline.span(self.__operation.name, "component",
+                                      lane=self.__comp.fullname):
+                self.__result = self.__operation.execute(self.__comp,
+                                                         self.__args)
 
     @property
     def component(self):
@@ -336,9 +346,10 @@ class ComponentGroup(ThreadGroup):
     def run_simple(operation, comps, args, logger, wait_secs=2, wait_reps=4,
                    full_result=False, report_errors=False):
         group = ComponentGroup(operation)
-        for comp in comps:
-            group.run_thread(comp, args, logger=logger)
-        group.wait(wait_secs=wait_secs, reps=wait_reps)
+        with timeline_span(operation.name, "group"):
+            for comp in comps:
+                group.run_thread(comp, args, logger=logger)
+            group.wait(wait_secs=wait_secs, reps=wait_reps)
         if report_errors:
             if group.report_errors(logger, operation.name):
                 return None
@@ -12,7 +12,8 @@ import unittest
 from CachedConfigName import CachedFile
 from ComponentManager import ComponentManager
 from DAQConst import DAQPort
-from DAQMocks import MockParallelShell, MockDeployComponent
+from DAQMocks import MockCacheDirectory, MockParallelShell, \
+    MockDeployComponent
 from DAQRPC import RPCServer
 from RunSetState import RunSetState
 
@@ -528,5 +529,14 @@ def main():
     unittest.main()
 
 
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Process-wide record of the component states pushed to CnCServer.
+
+Components which support it call CnCServer's `rpc_component_state()`
+whenever they change state, and code which would otherwise poll every
+component with `getState` can wait on the board instead.  Every update
+bumps a sequence number so waiters can tell which states arrived after
+they started waiting.  Components may number their transitions so a ping
+which was sent before a transition but arrived after it can't overwrite
+the newer state.
+"""
+
+import threading
+import time
+
+
+class ComponentStateBoard(object):
+    "Latest pushed state for each component, with change notification"
+
+    # cached singleton instance
+    __INSTANCE = None
+    __INSTANCE_LOCK = threading.Lock()
+
+    def __init__(self):
+        # (name, num) -> (sequence number, state, update time, transition)
+        self.__states = {}
+        self.__sequence = 0
+        self.__cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.__states)
+
+    def clear(self):
+        "Forget all pushed states"
+        with self.__cond:
+            self.__states.clear()
+
+    def forget(self, name, num):
+        "Forget the state pushed by component 'name#num'"
+        with self.__cond:
+            if (name, num) in self.__states:
+                del self.__states[(name, num)]
+
+    def get(self, name, num, since=None):
+        """
+        Return the latest state pushed by component 'name#num', or None if
+        it hasn't pushed anything (after sequence number 'since')
+        """
+        with self.__cond:
+            entry = self.__states.get((name, num))
+        if entry is None or (since is not None and entry[0] <= since):
+            return None
+        return entry[1]
+
+    def has_pushed(self, name, num):
+        "Return True if component 'name#num' has pushed its state"
+        with self.__cond:
+            return (name, num) in self.__states
+
+    @classmethod
+    def instance(cls):
+        "Return the process-wide state board"
+        with cls.__INSTANCE_LOCK:
+            if cls.__INSTANCE is None:
+                cls.__INSTANCE = ComponentStateBoard()
+            return cls.__INSTANCE
+
+    def pushed_within(self, name, num, secs):
+        "Return True if component 'name#num' pushed its state recently"
+        with self.__cond:
+            entry = self.__states.get((name, num))
+        return entry is not None and time.time() - entry[2] < secs
+
+    @property
+    def sequence(self):
+        "Sequence number of the most recent update"
+        with self.__cond:
+            return self.__sequence
+
+    def update(self, name, num, state, transition=None):
+        """
+        Record a new state for 'name#num' and wake up any waiters.  States
+        from before the component's latest 'transition' are ignored.
+        """
+        with self.__cond:
+            old = self.__states.get((name, num))
+            if transition is not None and old is not None and \
+              old[3] is not None and transition < old[3]:
+                return self.__sequence
+
+            self.__sequence += 1
+            self.__states[(name, num)] = (self.__sequence, state, time.time(),
+                                          transition)
+            self.__cond.notify_all()
+            return self.__sequence
+
+    def wait(self, since, timeout):
+        """
+        Wait up to 'timeout' seconds for an update after sequence number
+        'since'.  Return True if there was one.
+        """
+        end_time = time.time() + timeout
+        with self.__cond:
+            while self.__sequence <= since:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return False
+                self.__cond.wait(remaining)
+            return True
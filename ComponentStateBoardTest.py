@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"ComponentStateBoard unit tests"
+
+import threading
+import time
+import unittest
+
+from ComponentStateBoard import ComponentStateBoard
+
+
+class ComponentStateBoardTest(unittest.TestCase):
+    def test_update(self):
+        board = ComponentStateBoard()
+        self.assertTrue(board.get("foo", 1) is None, "Found bogus state")
+        self.assertFalse(board.has_pushed("foo", 1), "foo#1 has not pushed")
+
+        first = board.sequence
+        seq = board.update("foo", 1, "ready")
+        self.assertEqual(first + 1, seq)
+        self.assertEqual(seq, board.sequence)
+
+        self.assertEqual("ready", board.get("foo", 1))
+        self.assertEqual("ready", board.get("foo", 1, since=first))
+        self.assertTrue(board.get("foo", 1, since=seq) is None,
+                        "Old state should be ignored")
+        self.assertTrue(board.get("foo", 2) is None, "Found state for foo#2")
+        self.assertTrue(board.pushed_within("foo", 1, 10.0),
+                        "foo#1 should have pushed recently")
+
+        board.forget("foo", 1)
+        self.assertFalse(board.has_pushed("foo", 1), "foo#1 was not forgotten")
+        self.assertEqual(0, len(board))
+
+    def test_stale_push(self):
+        board = ComponentStateBoard()
+
+        board.update("foo", 1, "ready", transition=3)
+        seq = board.update("foo", 1, "running", transition=4)
+
+        # a ping sent before the last transition doesn't undo it
+        self.assertEqual(seq, board.update("foo", 1, "ready", transition=3))
+        self.assertEqual("running", board.get("foo", 1))
+
+        # pings after the transition refresh the state
+        self.assertEqual(seq + 1,
+                         board.update("foo", 1, "running", transition=4))
+        self.assertEqual("running", board.get("foo", 1, since=seq))
+
+        # components which don't number transitions are always believed
+        board.update("foo", 1, "ready")
+        self.assertEqual("ready", board.get("foo", 1))
+
+    def test_wait(self):
+        board = ComponentStateBoard()
+        seq = board.sequence
+
+        self.assertFalse(board.wait(seq, 0.05), "Wait should time out")
+
+        thrd = threading.Timer(0.1, board.update, ("bar", 0, "running"))
+        thrd.start()
+
+        start = time.time()
+        self.assertTrue(board.wait(seq, 10.0), "Wait should be notified")
+        elapsed = time.time() - start
+        thrd.join()
+
+        self.assertTrue(elapsed < 5.0, "Wait took %.2f seconds" % (elapsed, ))
+        self.assertEqual("running", board.get("bar", 0, since=seq))
+
+        # updates which arrived earlier satisfy the wait immediately
+        self.assertTrue(board.wait(seq, 0.0), "Missed earlier update")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Process-wide cache of parsed configuration objects (run configurations,
+domconfigs, cluster descriptions, DOM geometry).  Each entry remembers the
+modification time and size of every file it was built from, and is reloaded
+as soon as any of those files changes.
+"""
+
+import os
+import threading
+
+from collections import OrderedDict
+
+
+class ConfigRegistry(object):
+    "LRU cache of configuration objects, invalidated when their files change"
+
+    # maximum number of cached objects
+    DEFAULT_MAX_ENTRIES = 256
+
+    # cached singleton instance
+    __INSTANCE = None
+    __INSTANCE_LOCK = threading.Lock()
+
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = self.DEFAULT_MAX_ENTRIES
+        self.__max_entries = max_entries
+
+        # key -> (file stamps, object), oldest entries first
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.__hits = 0
+        self.__misses = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @classmethod
+    def __stamp(cls, paths):
+        "Return a tuple of (path, mtime, size) tuples, or None if any are gone"
+        stamps = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            stamps.append((path, stat.st_mtime, stat.st_size))
+        return tuple(stamps)
+
+    def clear(self):
+        "Forget all cached objects"
+        with self.__lock:
+            self.__entries.clear()
+
+    @property
+    def counters(self):
+        "Return a dictionary of cache statistics"
+        return {
+            "entries": len(self.__entries),
+            "hits": self.__hits,
+            "misses": self.__misses,
+        }
+
+    def get(self, key, loader):
+        """
+        Return the object cached under 'key'.  If it's missing or any of its
+        files has changed, call 'loader' to build it.  'loader' must return
+        a tuple containing the new object and a list of the paths of all
+        files used to build it.
+        """
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is not None:
+                stamps, obj = entry
+                if self.__stamp(path for path, _, _ in stamps) == stamps:
+                    # move this entry to the most-recently-used end
+                    self.__entries[key] = entry
+                    self.__hits += 1
+                    return obj
+            self.__misses += 1
+
+        # don't hold the lock while loading, since loaders may use
+        # other threads which also need the registry
+        obj, paths = loader()
+        stamps = self.__stamp(paths)
+        if stamps is None:
+            # a file vanished while the object was being built
+            return obj
+
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (stamps, obj)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+        return obj
+
+    @classmethod
+    def instance(cls):
+        "Return the process-wide registry"
+        with cls.__INSTANCE_LOCK:
+            if cls.__INSTANCE is None:
+                cls.__INSTANCE = ConfigRegistry()
+            return cls.__INSTANCE
+
+    @property
+    def max_entries(self):
+        return self.__max_entries
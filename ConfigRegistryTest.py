@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"ConfigRegistry unit tests"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ConfigRegistry import ConfigRegistry
+
+
+class ConfigRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+        self.__loads = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.__temp_dir, ignore_errors=True)
+
+    def __create(self, name, text):
+        path = os.path.join(self.__temp_dir, name)
+        with open(path, "w") as fout:
+            fout.write(text)
+        return path
+
+    def __loader(self, *paths):
+        "Build a loader which returns the contents of all files in 'paths'"
+        def load():
+            self.__loads += 1
+            contents = []
+            for path in paths:
+                with open(path, "r") as fin:
+                    contents.append(fin.read())
+            return contents, paths
+        return load
+
+    def test_cached(self):
+        path = self.__create("foo.xml", "abc")
+
+        reg = ConfigRegistry()
+        first = reg.get("foo", self.__loader(path))
+        self.assertEqual(["abc", ], first)
+
+        second = reg.get("foo", self.__loader(path))
+        self.assertTrue(first is second, "Object was not cached")
+        self.assertEqual(1, self.__loads)
+        self.assertEqual({"entries": 1, "hits": 1, "misses": 1},
+                         reg.counters)
+
+    def test_changed(self):
+        path = self.__create("foo.xml", "abc")
+        other = self.__create("bar.xml", "xyz")
+
+        reg = ConfigRegistry()
+        self.assertEqual(["abc", "xyz"],
+                         reg.get("foo", self.__loader(path, other)))
+
+        # a change to any file should force a reload
+        self.__create("bar.xml", "uvwxyz")
+        self.assertEqual(["abc", "uvwxyz"],
+                         reg.get("foo", self.__loader(path, other)))
+        self.assertEqual(2, self.__loads)
+
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        reg.get("foo", self.__loader(path, other))
+        self.assertEqual(3, self.__loads)
+
+    def test_removed(self):
+        path = self.__create("foo.xml", "abc")
+
+        reg = ConfigRegistry()
+        reg.get("foo", self.__loader(path))
+
+        os.unlink(path)
+        self.assertRaises(IOError, reg.get, "foo", self.__loader(path))
+
+    def test_lru(self):
+        paths = [self.__create("f%d.xml" % idx, str(idx))
+                 for idx in range(4)]
+
+        reg = ConfigRegistry(max_entries=3)
+        for idx in range(3):
+            reg.get(idx, self.__loader(paths[idx]))
+
+        # touch entry #0 so #1 becomes the least recently used
+        reg.get(0, self.__loader(paths[0]))
+        reg.get(3, self.__loader(paths[3]))
+        self.assertEqual(3, len(reg))
+        self.assertEqual(4, self.__loads)
+
+        reg.get(0, self.__loader(paths[0]))
+        self.assertEqual(4, self.__loads)
+        reg.get(1, self.__loader(paths[1]))
+        self.assertEqual(5, self.__loads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,9 +8,11 @@ from __future__ import print_function
 
 import os
 import sys
+import threading
 
 from CachedConfigName import CachedConfigName
 from Component import Component
+from ConfigRegistry import ConfigRegistry
 from DefaultDomGeometry import DefaultDomGeometry, DefaultDomGeometryReader
 from RunCluster import RunCluster
 from config.validate_configs import validate_configs
@@ -196,6 +198,7 @@ class RunDom(dict):
     longer needed"""
 
     DEFAULT_DOM_GEOMETRY = None
+    GEOMETRY_LOCK = threading.Lock()
 
     def __init__(self, dom_dict, domConfigDir=None):
         self.dom_dict = dom_dict
@@ -209,8 +212,8 @@ class RunDom(dict):
         # assume domConfigDir is a subdirectory of the main config directory
         (parent, _) = os.path.split(domConfigDir)
 
-        dom_id_to_dom = RunDom.__load_dom_id_map(parent)
-        dom_geom = dom_id_to_dom[self['mbid']]
+        mbid_to_dom = RunDom.__load_mbid_map(parent)
+        dom_geom = mbid_to_dom[self.__mbid]
 
         self.__string = dom_geom.string
         self.__pos = dom_geom.pos
@@ -221,17 +224,39 @@ class RunDom(dict):
         return "%s" % self['mbid']
 
     @classmethod
-    def __load_dom_id_map(cls, config_dir):
+    def __load_mbid_map(cls, config_dir):
         if cls.DEFAULT_DOM_GEOMETRY is None:
             cls.__load_geometry(config_dir)
 
-        return cls.DEFAULT_DOM_GEOMETRY.get_dom_id_to_dom_dict()
+        return cls.DEFAULT_DOM_GEOMETRY.get_mbid_to_dom_dict()
 
     @classmethod
     def __load_geometry(cls, config_dir):
+        # domconfig files may be loaded by several threads at once
+        with cls.GEOMETRY_LOCK:
+            if cls.DEFAULT_DOM_GEOMETRY is None:
+                cls.load_geometry(config_dir)
+
+    @classmethod
+    def geometry_path(cls, config_dir):
+        "Return the path to the default-dom-geometry file in 'config_dir'"
+        return os.path.join(config_dir, DefaultDomGeometry.FILENAME)
+
+    @classmethod
+    def load_geometry(cls, config_dir):
+        """
+        Load the default-dom-geometry file from 'config_dir' (or fetch the
+        cached copy if the file hasn't changed)
+        """
+        path = cls.geometry_path(config_dir)
+
+        def loader():
+            geom = DefaultDomGeometryReader.parse(file_name=path,
+                                                  translate_doms=True)
+            return geom, (path, )
+
         cls.DEFAULT_DOM_GEOMETRY = \
-                DefaultDomGeometryReader.parse(config_dir=config_dir,
-                                               translate_doms=True)
+          ConfigRegistry.instance().get(("geometry", path), loader)
 
     def __getitem__(self, key):
         """Maybe an odd overloading of a python dictionary,
@@ -292,6 +317,19 @@ class DomConfig(ConfigObject):
     def configdir(self):
         return os.path.join(super(DomConfig, self).configdir, 'domconfigs')
 
+    @classmethod
+    def get(cls, cfgdir, fname):
+        """
+        Return the parsed domconfig file, reusing the cached copy if neither
+        it nor the default-dom-geometry file has changed
+        """
+        def loader():
+            dom_cfg = DomConfig(cfgdir, fname)
+            return dom_cfg, (dom_cfg.fullpath, RunDom.geometry_path(cfgdir))
+
+        return ConfigRegistry.instance().get(("domconfig", cfgdir, fname),
+                                             loader)
+
     def load(self, shallow=False):  # pylint: disable=unused-argument
         super(DomConfig, self).load()
 
@@ -423,6 +461,11 @@ class DAQConfig(ConfigObject):
         self.strict = strict
         self.is_supersaver = False
 
+        # DOM lookup tables, rebuilt by load()
+        self.__mbid_to_dom = {}
+        self.__name_to_dom = {}
+        self.__loc_to_dom = {}
+
         super(DAQConfig, self).__init__(cfgdir, filename)
 
         self.load(shallow=shallow)
@@ -743,9 +786,25 @@ class DAQConfig(ConfigObject):
         # passed all origional tests assume new format
         return False
 
+    def __load_dom_configs(self, pending, shallow):
+        """
+        Load the (index, name) domconfig files in 'pending', filling in
+        the corresponding placeholders in self.dom_cfgs
+        """
+        for index, dcname in pending:
+            if shallow:
+                dom_cfg = DomConfig(self.configdir, dcname, parse=False)
+            else:
+                dom_cfg = DomConfig.get(self.configdir, dcname)
+            self.dom_cfgs[index] = dom_cfg
+
     def load(self, shallow=False):
         super(DAQConfig, self).load()
 
+        # (index, name) pairs for domconfig files which still need
+        # to be loaded
+        pending = []
+
         self.dom_cfgs = []
         self.stringhub_map = {}
         self.replay_hubs = []
@@ -780,20 +839,18 @@ class DAQConfig(ConfigObject):
             elif key == 'domConfigList' and is_old_runconfig:
                 # required for backwards compatibility
                 self.dom_cfgs = []
+                pending = []
                 for dcfg in val:
-                    dcname = get_value(dcfg)
-                    dom_config = DomConfig(self.configdir, dcname,
-                                           parse=not shallow)
-                    self.dom_cfgs.append(dom_config)
+                    pending.append((len(self.dom_cfgs), get_value(dcfg)))
+                    self.dom_cfgs.append(None)
             elif key == 'stringHub':
                 for strhub_dict in val:
                     str_hub_id = int(get_attrib(strhub_dict, "hubId"))
                     if str_hub_id not in self.stringhub_map:
                         if not is_old_runconfig:
                             dcname = get_attrib(strhub_dict, 'domConfig')
-                            self.dom_cfgs.append(DomConfig(self.configdir,
-                                                           dcname,
-                                                           parse=not shallow))
+                            pending.append((len(self.dom_cfgs), dcname))
+                            self.dom_cfgs.append(None)
 
                         str_hub = StringHub(strhub_dict, str_hub_id)
                         self.stringhub_map[str_hub_id] = str_hub
@@ -837,6 +894,12 @@ class DAQConfig(ConfigObject):
                 # an 'OTHER' object
                 self.other_objs.append((key, val))
 
+        # parse all the domconfig files
+        if len(pending) > 0:  # pylint: disable=len-as-condition
+            if not shallow:
+                RunDom.load_geometry(self.configdir)
+            self.__load_dom_configs(pending, shallow)
+
         # previously the config code would create a
         # stringhub object for any hubs defined in a domconfiglist
         # this USED to be the case, but according to dave we
@@ -856,10 +919,48 @@ class DAQConfig(ConfigObject):
                         self.stringhub_map[hub_id] = strhub
                         self.__add_component(strhub)
 
+        self.__index_doms()
+
         # if 'STRICT' is specified call the validation routine
         if self.strict:
             self.validate()
 
+    def __index_doms(self):
+        """
+        Build the mainboard ID, name, and (string, position) lookup tables.
+        If a key matches several DOMs, the first one wins.
+        """
+        self.__mbid_to_dom = {}
+        self.__name_to_dom = {}
+        self.__loc_to_dom = {}
+
+        for dcfg in self.dom_cfgs:
+            for entry in dcfg.rundoms:
+                mbid = self.__mbid_of(entry)
+                if mbid not in self.__mbid_to_dom:
+                    self.__mbid_to_dom[mbid] = entry
+                if entry.name not in self.__name_to_dom:
+                    self.__name_to_dom[entry.name] = entry
+
+            for string, entries in dcfg.string_map.items():
+                for entry in entries:
+                    key = (string, entry.pos)
+                    if key not in self.__loc_to_dom:
+                        self.__loc_to_dom[key] = entry
+
+    @classmethod
+    def __mbid_of(cls, entry):
+        "Return the integer mainboard ID for a RunDom or DomGeometry entry"
+        if isinstance(entry.mbid, str):
+            # RandomConfig DOMs come from the geometry file
+            return int(entry.mbid, 16)
+        return entry.mbid
+
+    def get_dom_by_mbid(self, mbid):
+        """Return the DOM with the given integer mainboard ID
+        or None if it is not in this configuration"""
+        return self.__mbid_to_dom.get(mbid)
+
     def has_dom(self, dom_str):
         """Take a hex string and search for a dom
         with that id.
@@ -873,11 +974,7 @@ class DAQConfig(ConfigObject):
         except ValueError:
             raise BadDOMID("Invalid DOM ID \"%s\"" % dom_str)
 
-        for dcfg in self.dom_cfgs:
-            for entry in dcfg.rundoms:
-                if entry.mbid == domid or entry.mbid == dom_str:
-                    return True
-        return False
+        return domid in self.__mbid_to_dom
 
     @property
     def all_doms(self):
@@ -892,25 +989,16 @@ class DAQConfig(ConfigObject):
         """Search for a dom with the given name
         and return it's id.  If no match is found
         throw a DOMNotInConfigException"""
-        for dcfg in self.dom_cfgs:
-            for entry in dcfg.rundoms:
-                if entry.name == name:
-                    return "%012x" % entry.mbid
+        if name in self.__name_to_dom:
+            return "%012x" % self.__mbid_of(self.__name_to_dom[name])
 
         raise DOMNotInConfigException("Cannot find dom named \"%s\"" % name)
 
     def get_id_by_string_pos(self, string, pos):
         """Search for the id of a dom at a given string / position
         In case the dom is not found throw a DOMNotInConfigException"""
-
-        for dcfg in self.dom_cfgs:
-            try:
-                for entry in dcfg.string_map[string]:
-                    if entry.pos == pos:
-                        return "%012x" % entry.mbid
-            except KeyError:
-                # ignore KeyError exceptions looking for our given string
-                pass
+        if (string, pos) in self.__loc_to_dom:
+            return "%012x" % self.__mbid_of(self.__loc_to_dom[(string, pos)])
 
         raise DOMNotInConfigException("Cannot find sting %d pos %d" %
                                       (string, pos))
@@ -919,6 +1007,23 @@ class DAQConfig(ConfigObject):
     def dom_configs(self):
         return self.dom_cfgs[:]
 
+    @property
+    def source_paths(self):
+        "Return the paths of all files used to build this configuration"
+        paths = [self.fullpath, ]
+        if self.trig_cfg is not None:
+            paths.append(self.trig_cfg.fullpath)
+
+        found_dom_cfg = False
+        for dcfg in self.dom_cfgs:
+            if isinstance(dcfg, DomConfig):
+                paths.append(dcfg.fullpath)
+                found_dom_cfg = True
+        if found_dom_cfg:
+            paths.append(RunDom.geometry_path(self.configdir))
+
+        return paths
+
     @property
     def trigger_config(self):
         return self.trig_cfg
@@ -931,8 +1036,17 @@ class DAQConfigParser(object):
 
     @classmethod
     def parse(cls, config_dir, file_name, strict=False, shallow=False):
-        return DAQConfig(config_dir, file_name, strict=strict,
-                         shallow=shallow)
+        """
+        Return the parsed run configuration, reusing the cached copy if
+        none of the files it was built from have changed
+        """
+        def loader():
+            cfg = DAQConfig(config_dir, file_name, strict=strict,
+                            shallow=shallow)
+            return cfg, cfg.source_paths
+
+        key = ("runconfig", config_dir, file_name, strict, shallow)
+        return ConfigRegistry.instance().get(key, loader)
 
     @classmethod
     def get_cluster_configuration(cls, config_name, use_active_config=False,
@@ -1064,15 +1178,27 @@ def main():
                 for comp in cfg.components:
                     print('Comp %s log %s' % (str(comp), str(comp.log_level)))
 
+            # the next parse is a registry lookup
+            start_time = datetime.datetime.now()
+            _ = DAQConfigParser.parse(config_dir, config_name,
+                                      strict=args.strict)
+            diff = datetime.datetime.now() - start_time
+            cached_time = float(diff.seconds) + \
+                (float(diff.microseconds) / 1000000.0)
+
+            # forget all cached objects and parse everything again
+            ConfigRegistry.instance().clear()
             start_time = datetime.datetime.now()
             _ = DAQConfigParser.parse(config_dir, config_name,
                                       strict=args.strict)
             diff = datetime.datetime.now() - start_time
-            next_time = float(diff.seconds) + \
+            reload_time = float(diff.seconds) + \
                 (float(diff.microseconds) / 1000000.0)
             if not args.quiet:
-                print("Initial time %.03f, subsequent time: %.03f" %
-                      (init_time, next_time))
+                print("Initial time %.03f, uncached reload: %.03f,"
+                      " cached: %.03f (%d domconfigs)" %
+                      (init_time, reload_time, cached_time,
+                       len(cfg.dom_configs)))
 
     if failed:
         raise SystemExit(1)
@@ -4,6 +4,7 @@ import os
 import unittest
 
 from DAQConfig import DAQConfigParser
+from DAQMocks import MockCacheDirectory
 
 
 class CommonCode(unittest.TestCase):
@@ -311,6 +312,29 @@ class DAQConfigTest(CommonCode):
                          "Expected watchdog period for %s to be %d, not %s" %
                          (cfg.basename, exp_val, cfg.watchdog_period))
 
+    def test_dom_by_mbid(self):
+        cfg_dir = self.config_dir(True)
+        cfg = DAQConfigParser.parse(cfg_dir, "sps-IC40-IT6-Revert-IceTop-V029")
+
+        doms = cfg.all_doms
+        self.assertTrue(len(doms) > 0, "No DOMs found")
+        for dom in doms:
+            self.assertTrue(cfg.get_dom_by_mbid(dom.mbid) is dom,
+                            "Cannot find DOM %012x" % dom.mbid)
+        self.assertTrue(cfg.get_dom_by_mbid(0) is None,
+                        "Found bogus DOM 000000000000")
+        self.assertFalse(cfg.has_dom("000000000000"),
+                         "Found bogus DOM 000000000000")
+
+
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -549,10 +549,16 @@ class DAQFakeRun(object):
                 print(str(cdict), file=sys.stderr)
             print("---", file=sys.stderr)
 
+        start_time = time.time()
         runset_id = self.make_runset(comp_list, run_cfg.basename, run_num)
+        print("Run #%d: built runset #%d in %.3f seconds" %
+              (run_num, runset_id, time.time() - start_time))
 
-        if num_sets != self.__client.rpc_runset_count() - 1:
-            print("Expected %d run sets" % (num_sets + 1), file=sys.stderr)
+        # a reused warm runset doesn't change the number of runsets
+        new_sets = self.__client.rpc_runset_count()
+        if new_sets not in (num_sets, num_sets + 1):
+            print("Expected %d run sets, not %d" % (num_sets + 1, new_sets),
+                  file=sys.stderr)
 
         try:
             self.__run_internal(runset_id, run_num, duration, verbose=verbose,
@@ -801,8 +807,12 @@ class DAQFakeRun(object):
         return runset_id
 
     def run_all(self, comps, start_num, num_runs, duration, run_cfg,
-                verbose=False, test_subrun=False):
-        "Shepherd a set of components through the specified runs"
+                verbose=False, test_subrun=False, keep_warm=False):
+        """
+        Shepherd a set of components through the specified runs.
+        If 'keep_warm' is True, components are not reset between runs so a
+        CnCServer started with '--keep-warm' can reuse the previous runset.
+        """
         run_num = start_num
 
         # grab the number of components before we add ours
@@ -851,6 +861,10 @@ class DAQFakeRun(object):
                 traceback.print_exc()
             run_num += 1
 
+            if keep_warm:
+                # leave the components configured for the next run
+                continue
+
             # close all created components
             #
             self.__client.rpc_end_all()
@@ -964,6 +978,10 @@ def main():
     parser.add_argument("-v", "--verbose", dest="verbose",
                         action="store_true", default=False,
                         help="Print progress messages during run")
+    parser.add_argument("-w", "--keep-warm", dest="keep_warm",
+                        action="store_true", default=False,
+                        help=("Don't reset components between runs (for use"
+                              " with 'CnCServer.py -F --keep-warm')"))
     parser.add_argument("-X", "--extra-hubs", type=int, dest="extra_hubs",
                         default=0,
                         help="Number of extra hubs to create")
@@ -1085,7 +1103,8 @@ def main():
     runner = DAQFakeRun()
 
     runner.run_all(comps, args.run_num, args.num_runs, args.duration,
-                   run_cfg, verbose=args.verbose, test_subrun=args.test_subrun)
+                   run_cfg, verbose=args.verbose, test_subrun=args.test_subrun,
+                   keep_warm=args.keep_warm)
 
 
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ from IntervalTimer import IntervalTimer
 from LiveImports import INCOMPLETE_STATE_CHANGE, LIVE_IMPORT, LiveComponent, \
     SERVICE_NAME
 from RunOption import RunOption
+from RunTimeline import RunTimeline
 from exc_string import exc_string, set_exc_string_encoding
 set_exc_string_encoding("ascii")
 
@@ -169,6 +170,12 @@ class StartThread(ActionThread):
         """
         (run_cfg, run_num, extended_mode) = args
 
+        timeline = RunTimeline("run %d" % (run_num, ))
+        with RunTimeline.activated(timeline), \
+          timeline.span(self.NAME, "live"):
+            return self.__start(run_cfg, run_num, extended_mode)
+
+    def __start(self, run_cfg, run_num, extended_mode):
         cnc = self.__daq_live.command_and_control
 
         runset = self.__daq_live.runset
@@ -280,7 +287,11 @@ class SwitchThread(ActionThread):
         (run_number, ) = args
 
         runset = self.__daq_live.runset
-        runset.switch_run(run_number)
+
+        timeline = RunTimeline("run %d" % (run_number, ))
+        with RunTimeline.activated(timeline), \
+          timeline.span(self.NAME, "live"):
+            runset.switch_run(run_number)
 
 
 class DAQLive(LiveComponent):
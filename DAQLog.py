@@ -18,12 +18,20 @@ import select
 import socket
 import sys
 import threading
+import time
+try:
+    import selectors
+except ImportError:
+    import selectors2 as selectors  # Python 2 backport
 
 from DAQConst import DAQPort
 from LiveImports import LIVE_IMPORT, MoniClient, Prio, SERVICE_NAME
 from decorators import classproperty
 from i3helper import reraise_excinfo
 
+from exc_string import exc_string, set_exc_string_encoding
+set_exc_string_encoding("ascii")
+
 
 class LogException(Exception):
     "Exception used by log-related classes"
@@ -32,13 +40,23 @@ class LogException(Exception):
 class LogSocketServer(object):
     """
     Log requests from a remote object to a file.
-    Works nonblocking in a separate thread to guarantee concurrency
+    Works nonblocking in a separate thread to guarantee concurrency,
+    or shares a single LogSocketHub thread with other log servers
     """
 
     NEXT_PORT = DAQPort.EPHEMERAL_BASE
     NEXT_LOCK = threading.Lock()
 
-    def __init__(self, port, cname, logpath, quiet=False):
+    # maximum size of a single log datagram
+    MAX_DATAGRAM = 8192
+    # maximum number of datagrams read before writing them to the log file
+    MAX_BATCH = 256
+    # requested size of the kernel socket receive buffer
+    RCVBUF_SIZE = 4 * 1024 * 1024
+    # maximum number of seconds buffered log lines wait before being flushed
+    FLUSH_INTERVAL = 0.25
+
+    def __init__(self, port, cname, logpath, quiet=False, hub=None):
         "Logpath should be fully qualified in case I'm a Daemon"
         if not os.path.isabs(logpath):
             raise LogException("Cannot log to non-absolute path \"%s\"" %
@@ -48,27 +66,41 @@ class LogSocketServer(object):
         self.__cname = cname
         self.__logpath = logpath
         self.__quiet = quiet
+        self.__hub = hub
         self.__thread = None
+        self.__sock = None
         self.__outfile = None
+        self.__outlock = threading.Lock()
         self.__serving = False
 
-    def __main(self):
-        """
-        Create listening, non-blocking UDP socket, read from it,
-        and write to file; close socket and end thread if signaled via
-        self.__thread variable.
-        """
+        # guards the socket and buffer, which may be read from a hub thread
+        self.__sock_lock = threading.Lock()
+        self.__buf = bytearray(self.MAX_DATAGRAM)
+        self.__next_flush = None
+
+        self.__num_received = 0
+        self.__num_bad = 0
 
+    def __create_socket(self):
+        "Create and bind a non-blocking UDP socket"
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         if os.name != "nt":
             # initialize POSIX socket
             sock.setblocking(0)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
+        # a large receive buffer lets us survive bursts of log messages
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                            self.RCVBUF_SIZE)
+        except socket.error:
+            pass  # use the default buffer size
+
         if self.__port is not None:
             try:
                 sock.bind(("", self.__port))
             except socket.error:
+                sock.close()
                 raise LogException('Cannot bind %s log server to port %d' %
                                    (self.__cname, self.__port))
         else:
@@ -81,27 +113,25 @@ class LogSocketServer(object):
                 except socket.error:
                     pass
 
+        return sock
+
+    def __main(self):
+        """
+        Create listening, non-blocking UDP socket, read from it,
+        and write to file; close socket and end thread if signaled via
+        self.__thread variable.
+        """
+
+        self.__sock = self.__create_socket()
         self.__outfile = self.__open_path(self.__logpath)
         self.__serving = True
         try:
             if os.name == "nt":
-                self.__win_loop(sock)
+                self.__win_loop(self.__sock)
             else:
-                self.__posix_loop(sock)
+                self.__posix_loop(self.__sock)
         finally:
-            self.__serving = False
-
-            try:
-                sock.close()
-            except:   # pylint: disable=bare-except
-                pass  # ignore errors on close
-
-            if self.__outfile is not None:
-                try:
-                    self.__outfile.close()
-                except:   # pylint: disable=bare-except
-                    pass  # ignore errors on close
-                self.__outfile = None
+            self.__close()
 
     @classmethod
     def __open_path(cls, path):
@@ -113,39 +143,157 @@ class LogSocketServer(object):
         prd = [sock]
         pwr = []
         per = [sock]
+
         while self.__thread is not None:
-            srd, _, sre = select.select(prd, pwr, per, 0.5)
+            if self.__next_flush is None:
+                timeout = 0.5
+            else:
+                timeout = max(0.0, self.__next_flush - time.time())
+
+            srd, _, sre = select.select(prd, pwr, per, timeout)
             if len(sre) != 0:  # pylint: disable=len-as-condition
-                if self.__outfile is not None:
-                    print("Error on select was detected.", file=self.__outfile)
-            if len(srd) == 0:  # pylint: disable=len-as-condition
-                continue
-            while True:  # Slurp up waiting packets, return to select if EAGAIN
-                try:
-                    data = sock.recv(8192, socket.MSG_DONTWAIT)
-                    self.__write_data(data)
-                except socket.error as sockerr:
-                    if sockerr.errno == errno.EWOULDBLOCK:
-                        break  # Go back to select so we don't busy-wait
-                    raise
+                self.error_detected()
+            if len(srd) != 0:  # pylint: disable=len-as-condition
+                self.drain()
+
+            self.flush_if_due(time.time())
 
     def __win_loop(self, sock):
         """
         Windows version of listener - no select().
         """
         while self.__thread is not None:
-            data = sock.recv(8192)
-            self.__write_data(data)
+            data = sock.recv(self.MAX_DATAGRAM)
+            self.__write_batch((data, ))
+            self.flush()
 
-    def __write_data(self, data):
+    def __write_batch(self, batch):
+        "Decode a list of datagrams and append them to the log as one write"
+        self.__num_received += len(batch)
         if self.__outfile is None:
+            # the log is closed or being replaced; drop these messages
             return
 
-        outstr = "%s %s" % (self.__cname, data.decode("utf-8"))
+        lines = []
+        for data in batch:
+            try:
+                lines.append("%s %s\n" % (self.__cname, data.decode("utf-8")))
+            except UnicodeDecodeError:
+                lines.append("%s %s\n" % (self.__cname,
+                                          data.decode("utf-8", "replace")))
+                self.__num_bad += 1
+
+        outstr = "".join(lines)
         if not self.__quiet:
-            print("%s" % outstr)
-        print(outstr, file=self.__outfile)
-        self.__outfile.flush()
+            sys.stdout.write(outstr)
+
+        with self.__outlock:
+            if self.__outfile is not None:
+                self.__outfile.write(outstr)
+
+    @classmethod
+    def __read_kernel_drops(cls, port):
+        """
+        Return the number of datagrams the kernel dropped for the UDP socket
+        bound to 'port', or 0 if this information is not available
+        """
+        try:
+            with open("/proc/net/udp", "r") as fin:
+                next(fin)  # skip the header line
+                port_str = ":%04X" % port
+                for line in fin:
+                    flds = line.split()
+                    if len(flds) > 12 and flds[1].endswith(port_str):
+                        return int(flds[12])
+        except (IOError, OSError, ValueError, StopIteration):
+            pass
+        return 0
+
+    def __close(self):
+        "Close the socket and log file"
+        self.__serving = False
+
+        with self.__sock_lock:
+            if self.__sock is not None:
+                try:
+                    self.__sock.close()
+                except:   # pylint: disable=bare-except
+                    pass  # ignore errors on close
+                self.__sock = None
+
+        with self.__outlock:
+            if self.__outfile is not None:
+                try:
+                    self.__outfile.close()
+                except:   # pylint: disable=bare-except
+                    pass  # ignore errors on close
+                self.__outfile = None
+
+    @property
+    def cname(self):
+        "Return the name of the component whose log is being served"
+        return self.__cname
+
+    @property
+    def counters(self):
+        "Return a dictionary of message counters for this component's log"
+        return {
+            "received": self.num_received,
+            "dropped": self.num_dropped,
+            "undecodable": self.__num_bad,
+        }
+
+    def drain(self):
+        """
+        Read as many datagrams as are waiting (in batches of MAX_BATCH)
+        and write each batch to the log file in a single operation
+        """
+        with self.__sock_lock:
+            if self.__sock is None:
+                return
+
+            view = memoryview(self.__buf)
+            while True:
+                batch = []
+                while len(batch) < self.MAX_BATCH:
+                    try:
+                        nbytes = self.__sock.recv_into(self.__buf,
+                                                       self.MAX_DATAGRAM,
+                                                       socket.MSG_DONTWAIT)
+                    except socket.error as sockerr:
+                        if sockerr.errno in (errno.EWOULDBLOCK,
+                                             errno.EAGAIN):
+                            break  # return to select, don't busy-wait
+                        raise
+                    batch.append(view[:nbytes].tobytes())
+
+                if len(batch) == 0:  # pylint: disable=len-as-condition
+                    break
+
+                self.__write_batch(batch)
+                if self.__next_flush is None:
+                    self.__next_flush = time.time() + self.FLUSH_INTERVAL
+
+                if len(batch) < self.MAX_BATCH:
+                    break
+
+    def error_detected(self):
+        "Note a socket error reported by select()"
+        with self.__outlock:
+            if self.__outfile is not None:
+                print("Error on select was detected.", file=self.__outfile)
+
+    def flush(self):
+        "Flush buffered log lines to disk"
+        self.__next_flush = None
+        with self.__outlock:
+            if self.__outfile is not None:
+                self.__outfile.flush()
+
+    def flush_if_due(self, now):
+        "Flush buffered log lines if they have waited long enough"
+        if self.__next_flush is not None and now >= self.__next_flush:
+            self.flush()
 
     @property
     def is_serving(self):
@@ -161,18 +309,52 @@ class LogSocketServer(object):
                 cls.NEXT_PORT = DAQPort.EPHEMERAL_BASE
             return port
 
+    @property
+    def next_flush(self):
+        "Return the time when buffered lines must be flushed (or None)"
+        return self.__next_flush
+
+    @property
+    def num_dropped(self):
+        """
+        Return the number of log datagrams the kernel dropped because this
+        server could not keep up (only available on Linux)
+        """
+        if not self.__serving or self.__port is None:
+            return 0
+        return self.__read_kernel_drops(self.__port)
+
+    @property
+    def num_received(self):
+        "Return the number of log messages received"
+        return self.__num_received
+
     @property
     def port(self):
         "Return the socket port number used by this object"
         return self.__port
 
+    @property
+    def socket(self):
+        "Return the socket used by this object"
+        return self.__sock
+
     def start_serving(self):
         "Creates listener thread, prepares file for output, and returns"
-        if self.__thread is not None:
+        if self.__thread is not None or \
+           (self.__hub is not None and self.__sock is not None):
             raise LogException("Thread for %s:%s has started" %
                                (self.__cname, self.__logpath))
 
         self.__serving = False
+        if self.__hub is not None and os.name != "nt":
+            # the hub's thread reads from our socket
+            self.__sock = self.__create_socket()
+            self.__outfile = self.__open_path(self.__logpath)
+            self.__serving = True
+            self.__hub.add(self)
+            return
+
         self.__thread = threading.Thread(target=self.__main,
                                          name=self.__logpath)
         self.__thread.setDaemon(True)
@@ -180,8 +362,10 @@ class LogSocketServer(object):
 
     def set_output(self, new_path):
         "Change logging output file.  Send to sys.stdout if path is None"
-        old_fd = self.__outfile
-        self.__outfile = self.__open_path(new_path)
+        new_fd = self.__open_path(new_path)
+        with self.__outlock:
+            old_fd = self.__outfile
+            self.__outfile = new_fd
         try:
             if old_fd is not None:
                 old_fd.close()
@@ -190,7 +374,8 @@ class LogSocketServer(object):
 
         # rename the thread
         #
-        self.__thread.name = new_path
+        if self.__thread is not None:
+            self.__thread.name = new_path
 
     def stop_serving(self):
         "Signal listening thread to exit; wait for thread to finish"
@@ -198,6 +383,196 @@ class LogSocketServer(object):
             thread = self.__thread
             self.__thread = None
             thread.join()
+        elif self.__hub is not None and self.__sock is not None:
+            self.__hub.remove(self)
+            self.__close()
+
+
+class LogSocketHub(object):
+    """
+    Read from many component log sockets in a single thread.  Each component
+    still logs to its own UDP port (so messages are attributed by port), but
+    one selector loop serves all of them instead of one thread per component.
+    """
+
+    # seconds to wait before retrying a selector which failed
+    ERROR_SLEEP = 0.1
+
+    # cached singleton instance
+    __INSTANCE = None
+    __INSTANCE_LOCK = threading.Lock()
+
+    def __init__(self, name="LogSocketHub"):
+        self.__name = name
+
+        # socket -> LogSocketServer
+        self.__servers = {}
+        # (socket, server) pairs to be (un)registered by the loop thread,
+        # since selectors cannot be modified while another thread waits
+        self.__changes = []
+        self.__lock = threading.Lock()
+
+        self.__thread = None
+
+        # writing to this socket pair wakes up the selector loop
+        self.__wake_rd, self.__wake_wr = socket.socketpair()
+        self.__wake_rd.setblocking(0)
+
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__wake_rd, selectors.EVENT_READ)
+
+    def __apply_changes(self):
+        "Register added sockets and unregister removed sockets"
+        with self.__lock:
+            changes = self.__changes
+            self.__changes = []
+
+        for sock, srvr in changes:
+            if srvr is None:
+                try:
+                    self.__selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+                continue
+
+            try:
+                self.__selector.register(sock, selectors.EVENT_READ, srvr)
+            except:  # pylint: disable=bare-except
+                self.__drop(srvr, "register", unregister=False)
+
+    def __drop(self, srvr, action, unregister=True):
+        "Stop serving a log socket which can no longer be used"
+        print("LogSocketHub: dropping %s after failing to %s: %s" %
+              (srvr.cname, action, exc_string()), file=sys.stderr)
+        with self.__lock:
+            for sock, other in list(self.__servers.items()):
+                if other is srvr:
+                    del self.__servers[sock]
+        if unregister:
+            try:
+                self.__selector.unregister(srvr.socket)
+            except (KeyError, ValueError):
+                pass
+
+    def __loop(self):
+        "Service all registered log sockets"
+        while True:
+            self.__apply_changes()
+
+            with self.__lock:
+                if self.__thread is None:
+                    break
+                servers = list(self.__servers.values())
+
+            next_flush = None
+            for srvr in servers:
+                due = srvr.next_flush
+                if due is not None and (next_flush is None or
+                                        due < next_flush):
+                    next_flush = due
+
+            if next_flush is None:
+                timeout = 0.5
+            else:
+                timeout = max(0.0, next_flush - time.time())
+
+            try:
+                events = self.__selector.select(timeout)
+            except (OSError, ValueError, socket.error):
+                print("LogSocketHub: select failed: %s" % exc_string(),
+                      file=sys.stderr)
+                time.sleep(self.ERROR_SLEEP)
+                continue
+
+            for key, _ in events:
+                if key.data is None:
+                    self.__clear_wakeup()
+                    continue
+
+                with self.__lock:
+                    # skip servers which were removed while we were waiting
+                    srvr = self.__servers.get(key.fileobj)
+                if srvr is not None:
+                    try:
+                        srvr.drain()
+                    except socket.error:
+                        srvr.error_detected()
+                    except:  # pylint: disable=bare-except
+                        self.__drop(srvr, "read")
+
+            now = time.time()
+            for srvr in servers:
+                try:
+                    srvr.flush_if_due(now)
+                except:  # pylint: disable=bare-except
+                    self.__drop(srvr, "flush")
+
+    def __clear_wakeup(self):
+        "Empty the wakeup socket"
+        while True:
+            try:
+                if len(self.__wake_rd.recv(4096)) == 0:
+                    break
+            except socket.error:
+                break
+
+    def __wakeup(self):
+        "Interrupt the selector loop"
+        try:
+            self.__wake_wr.send(b"x")
+        except socket.error:
+            pass  # the loop will wake up on its own
+
+    def add(self, server):
+        "Start reading from a LogSocketServer's socket"
+        with self.__lock:
+            self.__servers[server.socket] = server
+            self.__changes.append((server.socket, server))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__loop,
+                                                 name=self.__name)
+                self.__thread.setDaemon(True)
+                self.__thread.start()
+        self.__wakeup()
+
+    @classmethod
+    def instance(cls):
+        "Return the process-wide log hub"
+        with cls.__INSTANCE_LOCK:
+            if cls.__INSTANCE is None:
+                cls.__INSTANCE = LogSocketHub()
+            return cls.__INSTANCE
+
+    @property
+    def num_servers(self):
+        "Return the number of log sockets served by this hub"
+        with self.__lock:
+            return len(self.__servers)
+
+    def remove(self, server):
+        """
+        Stop reading from a LogSocketServer's socket, draining any messages
+        still waiting in the socket
+        """
+        with self.__lock:
+            if server.socket not in self.__servers:
+                return
+            del self.__servers[server.socket]
+            self.__changes.append((server.socket, None))
+
+        # the loop may be using this socket; let it notice the removal
+        self.__wakeup()
+        server.drain()
+        server.flush()
+
+    def stop(self):
+        "Stop the hub thread"
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+        if thread is not None:
+            self.__wakeup()
+            thread.join()
 
 
 class BaseAppender(object):
@@ -2,13 +2,68 @@
 
 import datetime
 import os
+import socket
+import sys
 import tempfile
 import time
 import unittest
-from DAQLog import LogSocketServer
+from DAQLog import LogSocketHub, LogSocketServer
 
 from DAQMocks import SocketWriter
 
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class BrokenServer(object):
+    "Log server which fails when asked to read its socket"
+
+    def __init__(self, cname, close=False):
+        self.cname = cname
+        self.next_flush = None
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("localhost", 0))
+        if close:
+            self.socket.close()
+
+    def drain(self):
+        raise RuntimeError("Cannot read %s" % self.cname)
+
+    def error_detected(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def flush_if_due(self, now):
+        pass
+
+    @property
+    def port(self):
+        return self.socket.getsockname()[1]
+
+
+class HighServer(BrokenServer):
+    "Log server whose socket has a descriptor too large for select()"
+
+    HIGH_FD = 1500
+
+    def __init__(self, cname):
+        super(HighServer, self).__init__(cname)
+        self.received = []
+
+        low = self.socket
+        os.dup2(low.fileno(), self.HIGH_FD)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                                    fileno=self.HIGH_FD)
+        low.close()
+
+    def drain(self):
+        self.received.append(self.socket.recv(4096))
+
 
 class TestDAQLog(unittest.TestCase):
     "Test DAQLog class"
@@ -111,6 +166,168 @@ class TestDAQLog(unittest.TestCase):
 
         self.__check_log(log_path, ('%s - - [%s] %s' % (cname, now, msg), ))
 
+    def test_log_socket_server_burst(self):
+        "Test LogSocketServer with a burst of messages"
+        cname = 'burst'
+        log_path = os.path.join(TestDAQLog.DIR_PATH, cname + '.log')
+
+        self.__sock_log = LogSocketServer(None, cname, log_path, True)
+        self.__sock_log.start_serving()
+        for _ in range(5):
+            if self.__sock_log.is_serving:
+                break
+            time.sleep(0.1)
+        self.assertTrue(self.__sock_log.is_serving,
+                        'Log server was not started')
+
+        now = datetime.datetime.now()
+
+        client = SocketWriter('localhost', self.__sock_log.port)
+        expected = []
+        for idx in range(LogSocketServer.MAX_BATCH * 3):
+            msg = 'Burst message #%d' % idx
+            client.write_ts(msg, now)
+            expected.append('%s - - [%s] %s' % (cname, now, msg))
+        client.close()
+
+        # buffered lines should be flushed without stopping the server
+        for _ in range(20):
+            if len(self.__read_log(log_path)) == len(expected):
+                break
+            time.sleep(LogSocketServer.FLUSH_INTERVAL)
+
+        counters = self.__sock_log.counters
+        self.assertEqual(len(expected) - counters["dropped"],
+                         counters["received"])
+
+        self.__sock_log.stop_serving()
+
+        if counters["dropped"] == 0:
+            self.__check_log(log_path, expected)
+
+    def test_log_socket_hub(self):
+        "Test several LogSocketServers sharing a single LogSocketHub"
+        hub = LogSocketHub()
+
+        now = datetime.datetime.now()
+
+        servers = []
+        try:
+            for cname in ('foo', 'bar', 'baz'):
+                log_path = os.path.join(TestDAQLog.DIR_PATH, cname + '.log')
+                srvr = LogSocketServer(None, cname, log_path, True, hub=hub)
+                srvr.start_serving()
+                self.assertTrue(srvr.is_serving,
+                                'Log server %s was not started' % cname)
+                servers.append((cname, srvr))
+
+            self.assertEqual(len(servers), hub.num_servers)
+
+            for cname, srvr in servers:
+                client = SocketWriter('localhost', srvr.port)
+                client.write_ts('Hello from %s' % cname, now)
+                client.close()
+
+            # switch 'foo' to a new file; the socket should not change
+            cname, srvr = servers[0]
+            old_port = srvr.port
+            new_path = os.path.join(TestDAQLog.DIR_PATH, cname + '-new.log')
+            time.sleep(LogSocketServer.FLUSH_INTERVAL * 2)
+            srvr.set_output(new_path)
+            self.assertEqual(old_port, srvr.port)
+
+            client = SocketWriter('localhost', srvr.port)
+            client.write_ts('Switched', now)
+            client.close()
+        finally:
+            for _, srvr in servers:
+                srvr.stop_serving()
+            hub.stop()
+
+        self.assertEqual(0, hub.num_servers)
+
+        for cname, _ in servers:
+            log_path = os.path.join(TestDAQLog.DIR_PATH, cname + '.log')
+            self.__check_log(log_path, ('%s - - [%s] Hello from %s' %
+                                        (cname, now, cname), ))
+        self.__check_log(new_path, ('foo - - [%s] Switched' % (now, ), ))
+
+    def test_log_socket_hub_broken(self):
+        "Test that a LogSocketHub survives servers which fail"
+        hub = LogSocketHub()
+
+        now = datetime.datetime.now()
+
+        saved_stderr = sys.stderr
+        sys.stderr = StringIO()
+
+        broken = BrokenServer("broken")
+        closed = BrokenServer("closed", close=True)
+        log_path = os.path.join(TestDAQLog.DIR_PATH, 'good.log')
+        srvr = LogSocketServer(None, 'good', log_path, True, hub=hub)
+        try:
+            srvr.start_serving()
+            hub.add(broken)
+            hub.add(closed)
+
+            client = SocketWriter('localhost', broken.port)
+            client.write_ts('Oops', now)
+            client.close()
+
+            for _ in range(20):
+                if hub.num_servers == 1:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(1, hub.num_servers)
+
+            client = SocketWriter('localhost', srvr.port)
+            client.write_ts('Still here', now)
+            client.close()
+        finally:
+            srvr.stop_serving()
+            hub.stop()
+            broken.socket.close()
+            errors = sys.stderr.getvalue()
+            sys.stderr = saved_stderr
+
+        self.assertTrue("dropping broken after failing to read" in errors,
+                        "Unexpected errors: %s" % errors)
+        self.assertTrue("dropping closed after failing to register" in errors,
+                        "Unexpected errors: %s" % errors)
+        self.__check_log(log_path, ('good - - [%s] Still here' % (now, ), ))
+
+    @unittest.skipIf(sys.version_info < (3, ),
+                     "Cannot wrap a socket around a descriptor")
+    def test_log_socket_hub_high_fd(self):
+        "Test that a LogSocketHub serves sockets beyond select()'s limit"
+        try:
+            import resource
+            limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        except ImportError:
+            limit = 0
+        if limit <= HighServer.HIGH_FD:
+            self.skipTest("Cannot open descriptor %d" % HighServer.HIGH_FD)
+
+        hub = LogSocketHub()
+        srvr = HighServer("high")
+        try:
+            hub.add(srvr)
+
+            client = SocketWriter('localhost', srvr.port)
+            client.write('Hello')
+            client.close()
+
+            for _ in range(20):
+                if len(srvr.received) > 0:
+                    break
+                time.sleep(0.1)
+        finally:
+            hub.stop()
+            srvr.socket.close()
+
+        self.assertEqual(1, hub.num_servers)
+        self.assertEqual([b'Hello', ], srvr.received)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -25,7 +25,7 @@ from ComponentManager import ComponentManager
 from DAQClient import DAQClient
 from DAQConst import DAQPort
 from DAQLog import LogSocketServer
-from DefaultDomGeometry import DefaultDomGeometry
+from DefaultDomGeometry import DefaultDomGeometry, DefaultDomGeometryCache
 from LiveImports import MoniPort, SERVICE_NAME
 from RunCluster import RunCluster
 from RunSet import RunSet
@@ -490,6 +490,30 @@ class LogChecker(object):
         LogChecker.DEBUG = val
 
 
+class MockCacheDirectory(object):
+    "Keep tests from reading or writing the user's cache directory"
+
+    # saved values of the cache environment variable
+    __SAVED = []
+
+    @classmethod
+    def disable(cls):
+        "Turn off on-disk caching of parsed files"
+        env_name = DefaultDomGeometryCache.ENV_NAME
+        cls.__SAVED.append(os.environ.get(env_name))
+        os.environ[env_name] = ""
+
+    @classmethod
+    def restore(cls):
+        "Undo the most recent disable()"
+        env_name = DefaultDomGeometryCache.ENV_NAME
+        saved = cls.__SAVED.pop()
+        if saved is None:
+            os.environ.pop(env_name, None)
+        else:
+            os.environ[env_name] = saved
+
+
 class MockClusterWriter(object):
     """Base class for MockClusterConfigFile classes"""
     @classmethod
@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
+import os
 import shutil
 import tempfile
 import unittest
 from locate_pdaq import set_pdaq_config_dir
+from CnCExceptions import MissingComponentException
 from CnCServer import DAQPool
+from ComponentStateBoard import ComponentStateBoard
 from DAQClient import DAQClientState
 from DAQLog import LogSocketServer
 from RunOption import RunOption
@@ -265,6 +268,51 @@ class TestDAQPool(unittest.TestCase):
 
         logger.check_status(10)
 
+    def test_build_missing_component(self):
+        self.__run_config_dir = tempfile.mkdtemp()
+
+        mgr = MyDAQPool()
+
+        comp_list = []
+
+        comp = MockComponent('fooHub', 0)
+        comp.add_mock_output('aaa')
+        comp_list.append(comp)
+
+        comp = MockComponent('bar', 0)
+        comp.add_mock_input('aaa', 456)
+        comp_list.append(comp)
+
+        for comp in comp_list:
+            mgr.add(comp)
+
+        self.assertEqual(mgr.num_components, len(comp_list))
+
+        # 'baz' is in the run configuration but was never registered
+        missing = MockComponent('baz', 0)
+        run_config = self.__create_run_config_file(comp_list + [missing, ])
+
+        # don't try to restart the missing component
+        mgr.get_cluster_config = lambda run_config=None: None
+
+        logger = MockLogger('main')
+        logger.add_expected_exact("Loading run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_exact("Loaded run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_exact("Cannot restart missing components:"
+                                  " No cluster config")
+
+        self.assertRaises(MissingComponentException, mgr.make_runset,
+                          self.__run_config_dir, run_config, 0, 0, logger,
+                          None, force_restart=False, strict=False)
+
+        # the collected components were put back in the pool
+        self.assertEqual(mgr.num_components, len(comp_list))
+        self.assertEqual(mgr.num_sets, 0)
+
+        logger.check_status(10)
+
     def test_build_missing_one_output(self):
         self.__run_config_dir = tempfile.mkdtemp()
 
@@ -703,6 +751,111 @@ class TestDAQPool(unittest.TestCase):
 
         logger.check_status(10)
 
+    @classmethod
+    def __count_calls(cls, comp, name, counts):
+        "Count the number of times each component's 'name' method is called"
+        method = getattr(comp, name)
+
+        def wrapper(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return method(*args, **kwargs)
+
+        setattr(comp, name, wrapper)
+
+    def test_warm_runset(self):
+        self.__run_config_dir = tempfile.mkdtemp()
+
+        mgr = MyDAQPool()
+
+        comp_list = []
+
+        comp = MockComponent('fooHub', 0)
+        comp.add_mock_output('aaa')
+        comp_list.append(comp)
+
+        comp = MockComponent('bar', 0)
+        comp.add_mock_input('aaa', 1234)
+        comp_list.append(comp)
+
+        counts = {}
+        for comp in comp_list:
+            self.__count_calls(comp, "configure", counts)
+            self.__count_calls(comp, "connect", counts)
+            mgr.add(comp)
+
+        run_config = self.__create_run_config_file(comp_list)
+
+        logger = MockLogger('main')
+        logger.add_expected_exact("Loading run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_exact("Loaded run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_regexp(r"Built runset #\d+: .*")
+
+        runset = mgr.make_runset(self.__run_config_dir, run_config, 0, 0,
+                                 logger, None, force_restart=False,
+                                 strict=False)
+        logger.check_status(10)
+
+        cold_counts = {"configure": len(comp_list),
+                       "connect": len(comp_list)}
+        self.assertEqual(cold_counts, counts)
+
+        mgr.keep_runset_warm(runset, logger)
+        self.assertTrue(mgr.warm_runset is runset,
+                        "Runset #%d was not kept warm" % runset.id)
+
+        # the same run configuration reuses the configured runset
+        logger.add_expected_exact("Loading run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_exact("Loaded run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_regexp(r"Reusing warm runset #%d: .*" %
+                                   runset.id)
+
+        warm = mgr.make_runset(self.__run_config_dir, run_config, 1, 0,
+                               logger, None, force_restart=False,
+                               strict=False)
+        self.assertTrue(warm is runset, "Runset was not reused")
+        self.assertTrue(mgr.warm_runset is None,
+                        "Reused runset is still marked as warm")
+        self.assertEqual(mgr.num_components, 0)
+        self.__check_runset_state(runset, 'ready')
+        logger.check_status(10)
+
+        # the warm runset was not configured or connected again
+        self.assertEqual(cold_counts, counts)
+
+        # editing the run configuration forces a rebuild
+        mgr.keep_runset_warm(runset, logger)
+        path = os.path.join(self.__run_config_dir, run_config + ".xml")
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+
+        logger.add_expected_exact("Loading run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_exact("Loaded run configuration \"%s\"" %
+                                  run_config)
+        logger.add_expected_exact("Not reusing warm runset #%d"
+                                  " (run configuration changed)" %
+                                  runset.id)
+        logger.add_expected_regexp(r"Built runset #\d+: .*")
+
+        cold = mgr.make_runset(self.__run_config_dir, run_config, 2, 0,
+                               logger, None, force_restart=False,
+                               strict=False)
+        self.assertFalse(cold is runset, "Stale runset was reused")
+        self.assertTrue(runset.is_destroyed, "Stale runset was not destroyed")
+        self.assertEqual(mgr.num_sets, 1)
+        self.assertEqual({"configure": len(comp_list) * 2,
+                          "connect": len(comp_list) * 2}, counts)
+
+        mgr.return_runset(cold, logger)
+
+        self.assertEqual(mgr.num_components, len(comp_list))
+
+        logger.check_status(10)
+
     def test_start_run(self):
         self.__run_config_dir = tempfile.mkdtemp()
         set_pdaq_config_dir(self.__run_config_dir, override=True)
@@ -883,6 +1036,34 @@ class TestDAQPool(unittest.TestCase):
         for comp in comp_list:
             self.assertEqual(comp.monitor_count, 2)
 
+    def test_monitor_pushers(self):
+        mgr = MyDAQPool()
+
+        foo_hub = MockComponent('fooHub', 0)
+        foo_hub.set_monitor_state("idle")
+        mgr.add(foo_hub)
+
+        board = ComponentStateBoard.instance()
+        try:
+            board.update(foo_hub.name, foo_hub.num, "idle")
+
+            # components are polled once even if they push their state
+            self.assertEqual(1, mgr.monitor_clients())
+            self.assertEqual(1, foo_hub.monitor_count)
+
+            # after that, recent pushes are enough...
+            self.assertEqual(1, mgr.monitor_clients())
+            self.assertEqual(1, foo_hub.monitor_count)
+
+            # ...until it's time to check that the component isn't hung
+            mgr.PUSHER_POLL_SECS = 0.0
+            foo_hub.set_monitor_state(DAQClientState.DEAD)
+            self.assertEqual(0, mgr.monitor_clients())
+            self.assertEqual(2, foo_hub.monitor_count)
+            self.assertEqual(0, mgr.num_components)
+        finally:
+            board.forget(foo_hub.name, foo_hub.num)
+
 
 if __name__ == '__main__':
     unittest.main()
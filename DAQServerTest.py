@@ -8,7 +8,7 @@ from CnCExceptions import CnCServerException
 from CnCServer import CnCServer
 from DAQClient import DAQClient
 from DAQConst import DAQPort
-from DAQMocks import MockClusterConfig, MockCnCLogger, \
+from DAQMocks import MockCacheDirectory, MockClusterConfig, MockCnCLogger, \
     MockDefaultDomGeometryFile, MockLeapsecondFile, MockLogger, \
     MockRunConfigFile, SocketReaderFactory, SocketWriter
 from RunOption import RunOption
@@ -613,5 +613,14 @@ class TestDAQServer(unittest.TestCase):
         client_logger.check_status(10)
 
 
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
+
 if __name__ == '__main__':
     unittest.main()
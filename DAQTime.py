@@ -7,13 +7,13 @@ miscellaneous classes which convert DAQ ticks or a DAQ time string
 from __future__ import print_function
 
 import calendar
-import datetime
 import re
 import sys
 import time
 
 from i3helper import Comparable
 from leapseconds import LeapSeconds, MJD
+from timeparse import parse_fields
 
 
 class DAQDateTimeDelta(object):
@@ -236,25 +236,20 @@ class PayloadTime(object):
         if mtch is None:
             raise ValueError("Cannot parse date/time '%s'" % timestr)
 
-        basefmt = "%Y-%m-%d %H:%M:%S"
+        # log lines arrive in time order, so the parsed date/second prefix
+        # is almost always cached
+        year, month, day, hour, minute, second, _ = \
+          parse_fields(mtch.group(1))
 
-        ptm = time.strptime(mtch.group(1), basefmt)
-
-        if mtch.group(3) and len(mtch.group(3)) <= 6:
-            # legal subsecond value for strptime
-            temp_str = ".%s" % mtch.group(3)
-            dttm = datetime.datetime.strptime(temp_str, ".%f")
-            ticks = dttm.microsecond * 10000
+        subsec = mtch.group(3)
+        if not subsec:
+            ticks = 0
+        elif len(subsec) <= 10:
+            ticks = int(subsec.ljust(10, "0"))
         else:
-            if not mtch.group(3):
-                ticks = 0
-            else:
-                ticks = int(mtch.group(3))
-                for _ in range(10 - len(mtch.group(3))):
-                    ticks *= 10
+            ticks = int(subsec)
 
-        return DAQDateTime(ptm.tm_year, ptm.tm_mon, ptm.tm_mday, ptm.tm_hour,
-                           ptm.tm_min, ptm.tm_sec, ticks,
+        return DAQDateTime(year, month, day, hour, minute, second, ticks,
                            high_precision=high_precision)
 
     @classmethod
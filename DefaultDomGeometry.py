@@ -7,11 +7,15 @@ well as functions to modify and write out a new XML file
 
 from __future__ import print_function
 
+import hashlib
 import os
+import pickle
 import re
+import shutil
 import sys
+import tempfile
+import time
 
-from xml.dom import minidom, Node
 from xmlparser import XMLBadFileError, XMLFormatError, XMLParser
 
 from i3helper import Comparable
@@ -482,6 +486,12 @@ class DefaultDomGeometry(object):
         self.__strings = {}
         self.__translate_doms = translate_doms
         self.__dom_id_to_dom = {}
+        self.__mbid_to_dom = {}
+
+        # (string, position) and channel ID indexes, built on demand and
+        # discarded whenever strings or DOMs are added or removed
+        self.__loc_to_doms = None
+        self.__chan_id_to_dom = None
 
     @classmethod
     def __dump_coordinate(cls, out, axis, indent, value):
@@ -494,8 +504,32 @@ class DefaultDomGeometry(object):
 
         print("%s<%s>%s</%s>" % (indent, name, vstr, name), file=out)
 
+    def __build_indexes(self):
+        "Build the (string, position) and channel ID lookup tables"
+        loc_to_doms = {}
+        chan_id_to_dom = {}
+        for strnum, strobj in self.__strings.items():
+            for dom in strobj.doms:
+                key = (strnum, dom.pos)
+                if key not in loc_to_doms:
+                    loc_to_doms[key] = []
+                loc_to_doms[key].append(dom)
+
+                if dom.channel_id is not None and \
+                  dom.channel_id not in chan_id_to_dom:
+                    chan_id_to_dom[dom.channel_id] = dom
+
+        self.__loc_to_doms = loc_to_doms
+        self.__chan_id_to_dom = chan_id_to_dom
+
+    def __clear_indexes(self):
+        "Force the lookup tables to be rebuilt on the next lookup"
+        self.__loc_to_doms = None
+        self.__chan_id_to_dom = None
+
     def add_dom(self, dom):
         self.__strings[dom.string].add(dom)
+        self.__clear_indexes()
 
         if self.__translate_doms:
             mbid = dom.mbid
@@ -507,10 +541,16 @@ class DefaultDomGeometry(object):
                               (mbid, old_num, dom.string), file=sys.stderr)
 
                 self.__dom_id_to_dom[mbid] = dom
+                try:
+                    self.__mbid_to_dom[int(mbid, 16)] = dom
+                except ValueError:
+                    print("Bad mainboard ID \"%s\" for DOM %s" %
+                          (mbid, dom.name), file=sys.stderr)
 
     def add_string(self, string_num, error_on_multi=True):
         if string_num not in self.__strings:
             self.__strings[string_num] = String(string_num)
+            self.__clear_indexes()
         elif error_on_multi:
             raise XMLFormatError("Found multiple entries for string %d" %
                                  string_num)
@@ -519,6 +559,7 @@ class DefaultDomGeometry(object):
         if string_num not in self.__strings:
             raise XMLFormatError("String %d does not exist" % string_num)
         self.__strings[string_num].delete(dom)
+        self.__clear_indexes()
 
     def doms(self):
         "Convenience method to list all known DOMs"
@@ -601,29 +642,49 @@ class DefaultDomGeometry(object):
         print("</domGeometry>", file=out)
 
     def get_dom(self, str_num, pos, prod_id=None, orig_num=None):
-        if str_num not in self.__strings:
-            return None
+        if self.__loc_to_doms is None:
+            self.__build_indexes()
 
-        for dom in self.__strings[str_num].doms:
-            if dom.pos == pos:
-                if orig_num is not None:
-                    if dom.original_string is not None and \
-                       dom.original_string == orig_num:
-                        return dom
+        key = (str_num, pos)
+        if key not in self.__loc_to_doms:
+            return None
 
-                if prod_id is not None:
-                    if dom.prod_id == prod_id:
-                        return dom
+        for dom in self.__loc_to_doms[key]:
+            if orig_num is not None:
+                if dom.original_string is not None and \
+                   dom.original_string == orig_num:
+                    return dom
 
-                if prod_id is None and orig_num is None:
+            if prod_id is not None:
+                if dom.prod_id == prod_id:
                     return dom
 
+            if prod_id is None and orig_num is None:
+                return dom
+
         return None
 
+    def get_dom_by_channel_id(self, chan_id):
+        "Return the DOM with the requested channel ID (or None)"
+        if self.__chan_id_to_dom is None:
+            self.__build_indexes()
+        return self.__chan_id_to_dom.get(chan_id)
+
+    def get_dom_by_mbid(self, mbid):
+        """
+        Return the DOM with the requested integer mainboard ID (or None).
+        Only available if the geometry was loaded with 'translate_doms'
+        """
+        return self.__mbid_to_dom.get(mbid)
+
     def get_dom_id_to_dom_dict(self):
         "Get the DOM ID -> DOM object dictionary"
         return self.__dom_id_to_dom
 
+    def get_mbid_to_dom_dict(self):
+        "Get the integer mainboard ID -> DOM object dictionary"
+        return self.__mbid_to_dom
+
     @staticmethod
     def get_icetop_string(str_num):
         "Translate the in-ice string number to the corresponding icetop hub"
@@ -734,6 +795,9 @@ class DefaultDomGeometry(object):
                     self.add_string(dom.string, error_on_multi=False)
                     self.add_dom(dom)
 
+        # channel IDs may have changed even if no DOMs were moved
+        self.__clear_indexes()
+
     def set_partition(self, string_num, partition):
         if string_num not in self.__strings:
             raise XMLFormatError("String %d does not exist" % string_num)
@@ -762,6 +826,8 @@ class DefaultDomGeometry(object):
                 if not found_pos:
                     self.add_dom(newdom)
 
+        self.__clear_indexes()
+
     def validate(self):
         names = {}
         locs = {}
@@ -815,16 +881,197 @@ class DefaultDomGeometry(object):
                           file=sys.stderr)
                     dom.channel_id = new_id
 
+        self.__clear_indexes()
+
+
+class DefaultDomGeometryCache(object):
+    """
+    On-disk cache of parsed default-dom-geometry files.
+
+    Each cache file holds a pickled header (cache version, XML size, mtime,
+    and SHA1 hash) followed by a compact list of per-string tuples, so
+    loading it only needs to recreate the Python objects instead of
+    building and walking a full XML DOM.  The cache is used when the XML
+    file's size and mtime match, or (if only the mtime changed, as after a
+    deploy) when its content hash still matches.
+
+    By default the cache lives in the per-user cache directory
+    ($XDG_CACHE_HOME/pdaq or ~/.cache/pdaq).  The $PDAQ_CACHE environment
+    variable names a different directory, or disables caching if it is
+    empty or "none".
+    """
+
+    # increment this whenever the cached data layout changes
+    VERSION = 1
+
+    # environment variable which overrides (or disables) the default cache
+    # directory
+    ENV_NAME = "PDAQ_CACHE"
+
+    # name of pDAQ's subdirectory in the per-user cache directory
+    SUBDIR = "pdaq"
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = self.default_directory()
+        self.__cache_dir = cache_dir
+
+    def __cache_path(self, file_name):
+        "Return the path of the cache file for 'file_name'"
+        abspath = os.path.abspath(file_name).encode("utf-8")
+        digest = hashlib.sha1(abspath).hexdigest()
+        return os.path.join(self.__cache_dir, "ddg-%s.pkl" % digest)
+
+    @classmethod
+    def __hash_file(cls, file_name):
+        "Return the SHA1 hash of the contents of 'file_name'"
+        sha = hashlib.sha1()
+        with open(file_name, "rb") as fin:
+            while True:
+                data = fin.read(1024 * 1024)
+                if len(data) == 0:  # pylint: disable=len-as-condition
+                    break
+                sha.update(data)
+        return sha.hexdigest()
+
+    @classmethod
+    def __pack(cls, geom):
+        "Convert a DefaultDomGeometry object into a list of tuples"
+        strings = []
+        for strnum in geom.string_numbers:
+            strobj = geom.string_object(strnum)
+            doms = []
+            for dom in strobj.doms:
+                doms.append((dom.pos, dom.mbid, dom.name, dom.prod_id,
+                             dom.channel_id, dom.x_coord, dom.y_coord,
+                             dom.z_coord, dom.original_string,
+                             dom.original_order))
+            strings.append((strnum, strobj.rack, strobj.partition, doms))
+        return strings
+
+    @classmethod
+    def __unpack(cls, strings, translate_doms):
+        "Recreate a DefaultDomGeometry object from a list of tuples"
+        geom = DefaultDomGeometry(translate_doms)
+        for strnum, rack, partition, doms in strings:
+            geom.add_string(strnum)
+            if rack is not None:
+                geom.set_rack(strnum, rack)
+            if partition is not None:
+                geom.set_partition(strnum, partition)
+            for (pos, mbid, name, prod, chan_id, x_coord, y_coord, z_coord,
+                 orig_str, orig_order) in doms:
+                dom = DomGeometry(strnum, pos, mbid, name, prod, chan_id,
+                                  x_coord, y_coord, z_coord)
+                if orig_str is not None:
+                    dom.original_string = orig_str
+                dom.original_order = orig_order
+                geom.add_dom(dom)
+        return geom
+
+    @classmethod
+    def default_directory(cls):
+        "Return the default cache directory, or None if caching is disabled"
+        cache_dir = os.environ.get(cls.ENV_NAME)
+        if cache_dir is not None:
+            if cache_dir == "" or cache_dir.lower() == "none":
+                return None
+            return cache_dir
+
+        user_cache = os.environ.get("XDG_CACHE_HOME")
+        if user_cache is None or user_cache == "":
+            user_cache = os.path.expanduser(os.path.join("~", ".cache"))
+            if user_cache.startswith("~"):
+                # no home directory to cache in
+                return None
+        return os.path.join(user_cache, cls.SUBDIR)
+
+    @property
+    def enabled(self):
+        "Return True if this cache has a directory to read from and write to"
+        return self.__cache_dir is not None
+
+    def load(self, file_name, translate_doms=False):
+        """
+        Return the cached geometry for 'file_name', or None if there is no
+        cache file or if the XML file has changed
+        """
+        if self.__cache_dir is None:
+            return None
+
+        path = self.__cache_path(file_name)
+        try:
+            stat = os.stat(file_name)
+            with open(path, "rb") as fin:
+                header = pickle.load(fin)
+                if not isinstance(header, tuple) or len(header) != 5 or \
+                   header[0] != self.VERSION or \
+                   header[1] != os.path.abspath(file_name) or \
+                   header[2] != stat.st_size:
+                    return None
+
+                if header[3] != stat.st_mtime:
+                    # file was touched; see if its contents changed
+                    if header[4] != self.__hash_file(file_name):
+                        return None
+
+                strings = pickle.load(fin)
+        except (IOError, OSError, EOFError, ValueError, TypeError,
+                pickle.UnpicklingError):
+            return None
+
+        return self.__unpack(strings, translate_doms)
+
+    def save(self, file_name, geom):
+        """
+        Write the geometry parsed from 'file_name' to the cache.
+        Return False if the cache could not be written.
+        """
+        if self.__cache_dir is None:
+            return False
+
+        path = self.__cache_path(file_name)
+        tmp_path = "%s.%d" % (path, os.getpid())
+        try:
+            if not os.path.isdir(self.__cache_dir):
+                os.makedirs(self.__cache_dir)
+
+            stat = os.stat(file_name)
+            header = (self.VERSION, os.path.abspath(file_name), stat.st_size,
+                      stat.st_mtime, self.__hash_file(file_name))
+            with open(tmp_path, "wb") as fout:
+                pickle.dump(header, fout, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.__pack(geom), fout, pickle.HIGHEST_PROTOCOL)
+
+            # replace the old cache file atomically
+            os.rename(tmp_path, path)
+        except (IOError, OSError, pickle.PicklingError):
+            if os.path.exists(tmp_path):
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return False
+
+        return True
+
 
 class DefaultDomGeometryReader(XMLParser):
 
     @classmethod
-    def __parse_dom_node(cls, string_num, node):
-        "Extract a single DOM's data from the default-dom-geometry XML tree"
-        if node.attributes is not None \
-          and len(node.attributes) > 0:  # pylint: disable=len-as-condition
+    def __child_elements(cls, elem):
+        "Return all element children, skipping comments"
+        for kid in elem:
+            # comments and processing instructions have non-string tags
+            if isinstance(kid.tag, str):
+                yield kid
+
+    @classmethod
+    def __parse_dom_node(cls, string_num, elem):
+        "Extract a single DOM's data from a default-dom-geometry <dom> element"
+        if len(elem.attrib) > 0:  # pylint: disable=len-as-condition
             raise XMLFormatError("<%s> node has unexpected attributes" %
-                                 node.nodeName)
+                                 elem.tag)
 
         pos = None
         mbid = None
@@ -837,39 +1084,28 @@ class DefaultDomGeometryReader(XMLParser):
 
         orig_str = None
 
-        for kid in node.childNodes:
-            if kid.nodeType == Node.TEXT_NODE:
-                continue
-
-            if kid.nodeType == Node.COMMENT_NODE:
-                continue
-
-            if kid.nodeType == Node.ELEMENT_NODE:
-                if kid.nodeName == "position":
-                    pos = int(cls.get_child_text(kid))
-                elif kid.nodeName == "mainBoardId":
-                    mbid = cls.get_child_text(kid)
-                elif kid.nodeName == "name":
-                    name = cls.get_child_text(kid)
-                elif kid.nodeName == "productionId":
-                    prod = cls.get_child_text(kid)
-                elif kid.nodeName == "channelId":
-                    chan_id = int(cls.get_child_text(kid))
-                elif kid.nodeName == "xCoordinate":
-                    x_coord = float(cls.get_child_text(kid))
-                elif kid.nodeName == "yCoordinate":
-                    y_coord = float(cls.get_child_text(kid))
-                elif kid.nodeName == "zCoordinate":
-                    z_coord = float(cls.get_child_text(kid))
-                elif kid.nodeName == "originalString":
-                    orig_str = int(cls.get_child_text(kid))
-                else:
-                    raise XMLFormatError("Unexpected %s child <%s>" %
-                                         (node.nodeName, kid.nodeName))
-                continue
-
-            raise XMLFormatError("Found unknown %s node <%s>" %
-                                 (node.nodeName, kid.nodeName))
+        for kid in cls.__child_elements(elem):
+            if kid.tag == "position":
+                pos = int(kid.text)
+            elif kid.tag == "mainBoardId":
+                mbid = kid.text
+            elif kid.tag == "name":
+                name = kid.text
+            elif kid.tag == "productionId":
+                prod = kid.text
+            elif kid.tag == "channelId":
+                chan_id = int(kid.text)
+            elif kid.tag == "xCoordinate":
+                x_coord = float(kid.text)
+            elif kid.tag == "yCoordinate":
+                y_coord = float(kid.text)
+            elif kid.tag == "zCoordinate":
+                z_coord = float(kid.text)
+            elif kid.tag == "originalString":
+                orig_str = int(kid.text)
+            else:
+                raise XMLFormatError("Unexpected %s child <%s>" %
+                                     (elem.tag, kid.tag))
 
         dom = DomGeometry(string_num, pos, mbid, name, prod, chan_id, x_coord,
                           y_coord, z_coord)
@@ -880,107 +1116,124 @@ class DefaultDomGeometryReader(XMLParser):
         return dom
 
     @classmethod
-    def __parse_string_node(cls, geom, node):
-        "Extract data from a default-dom-geometry <string> node tree"
-        if node.attributes is not None and \
-          len(node.attributes) > 0:  # pylint: disable=len-as-condition
+    def __parse_string_node(cls, geom, elem):
+        "Extract data from a default-dom-geometry <string> element"
+        if len(elem.attrib) > 0:  # pylint: disable=len-as-condition
             raise XMLFormatError("<%s> node has unexpected attributes" %
-                                 node.nodeName)
+                                 elem.tag)
 
         string_num = None
         orig_order = 0
 
-        for kid in node.childNodes:
-            if kid.nodeType == Node.TEXT_NODE:
-                continue
-
-            if kid.nodeType == Node.COMMENT_NODE:
-                continue
-
-            if kid.nodeType == Node.ELEMENT_NODE:
-                if kid.nodeName == "number":
-                    if string_num is not None:
-                        raise XMLFormatError("Found multiple <number> nodes" +
-                                             " under <string>")
-                    string_num = int(cls.get_child_text(kid))
-                    geom.add_string(string_num)
-                    orig_order = 0
-                elif kid.nodeName == "rack":
-                    if string_num is None:
-                        raise XMLFormatError("Found <rack> before" +
-                                             " <number> under <string>")
-                    rack = int(cls.get_child_text(kid))
-                    geom.set_rack(string_num, rack)
-                elif kid.nodeName == "partition":
-                    if string_num is None:
-                        raise XMLFormatError("Found <partition> before" +
-                                             " <number> under <string>")
-                    geom.set_partition(string_num, cls.get_child_text(kid))
-                elif kid.nodeName == "dom":
-                    if string_num is None:
-                        raise XMLFormatError("Found <dom> before" +
-                                             " <number> under <string>")
-                    dom = cls.__parse_dom_node(string_num, kid)
-
-                    dom.original_order = orig_order
-                    orig_order += 1
-
-                    geom.add_dom(dom)
-                else:
-                    print("Ignoring unknown %s child <%s>" %
-                          (node.nodeName, kid.nodeName), file=sys.stderr)
-                continue
-
-            raise XMLFormatError("Found unknown %s node <%s>" %
-                                 (node.nodeName, kid.nodeName))
+        for kid in cls.__child_elements(elem):
+            if kid.tag == "number":
+                if string_num is not None:
+                    raise XMLFormatError("Found multiple <number> nodes" +
+                                         " under <string>")
+                string_num = int(kid.text)
+                geom.add_string(string_num)
+                orig_order = 0
+            elif kid.tag == "rack":
+                if string_num is None:
+                    raise XMLFormatError("Found <rack> before" +
+                                         " <number> under <string>")
+                geom.set_rack(string_num, int(kid.text))
+            elif kid.tag == "partition":
+                if string_num is None:
+                    raise XMLFormatError("Found <partition> before" +
+                                         " <number> under <string>")
+                geom.set_partition(string_num, kid.text)
+            elif kid.tag == "dom":
+                if string_num is None:
+                    raise XMLFormatError("Found <dom> before" +
+                                         " <number> under <string>")
+                dom = cls.__parse_dom_node(string_num, kid)
+
+                dom.original_order = orig_order
+                orig_order += 1
+
+                geom.add_dom(dom)
+            else:
+                print("Ignoring unknown %s child <%s>" %
+                      (elem.tag, kid.tag), file=sys.stderr)
 
         if string_num is None:
             raise XMLFormatError("String is missing number")
 
     @classmethod
-    def parse(cls, config_dir=None, file_name=None, translate_doms=False):
-        if config_dir is None:
-            config_dir = find_pdaq_config()
-
+    def parse(cls, config_dir=None, file_name=None, translate_doms=False,
+              use_cache=True, cache_dir=None):
+        """
+        Read the default-dom-geometry file.  If 'use_cache' is True, the
+        parsed data is loaded from (or saved to) a DefaultDomGeometryCache
+        in 'cache_dir' (or in the default cache directory)
+        """
         if file_name is None:
+            if config_dir is None:
+                config_dir = find_pdaq_config()
             file_name = os.path.join(config_dir, DefaultDomGeometry.FILENAME)
 
         if not os.path.exists(file_name):
             raise XMLBadFileError("Cannot read default dom geometry file"
                                   " \"%s\"" % file_name)
 
-        try:
-            dom = minidom.parse(file_name)
-        except Exception as exc:
-            raise XMLFormatError("Couldn't parse \"%s\": %s" %
-                                 (file_name, str(exc)))
+        if use_cache:
+            cache = DefaultDomGeometryCache(cache_dir)
+            geom = cache.load(file_name, translate_doms=translate_doms)
+            if geom is not None:
+                return geom
+
+        geom = cls.parse_xml(file_name, translate_doms=translate_doms)
 
-        g_list = dom.getElementsByTagName("domGeometry")
-        if g_list is None or len(g_list) != 1:
-            raise XMLFormatError("No <domGeometry> tag found in %s" %
-                                 file_name)
+        if use_cache:
+            cache.save(file_name, geom)
+
+        return geom
+
+    @classmethod
+    def parse_xml(cls, file_name, translate_doms=False):
+        """
+        Parse the default-dom-geometry XML file 'file_name'.  The file is
+        read incrementally and each <string> element is discarded as soon
+        as its DOMs have been added to the geometry.
+        """
+        # lxml is slow to import, so only load it when it's needed
+        from lxml import etree
 
         geom = DefaultDomGeometry(translate_doms)
-        for kid in g_list[0].childNodes:
-            if kid.nodeType == Node.TEXT_NODE:
-                continue
 
-            if kid.nodeType == Node.COMMENT_NODE:
-                continue
+        root = None
+        depth = 0
+        try:
+            for event, elem in etree.iterparse(file_name,
+                                               events=("start", "end"),
+                                               remove_comments=True):
+                if event == "start":
+                    if depth == 0:
+                        if elem.tag != "domGeometry":
+                            raise XMLFormatError("No <domGeometry> tag found"
+                                                 " in %s" % file_name)
+                        root = elem
+                    depth += 1
+                    continue
 
-            if kid.nodeType == Node.ELEMENT_NODE:
-                if kid.nodeName == "string":
-                    cls.__parse_string_node(geom, kid)
-                else:
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                if elem.tag != "string":
                     raise XMLFormatError("Unknown domGeometry node <%s>" %
-                                         kid.nodeName)
-                continue
+                                         elem.tag)
 
-            raise XMLFormatError("Found unknown domGeometry node <%s>" %
-                                 kid.nodeName)
+                cls.__parse_string_node(geom, elem)
 
-        # clean up XML objects
-        dom.unlink()
+                # discard the parsed subtree
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del root[0]
+        except etree.XMLSyntaxError as exc:
+            raise XMLFormatError("Couldn't parse \"%s\": %s" %
+                                 (file_name, str(exc)))
 
         return geom
 
@@ -1292,6 +1545,49 @@ class GeometryFileReader(object):
         return def_dom_geom
 
 
+def benchmark(file_name=None, reps=5):
+    "Compare the time needed to parse the XML file and to load the cache"
+    if file_name is None:
+        file_name = os.path.join(find_pdaq_config(),
+                                 DefaultDomGeometry.FILENAME)
+
+    cold = None
+    for _ in range(reps):
+        start = time.time()
+        geom = DefaultDomGeometryReader.parse_xml(file_name)
+        secs = time.time() - start
+        if cold is None or secs < cold:
+            cold = secs
+
+    # use a scratch cache directory if caching isn't enabled
+    cache_dir = DefaultDomGeometryCache.default_directory()
+    if cache_dir is None:
+        temp_dir = tempfile.mkdtemp()
+        cache_dir = temp_dir
+    else:
+        temp_dir = None
+
+    try:
+        DefaultDomGeometryCache(cache_dir).save(file_name, geom)
+
+        warm = None
+        for _ in range(reps):
+            start = time.time()
+            geom = DefaultDomGeometryReader.parse(file_name=file_name,
+                                                  cache_dir=cache_dir)
+            secs = time.time() - start
+            if warm is None or secs < warm:
+                warm = secs
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("%s: %d DOMs" % (file_name, len(list(geom.doms()))))
+    print("  XML parse:  %.3f secs" % (cold, ))
+    print("  Cache load: %.3f secs (%.1fx faster)" %
+          (warm, cold / max(warm, 0.000001)))
+
+
 def main():
     "Main program"
 
@@ -1302,9 +1598,16 @@ def main():
                         help="Name of input file")
     parser.add_argument("-o", "--output", dest="output_file",
                         help="Name of file where new geometry will be written")
+    parser.add_argument("-B", "--benchmark", dest="benchmark",
+                        action="store_true", default=False,
+                        help="Report cold (XML) and warm (cached) load times")
 
     args = parser.parse_args()
 
+    if args.benchmark:
+        benchmark(file_name=args.input_file)
+        return
+
     # read in default-dom-geometry.xml
     def_dom_geom = DefaultDomGeometryReader.parse(file_name=args.input_file)
 
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"DefaultDomGeometry cache unit tests"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from xmlparser import XMLFormatError
+from DefaultDomGeometry import DefaultDomGeometry, DefaultDomGeometryCache, \
+     DefaultDomGeometryReader, DomGeometry
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class DefaultDomGeometryCacheTest(unittest.TestCase):
+    GEOMETRY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "src", "test", "resources", "config",
+                            DefaultDomGeometry.FILENAME)
+
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+        self.__cache_dir = os.path.join(self.__temp_dir, "cache")
+
+        self.__saved_env = os.environ.get(DefaultDomGeometryCache.ENV_NAME)
+        os.environ[DefaultDomGeometryCache.ENV_NAME] = self.__cache_dir
+
+        self.__geom_file = os.path.join(self.__temp_dir,
+                                        DefaultDomGeometry.FILENAME)
+        shutil.copyfile(self.GEOMETRY, self.__geom_file)
+
+    def tearDown(self):
+        if self.__saved_env is None:
+            os.environ.pop(DefaultDomGeometryCache.ENV_NAME, None)
+        else:
+            os.environ[DefaultDomGeometryCache.ENV_NAME] = self.__saved_env
+
+        shutil.rmtree(self.__temp_dir, ignore_errors=True)
+
+    @classmethod
+    def __dump(cls, geom):
+        out = StringIO()
+        geom.dump(out)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        cache = DefaultDomGeometryCache()
+        self.assertTrue(cache.load(self.__geom_file) is None,
+                        "Found unexpected cache entry")
+
+        xml_geom = DefaultDomGeometryReader.parse(file_name=self.__geom_file)
+        self.assertTrue(os.path.isdir(self.__cache_dir),
+                        "Cache directory was not created")
+
+        cached = cache.load(self.__geom_file, translate_doms=True)
+        self.assertFalse(cached is None, "Geometry was not cached")
+        self.assertEqual(self.__dump(xml_geom), self.__dump(cached))
+        self.assertEqual(len(list(xml_geom.doms())),
+                         len(cached.get_dom_id_to_dom_dict()))
+
+    def test_default_directory(self):
+        saved_xdg = os.environ.get("XDG_CACHE_HOME")
+        try:
+            # without $PDAQ_CACHE, the per-user cache directory is used
+            del os.environ[DefaultDomGeometryCache.ENV_NAME]
+            os.environ["XDG_CACHE_HOME"] = self.__temp_dir
+            self.assertEqual(os.path.join(self.__temp_dir, "pdaq"),
+                             DefaultDomGeometryCache.default_directory())
+
+            DefaultDomGeometryReader.parse(file_name=self.__geom_file)
+            self.assertFalse(DefaultDomGeometryCache().load(self.__geom_file)
+                             is None, "Geometry was not cached")
+
+            for value in ("", "none", "None"):
+                os.environ[DefaultDomGeometryCache.ENV_NAME] = value
+                self.assertTrue(DefaultDomGeometryCache.default_directory()
+                                is None, "$%s=\"%s\" should disable caching" %
+                                (DefaultDomGeometryCache.ENV_NAME, value))
+        finally:
+            if saved_xdg is None:
+                os.environ.pop("XDG_CACHE_HOME", None)
+            else:
+                os.environ["XDG_CACHE_HOME"] = saved_xdg
+
+    def test_disabled(self):
+        # an empty $PDAQ_CACHE turns off caching
+        os.environ[DefaultDomGeometryCache.ENV_NAME] = ""
+
+        cache = DefaultDomGeometryCache()
+        self.assertFalse(cache.enabled, "Cache should be disabled")
+
+        geom = DefaultDomGeometryReader.parse(file_name=self.__geom_file)
+        self.assertFalse(cache.save(self.__geom_file, geom),
+                         "Disabled cache should not be saved")
+        self.assertTrue(cache.load(self.__geom_file) is None,
+                        "Disabled cache should not be loaded")
+        self.assertFalse(os.path.exists(self.__cache_dir),
+                         "Cache directory should not be created")
+
+        # an explicit directory enables the cache
+        DefaultDomGeometryReader.parse(file_name=self.__geom_file,
+                                       cache_dir=self.__cache_dir)
+        self.assertFalse(DefaultDomGeometryCache(self.__cache_dir).load(
+            self.__geom_file) is None, "Geometry was not cached")
+
+    def test_touched_file(self):
+        DefaultDomGeometryReader.parse(file_name=self.__geom_file)
+
+        # changing the mtime alone should not invalidate the cache
+        stat = os.stat(self.__geom_file)
+        os.utime(self.__geom_file, (stat.st_atime, stat.st_mtime + 10))
+        self.assertFalse(DefaultDomGeometryCache().load(self.__geom_file)
+                         is None, "Touched file invalidated the cache")
+
+    def test_changed_file(self):
+        DefaultDomGeometryReader.parse(file_name=self.__geom_file)
+
+        # swap two characters without changing the file size
+        with open(self.__geom_file, "r") as fin:
+            text = fin.read()
+        text = text.replace("<position>91</position>",
+                            "<position>19</position>", 1)
+        with open(self.__geom_file, "w") as fout:
+            fout.write(text)
+        stat = os.stat(self.__geom_file)
+        os.utime(self.__geom_file, (stat.st_atime, stat.st_mtime + 10))
+
+        self.assertTrue(DefaultDomGeometryCache().load(self.__geom_file)
+                        is None, "Changed file did not invalidate the cache")
+
+        geom = DefaultDomGeometryReader.parse(file_name=self.__geom_file)
+        self.assertEqual(self.__dump(geom),
+                         self.__dump(DefaultDomGeometryReader.parse_xml(
+                             self.__geom_file)))
+
+    def test_bad_root(self):
+        with open(self.__geom_file, "w") as fout:
+            fout.write("<notGeometry><string><number>1</number></string>"
+                       "</notGeometry>\n")
+
+        self.assertRaises(XMLFormatError, DefaultDomGeometryReader.parse_xml,
+                          self.__geom_file)
+
+    def test_bad_xml(self):
+        with open(self.__geom_file, "w") as fout:
+            fout.write("<domGeometry><string><number>1</number></string>\n")
+
+        self.assertRaises(XMLFormatError, DefaultDomGeometryReader.parse_xml,
+                          self.__geom_file)
+
+
+class DefaultDomGeometryLookupTest(unittest.TestCase):
+    def test_lookups(self):
+        geom = DefaultDomGeometryReader.parse_xml(
+            DefaultDomGeometryCacheTest.GEOMETRY, translate_doms=True)
+
+        mbid_dict = geom.get_mbid_to_dom_dict()
+        self.assertEqual(len(geom.get_dom_id_to_dom_dict()), len(mbid_dict))
+
+        for strnum in geom.string_numbers:
+            for dom in geom.doms_on_string(strnum):
+                if dom.pos is None:
+                    continue
+
+                found = geom.get_dom(strnum, dom.pos, prod_id=dom.prod_id)
+                self.assertTrue(found is dom, "Cannot find %s by location" %
+                                (dom, ))
+                if dom.mbid is not None:
+                    self.assertTrue(mbid_dict[int(dom.mbid, 16)] is
+                                    geom.get_dom_id_to_dom_dict()[dom.mbid])
+                if dom.channel_id is not None:
+                    found = geom.get_dom_by_channel_id(dom.channel_id)
+                    self.assertEqual(dom.channel_id, found.channel_id)
+
+        self.assertTrue(geom.get_dom(-1, 1) is None, "Found bogus DOM")
+        self.assertTrue(geom.get_dom_by_channel_id(-1) is None,
+                        "Found bogus channel ID")
+
+    def test_index_update(self):
+        geom = DefaultDomGeometry(translate_doms=True)
+        geom.add_string(1)
+        self.assertTrue(geom.get_dom(1, 1) is None, "Found bogus DOM")
+
+        dom = DomGeometry(1, 1, "123456789abc", "Foo", "UP1P0001", 1001)
+        geom.add_dom(dom)
+        self.assertTrue(geom.get_dom(1, 1) is dom, "Index was not updated")
+        self.assertTrue(geom.get_dom_by_channel_id(1001) is dom)
+        self.assertTrue(geom.get_dom_by_mbid(0x123456789abc) is dom)
+
+        geom.delete_dom(1, dom)
+        self.assertTrue(geom.get_dom(1, 1) is None, "Index was not updated")
+        self.assertTrue(geom.get_dom_by_channel_id(1001) is None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,8 @@ of all pDAQ software and data
 from __future__ import print_function
 
 import os
+import re
+import select
 import subprocess
 import sys
 import threading
@@ -32,6 +34,10 @@ SUBDIRS = ("target", "dash", "schema", "src", "PyDOM")
 NICE_LEVEL_DEFAULT = 19
 EXPRESS_DEFAULT = False
 WAIT_SECONDS_DEFAULT = 2
+# number of hosts updated directly, each of which then updates this many more
+FANOUT_DEFAULT = 8
+# rsync bandwidth limit in KBytes/second (0 means no limit)
+BWLIMIT_DEFAULT = 0
 
 # find top pDAQ directory
 PDAQ_HOME = find_pdaq_trunk()
@@ -80,6 +86,20 @@ def add_arguments(parser, config_as_arg=True):
                         default=NICE_LEVEL_DEFAULT,
                         help=("Set nice adjustment for remote rsyncs"
                               " [default=%s]" % NICE_LEVEL_DEFAULT))
+    parser.add_argument("--fanout", type=int, dest="fanout",
+                        default=FANOUT_DEFAULT,
+                        help=("Only rsync directly to this many hosts, then"
+                              " have each updated host rsync to this many"
+                              " more (0 rsyncs to every host directly)"
+                              " [default=%s]" % FANOUT_DEFAULT))
+    parser.add_argument("--bwlimit", type=int, dest="bwlimit",
+                        default=BWLIMIT_DEFAULT,
+                        help=("Limit each rsync to this many KBytes/second"
+                              " (0 means no limit) [default=%s]" %
+                              BWLIMIT_DEFAULT))
+    parser.add_argument("--stats", dest="show_stats",
+                        action="store_true", default=False,
+                        help="Report the time and bytes sent for each rsync")
     parser.add_argument("-E", "--express", dest="express",
                         action="store_true", default=EXPRESS_DEFAULT,
                         help=("Express rsyncs, unsets and overrides any/all"
@@ -94,22 +114,88 @@ def add_arguments(parser, config_as_arg=True):
                               " configuration files"))
 
 
+class RSyncResult(object):
+    "Timing and outcome of a single rsync command"
+
+    def __init__(self, description, host, command):
+        self.description = description
+        self.host = host
+        self.command = command
+
+        self.start_time = None
+        self.end_time = None
+        self.returncode = None
+        self.bytes_sent = None
+
+    def __str__(self):
+        if self.elapsed is None:
+            return "%s:%s (not run)" % (self.host, self.description)
+
+        rstr = ""
+        if self.rate is not None:
+            rstr = ", %.1f KB/s" % (self.rate / 1024.0, )
+        return "%s:%s %.2fs%s%s" % \
+          (self.host, self.description, self.elapsed, rstr,
+           "" if self.succeeded else " FAILED(%s)" % (self.returncode, ))
+
+    @property
+    def elapsed(self):
+        "Number of seconds taken by this command (or None if it didn't run)"
+        if self.start_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    @property
+    def rate(self):
+        "Bytes per second sent by rsync, if it reported the total"
+        if self.bytes_sent is None or not self.elapsed:
+            return None
+        return self.bytes_sent / self.elapsed
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0
+
+
 class RSyncRunner(object):
     """
-    Build a list of rsync commands, then run them all in parallel
+    Build a list of rsync commands, then run them all in parallel.
+
+    Commands may depend on an earlier command for another host (see
+    add_last()), which lets hosts which have already been updated serve
+    the rest of the cluster.  The number of concurrent commands starts
+    small and grows after each success, up to the number of threads,
+    and is halved after each failure so an overloaded network or server
+    isn't swamped with retries.
     """
 
     # default number of threads used to run all commands
     DEFAULT_THREADS = 16
+    # number of commands allowed to run before any have finished
+    INITIAL_WINDOW = 4
+
+    # rsync summary lines which report the number of bytes sent
+    SENT_PATTERNS = (re.compile(r"^Total bytes sent:\s+([\d,.]+)"),
+                     re.compile(r"^sent\s+([\d,.]+)\s+bytes"))
 
-    def __init__(self):
+    def __init__(self, stream_output=False):
         self.__queue = []
-        self.__qlock = threading.Lock()
+        self.__cond = threading.Condition()
+
+        # print each line of rsync output as soon as it's received
+        self.__stream_output = stream_output
 
         self.__running = False
         self.__threads = None
         self.__joined_threads = 0
 
+        self.__window = None
+        self.__active = 0
+
+        # (description, host) -> RSyncResult for all finished commands
+        self.__finished = {}
+        self.__results = []
+
     @classmethod
     def __clean_string(cls, string):
         """
@@ -146,74 +232,244 @@ class RSyncRunner(object):
 
         return kept
 
-    def __run(self):
+    def __execute(self, result):
         """
-        Main thread loop
+        Run a command, streaming its output if requested, and fill in the
+        timing and byte counts in 'result'.
+        Return a tuple containing the output and error text.
         """
-        self.__running = True
-        while self.__running:
-            with self.__qlock:
-                # if no commands remain, this thread can exit
-                if len(self.__queue) == 0:  # pylint: disable=len-as-condition
+        result.start_time = time.time()
+        proc = subprocess.Popen(result.command, shell=True,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+
+        # read both pipes as data arrives so neither one can fill up
+        chunks = {proc.stdout: [], proc.stderr: []}
+        partial = b""
+        pipes = [proc.stdout, proc.stderr]
+        while len(pipes) > 0:  # pylint: disable=len-as-condition
+            ready, _, _ = select.select(pipes, [], [])
+            for pipe in ready:
+                data = os.read(pipe.fileno(), 65536)
+                if len(data) == 0:  # pylint: disable=len-as-condition
+                    pipes.remove(pipe)
+                    continue
+
+                chunks[pipe].append(data)
+                if pipe is proc.stdout and self.__stream_output:
+                    lines = (partial + data).split(b"\n")
+                    partial = lines.pop()
+                    self.__print_lines(result, lines)
+        if len(partial) > 0 and \
+          self.__stream_output:  # pylint: disable=len-as-condition
+            self.__print_lines(result, [partial, ])
+
+        proc.wait()
+        result.end_time = time.time()
+        result.returncode = proc.returncode
+
+        outtext = b"".join(chunks[proc.stdout]).decode(errors="replace")
+        errtext = b"".join(chunks[proc.stderr])
+        proc.stdout.close()
+        proc.stderr.close()
+
+        for line in outtext.split("\n"):
+            for pat in self.SENT_PATTERNS:
+                mtch = pat.match(line)
+                if mtch is not None:
+                    result.bytes_sent = \
+                      int(float(mtch.group(1).replace(",", "")))
                     break
 
-                # queue contains a simple description and full shell command
-                description, cmdhost, cmd = self.__queue.pop()
-
-            # spawn a subprocess, read back the output and/or errors
-            proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-            outline, errline = proc.communicate()
-
-            # clean up returned strings
-            outline = self.__clean_string(outline)
-            errlines = self.__clean_rsync_errors(self.__clean_string(errline))
-
-            if proc.returncode == 0:
-                # there shouldn't be any error messages if return code is 0
-                if errlines is not None and len(errlines) > 0:
-                    with self.__qlock:
-                        print("Unexpected error(s) after rsyncing %s to %s" %
-                              (description, cmdhost))
-                        for line in errlines:
-                            print("\t%s" % (line, ), file=sys.stderr)
+        return outtext, errtext
+
+    def __finish(self, result):
+        "Record a finished command and adjust the concurrency window"
+        with self.__cond:
+            self.__active -= 1
+            self.__finished[(result.description, result.host)] = result
+            self.__results.append(result)
+
+            if result.succeeded:
+                self.__window = min(self.__window + 1, len(self.__threads))
             else:
-                # attempt to make the error lines readable
-                with self.__qlock:
-                    if errlines is None or len(errlines) > 1:
-                        errstr = ""
-                    else:
-                        errstr = "\n\t" + errlines[0]
-                        errlines = None
-
-                    print("rsyncing %s to %s failed with return code %d%s" %
-                          (description, cmdhost, proc.returncode, errstr),
-                          file=sys.stderr)
-                    if outline is not None:
-                        print("%s:%s>> %s" % (cmdhost, description, outline))
-                    if errlines is not None:
-                        for line in errlines:
-                            print("\t%s" % (line, ), file=sys.stderr)
+                self.__window = max(1, self.__window // 2)
+
+            self.__cond.notify_all()
+
+    def __next_command(self):
+        """
+        Wait until a command can be run, then return its RSyncResult.
+        Return None if there's nothing left to do.
+        """
+        with self.__cond:
+            while self.__running:
+                if len(self.__queue) == 0:  # pylint: disable=len-as-condition
+                    return None
+
+                if self.__active < self.__window:
+                    entry = self.__pop_ready()
+                    if entry is not None:
+                        self.__active += 1
+                        return entry
+
+                    if self.__active == 0:
+                        # nothing is running, so whatever the remaining
+                        # commands are waiting for will never finish
+                        entry = self.__pop_ready(force=True)
+                        self.__active += 1
+                        return entry
+
+                self.__cond.wait(1.0)
+
+        return None
+
+    def __pop_ready(self, force=False):
+        """
+        Remove and return the last command whose prerequisite (if any) has
+        finished.  If the prerequisite failed, switch to the fallback
+        command.  If 'force' is True, return the last command even if its
+        prerequisite is still unfinished.
+        """
+        for idx in range(len(self.__queue) - 1, -1, -1):
+            description, host, command, after, fallback = self.__queue[idx]
+            if after is not None and not force:
+                if (description, after) not in self.__finished:
+                    continue
+                if not self.__finished[(description, after)].succeeded:
+                    command = fallback
+            elif after is not None:
+                command = fallback
+
+            del self.__queue[idx]
+            return RSyncResult(description, host, command)
+
+        return None
+
+    def __print_lines(self, result, lines):
+        "Print lines of rsync output, tagged with the host and description"
+        with self.__cond:
+            for line in lines:
+                line = line.decode(errors="replace").rstrip()
+                if line != "":
+                    print("%s:%s>> %s" % (result.host, result.description,
+                                          line))
+
+    def __report_errors(self, result, outtext, errtext):
+        "Report any errors from a finished command"
+
+        # clean up returned strings
+        outline = self.__clean_string(outtext)
+        errlines = self.__clean_rsync_errors(self.__clean_string(errtext))
+
+        if result.succeeded:
+            # there shouldn't be any error messages if return code is 0
+            if errlines is not None and len(errlines) > 0:
+                with self.__cond:
+                    print("Unexpected error(s) after rsyncing %s to %s" %
+                          (result.description, result.host))
+                    for line in errlines:
+                        print("\t%s" % (line, ), file=sys.stderr)
+        else:
+            # attempt to make the error lines readable
+            with self.__cond:
+                if errlines is None or len(errlines) > 1:
+                    errstr = ""
+                else:
+                    errstr = "\n\t" + errlines[0]
+                    errlines = None
+
+                print("rsyncing %s to %s failed with return code %d%s" %
+                      (result.description, result.host, result.returncode,
+                       errstr), file=sys.stderr)
+                if outline is not None and not self.__stream_output:
+                    print("%s:%s>> %s" % (result.host, result.description,
+                                          outline))
+                if errlines is not None:
+                    for line in errlines:
+                        print("\t%s" % (line, ), file=sys.stderr)
+
+    def __run(self):
+        """
+        Main thread loop
+        """
+        while True:
+            result = self.__next_command()
+            if result is None:
+                break
+
+            if result.command is None:
+                # prerequisite failed and there's no fallback
+                result.returncode = -1
+                print("Not rsyncing %s to %s; its source failed" %
+                      (result.description, result.host), file=sys.stderr)
+                self.__finish(result)
+                continue
+
+            try:
+                outtext, errtext = self.__execute(result)
+            except (OSError, select.error) as err:
+                result.returncode = -1
+                outtext, errtext = None, str(err)
+
+            self.__report_errors(result, outtext, errtext)
+            self.__finish(result)
 
     def add_first(self, description, host, command):
         """
         Add this command to the front of the queue
         """
-        with self.__qlock:
-            self.__queue.insert(0, (description, host, command))
+        with self.__cond:
+            self.__queue.insert(0, (description, host, command, None, None))
 
-    def add_last(self, description, host, command):
+    def add_last(self, description, host, command, after=None,
+                 fallback=None):
         """
-        Append this command to the back of the queue
+        Append this command to the back of the queue.
+        If 'after' is specified, the command won't run until the command
+        with the same description for host 'after' has finished.  If that
+        command fails, 'fallback' (if specified) is run instead.
         """
-        with self.__qlock:
-            self.__queue.append((description, host, command))
+        with self.__cond:
+            self.__queue.append((description, host, command, after,
+                                 fallback))
 
     @property
     def num_remaining_commands(self):
         "Return the number of commands which have not yet been run"
         return len(self.__queue)
 
+    def report(self, out=None):
+        "Print the time taken by each command, slowest first"
+        if out is None:
+            out = sys.stdout
+
+        results = sorted(self.__results, key=lambda x: x.elapsed or 0.0,
+                         reverse=True)
+        if len(results) == 0:  # pylint: disable=len-as-condition
+            return
+
+        total_bytes = 0
+        for result in results:
+            print("  %s" % (result, ), file=out)
+            if result.bytes_sent is not None:
+                total_bytes += result.bytes_sent
+
+        times = [(x.start_time, x.end_time) for x in results
+                 if x.elapsed is not None]
+        if len(times) == 0:  # pylint: disable=len-as-condition
+            elapsed = 0.0
+        else:
+            elapsed = max(x[1] for x in times) - min(x[0] for x in times)
+        failed = len([x for x in results if not x.succeeded])
+        print("Ran %d rsyncs (%d failed) in %.2fs, %d bytes sent" %
+              (len(results), failed, elapsed, total_bytes), file=out)
+
+    @property
+    def results(self):
+        "Return the RSyncResult for each finished command"
+        return self.__results[:]
+
     @property
     def running_threads(self):
         "Return the number of running threads"
@@ -237,6 +493,8 @@ class RSyncRunner(object):
         # initialize thread-tracking stuff
         self.__threads = []
         self.__joined_threads = 0
+        self.__window = min(self.INITIAL_WINDOW, num_threads)
+        self.__running = True
 
         # start all threads
         for idx in range(num_threads):
@@ -254,11 +512,18 @@ class RSyncRunner(object):
                         self.__threads[idx] = None
                         self.__joined_threads += 1
 
+        self.__running = False
+
     @property
     def total_threads(self):
         "Return the number of threads created by start()"
         return len(self.__threads)
 
+    @property
+    def window(self):
+        "Return the current maximum number of concurrent commands"
+        return self.__window
+
 
 def collapse_user(path, home=None):
     """
@@ -275,9 +540,14 @@ def collapse_user(path, home=None):
 def deploy(config, pdaq_dir, subdirs, delete, dry_run, deep_dry_run,
            trace_level, nice_level=NICE_LEVEL_DEFAULT, express=EXPRESS_DEFAULT,
            wait_seconds=WAIT_SECONDS_DEFAULT, home=None,
-           rsync_runner=None):
+           rsync_runner=None, fanout=FANOUT_DEFAULT, show_stats=False,
+           bwlimit=BWLIMIT_DEFAULT):
     """
-    Deploy pDAQ software and configuration files to the cluster
+    Deploy pDAQ software and configuration files to the cluster.
+    If 'fanout' is greater than zero, only that many hosts are updated
+    directly and each updated host then rsyncs to up to 'fanout' more.
+    If 'bwlimit' is greater than zero, each rsync (including those run by
+    updated hosts) sends at most that many KBytes/second.
     """
     if subdirs is None:
         subdirs = SUBDIRS
@@ -300,7 +570,7 @@ def deploy(config, pdaq_dir, subdirs, delete, dry_run, deep_dry_run,
 
     # if user or unit tests didn't specify a command runner, create one
     if rsync_runner is None:
-        rsync_runner = RSyncRunner()
+        rsync_runner = RSyncRunner(stream_output=trace_level > 0)
 
     # build stub of rsync command
     if express:
@@ -312,6 +582,10 @@ def deploy(config, pdaq_dir, subdirs, delete, dry_run, deep_dry_run,
     rsync_cmd_stub += " -azLC%s%s" % (delete and ' --delete' or '',
                                       deep_dry_run and ' --dry-run' or '')
     rsync_cmd_stub += " --exclude .hg"
+    if bwlimit is not None and bwlimit > 0:
+        rsync_cmd_stub += " --bwlimit=%d" % (bwlimit, )
+    if show_stats:
+        rsync_cmd_stub += " --stats"
 
     # set 'rsync_config_src' to the configuration directory path, or None
     # if 'config' is a subdirectory of 'pdaq'
@@ -333,6 +607,14 @@ def deploy(config, pdaq_dir, subdirs, delete, dry_run, deep_dry_run,
     if not rsync_deploy_src.startswith("~"):
         rsync_deploy_src = os.path.abspath(rsync_deploy_src)
 
+    # the same files, as seen from a host which has already been deployed
+    relay_deploy_src = os.path.join(pdaq_dir, "{" + ",".join(subdirs) + "}")
+    if rsync_config_src is None:
+        relay_config_src = None
+    else:
+        relay_config_src = "~%s/%s" % (os.environ["USER"],
+                                       os.path.basename(rsync_config_src))
+
     # Check if target directory (the result of a build) is present
     target_dir = os.path.join(pdaq_dir, 'target')
     if target_dir.startswith("~"):
@@ -349,31 +631,55 @@ def deploy(config, pdaq_dir, subdirs, delete, dry_run, deep_dry_run,
     if len(hosts) > 0 and trace_level > 0:  # pylint: disable=len-as-condition
         print("COMMANDS:")
 
-    for node_name in sorted(hosts.keys()):
-        # Ignore localhost - already "deployed"
-        if node_name == "localhost":
-            continue
+    # Ignore localhost - already "deployed"
+    node_names = [x for x in sorted(hosts.keys()) if x != "localhost"]
+
+    for idx, node_name in enumerate(node_names):
+        # when fanning out, later hosts are fed by an already-updated host
+        if fanout is not None and 0 < fanout <= idx:
+            source = node_names[(idx - fanout) // fanout]
+        else:
+            source = None
 
         # build the command to rsync the executables
         cmd = "%s %s %s:%s" % \
           (rsync_cmd_stub, rsync_deploy_src, node_name, pdaq_dir)
+        if source is None:
+            relay = None
+        else:
+            relay = "ssh %s '%s %s %s:%s'" % \
+              (source, rsync_cmd_stub, relay_deploy_src, node_name, pdaq_dir)
         if trace_level > 0 or dry_run:
-            print("  " + cmd)
+            print("  " + (cmd if relay is None else relay))
 
         # add to the end of the command queue
         if not dry_run:
-            rsync_runner.add_last("application", node_name, cmd)
+            if relay is None:
+                rsync_runner.add_last("application", node_name, cmd)
+            else:
+                rsync_runner.add_last("application", node_name, relay,
+                                      after=source, fallback=cmd)
 
         if rsync_config_src is not None:
             # build the command to rsync the configuration directory
             cmd = "%s %s %s:~%s" % (rsync_cmd_stub, rsync_config_src,
                                     node_name, os.environ["USER"])
+            if source is None:
+                relay = None
+            else:
+                relay = "ssh %s '%s %s %s:~%s'" % \
+                  (source, rsync_cmd_stub, relay_config_src, node_name,
+                   os.environ["USER"])
             if trace_level > 0 or dry_run:
-                print("  " + cmd)
+                print("  " + (cmd if relay is None else relay))
 
             # add to the front of the command queue
             if not dry_run:
-                rsync_runner.add_first("configuration", node_name, cmd)
+                if relay is None:
+                    rsync_runner.add_first("configuration", node_name, cmd)
+                else:
+                    rsync_runner.add_last("configuration", node_name, relay,
+                                          after=source, fallback=cmd)
 
     if not dry_run:
         # start the threads and wait until all are finished
@@ -390,6 +696,9 @@ def deploy(config, pdaq_dir, subdirs, delete, dry_run, deep_dry_run,
                            rsync_runner.num_remaining_commands))
             time.sleep(wait_seconds)
 
+        if show_stats:
+            rsync_runner.report()
+
 
 def hub_type(comp_id):
     "Return a description of the hub type"
@@ -467,7 +776,8 @@ def run_deploy(args):
     deploy(config, PDAQ_HOME, SUBDIRS, args.delete,
            args.dry_run, args.deep_dry_run, trace_level,
            wait_seconds=wait_seconds, nice_level=args.nice_level,
-           express=args.express)
+           express=args.express, fanout=args.fanout,
+           show_stats=args.show_stats, bwlimit=args.bwlimit)
 
 
 def main():
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import os
+import shutil
 import tempfile
 import unittest
 
@@ -79,6 +80,30 @@ class MockRSyncRunner(object):
         return 0
 
 
+class RecordingRSyncRunner(MockRSyncRunner):
+    "Remember the prerequisite host for each queued command"
+
+    def __init__(self):
+        super(RecordingRSyncRunner, self).__init__()
+        self.sources = {}
+        self.commands = []
+
+    def add_first(self, description, hostname, command):
+        self.sources[(description, hostname)] = None
+        self.commands.append(command)
+
+    def add_last(self, description, hostname, command, after=None,
+                 fallback=None):
+        self.sources[(description, hostname)] = after
+        self.commands.append(command)
+        if fallback is not None:
+            self.commands.append(fallback)
+        if after is not None and not command.startswith("ssh %s " % after):
+            raise Exception("Bad relay command \"%s\"" % command)
+        if after is not None and fallback is None:
+            raise Exception("No fallback for \"%s\"" % command)
+
+
 class DeployPDAQTest(unittest.TestCase):
     @classmethod
     def __check_deploy(cls, hosts, subdirs, delete, dry_run, deep_dry_run,
@@ -199,6 +224,135 @@ class DeployPDAQTest(unittest.TestCase):
         self.__check_deploy(hosts, subdirs, delete, dry_run, deep_dry_run,
                             nice_level, express)
 
+    def test_deploy_fanout(self):
+        top_dir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(top_dir, "target"))
+
+            hosts = ["host%d" % idx for idx in range(7)]
+            runner = RecordingRSyncRunner()
+
+            DeployPDAQ.deploy(MockClusterConfig(hosts), top_dir, ("ABC", ),
+                              False, False, False, -1, home=top_dir,
+                              wait_seconds=0, rsync_runner=runner,
+                              fanout=2)
+        finally:
+            shutil.rmtree(top_dir, ignore_errors=True)
+
+        expected = {
+            "host0": None, "host1": None,
+            "host2": "host0", "host3": "host0",
+            "host4": "host1", "host5": "host1",
+            "host6": "host2",
+        }
+        for (description, host), source in runner.sources.items():
+            self.assertEqual(expected[host], source,
+                             "%s %s should come from %s, not %s" %
+                             (host, description, expected[host], source))
+        self.assertEqual(len(hosts),
+                         len([x for x in runner.sources
+                              if x[0] == "application"]))
+
+    def test_deploy_bwlimit(self):
+        top_dir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(top_dir, "target"))
+
+            # use enough hosts that some are fed by the default fan-out
+            num_hosts = DeployPDAQ.FANOUT_DEFAULT + 2
+            hosts = ["host%02d" % idx for idx in range(num_hosts)]
+            runner = RecordingRSyncRunner()
+
+            DeployPDAQ.deploy(MockClusterConfig(hosts), top_dir, ("ABC", ),
+                              False, False, False, -1, home=top_dir,
+                              wait_seconds=0, rsync_runner=runner,
+                              bwlimit=500)
+        finally:
+            shutil.rmtree(top_dir, ignore_errors=True)
+
+        relayed = [key for key, src in runner.sources.items()
+                   if key[0] == "application" and src is not None]
+        self.assertEqual(2, len(relayed))
+
+        # relayed rsyncs are limited as well as direct ones
+        for cmd in runner.commands:
+            self.assertEqual(1, cmd.count("--bwlimit=500"),
+                             "Bad bandwidth limit in \"%s\"" % cmd)
+
+
+class RSyncRunnerTest(unittest.TestCase):
+    "Run RSyncRunner against stand-in hosts in a temporary directory"
+
+    def setUp(self):
+        self.__top_dir = tempfile.mkdtemp()
+        self.__source = os.path.join(self.__top_dir, "source")
+        os.mkdir(self.__source)
+        with open(os.path.join(self.__source, "file.txt"), "w") as fout:
+            fout.write("payload\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.__top_dir, ignore_errors=True)
+
+    def __copy(self, src, host):
+        "Return a command which 'deploys' the 'src' directory to 'host'"
+        return "cp -r %s %s" % (src, os.path.join(self.__top_dir, host))
+
+    def __deployed(self, host):
+        return os.path.exists(os.path.join(self.__top_dir, host, "file.txt"))
+
+    def test_fanout(self):
+        hosts = ["h%d" % idx for idx in range(7)]
+
+        runner = DeployPDAQ.RSyncRunner()
+        for idx, host in enumerate(hosts):
+            direct = self.__copy(self.__source, host)
+            if idx < 2:
+                runner.add_last("application", host, direct)
+            else:
+                parent = hosts[(idx - 2) // 2]
+                relay = self.__copy(os.path.join(self.__top_dir, parent),
+                                    host)
+                runner.add_last("application", host, relay, after=parent,
+                                fallback=direct)
+        runner.start(num_threads=4)
+
+        results = dict((x.host, x) for x in runner.results)
+        self.assertEqual(len(hosts), len(results))
+        for idx, host in enumerate(hosts):
+            self.assertTrue(self.__deployed(host), "%s was not deployed" %
+                            (host, ))
+            self.assertTrue(results[host].succeeded)
+            if idx >= 2:
+                parent = results[hosts[(idx - 2) // 2]]
+                self.assertTrue(results[host].start_time >= parent.end_time,
+                                "%s started before %s finished" %
+                                (host, parent.host))
+        self.assertEqual(4, runner.window)
+
+    def test_fallback(self):
+        runner = DeployPDAQ.RSyncRunner()
+        runner.add_last("application", "bad", "exit 3")
+        runner.add_last("application", "child",
+                        self.__copy(os.path.join(self.__top_dir, "bad"),
+                                    "child"), after="bad",
+                        fallback=self.__copy(self.__source, "child"))
+        runner.start(num_threads=2)
+
+        results = dict((x.host, x) for x in runner.results)
+        self.assertEqual(3, results["bad"].returncode)
+        self.assertTrue(results["child"].succeeded)
+        self.assertTrue(self.__deployed("child"), "Fallback was not run")
+
+    def test_bytes_sent(self):
+        runner = DeployPDAQ.RSyncRunner()
+        runner.add_last("application", "foo",
+                        "echo 'sent 1,234 bytes  received 56 bytes'")
+        runner.start(num_threads=1)
+
+        result = runner.results[0]
+        self.assertEqual(1234, result.bytes_sent)
+        self.assertTrue(result.elapsed is not None, "No elapsed time")
+
 
 if __name__ == '__main__':
     unittest.main()
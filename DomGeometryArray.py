@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+"""
+Compact, array-backed copy of pDAQ's default-dom-geometry information.
+
+Every DOM attribute is held in a NumPy array (one entry per DOM) so a full
+detector costs a few hundred kilobytes instead of thousands of Python
+objects, and queries like "all IceTop DOMs" or "all DOMs on rack 3" are
+single vectorized operations.  DomGeometryView objects provide the
+read-only DomGeometry API for individual entries.
+"""
+
+from __future__ import print_function
+
+from DefaultDomGeometry import DefaultDomGeometryReader, DomGeometry, \
+     DomGeometryException
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class DomGeometryView(object):
+    "Read-only DomGeometry-style view of a single DomGeometryArray entry"
+
+    def __init__(self, array, index):
+        self.__array = array
+        self.__index = index
+
+    def __eq__(self, other):
+        return isinstance(other, DomGeometryView) and \
+          self.__array is other.array and self.__index == other.index
+
+    def __hash__(self):
+        return hash((id(self.__array), self.__index))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return "DomGeometryView(%s)" % (self, )
+
+    def __str__(self):
+        return "%s[%s] %s" % (self.mbid, self.name, self.location())
+
+    def __int_value(self, values):
+        "Return the integer at this index, or None if it's unset"
+        val = values[self.__index]
+        if val < 0:
+            return None
+        return int(val)
+
+    def __float_value(self, values):
+        "Return the float at this index, or None if it's unset"
+        val = values[self.__index]
+        if numpy.isnan(val):
+            return None
+        return float(val)
+
+    @property
+    def array(self):
+        return self.__array
+
+    @property
+    def channel_id(self):
+        return self.__int_value(self.__array.channel_ids)
+
+    @property
+    def description(self):
+        desc = self.__array.descriptions[self.__index]
+        if desc is None:
+            return "-"
+        return desc
+
+    @property
+    def index(self):
+        return self.__index
+
+    @property
+    def is_icetop(self):
+        return bool(self.__array.icetop_mask[self.__index])
+
+    @property
+    def is_inice(self):
+        return bool(self.__array.inice_mask[self.__index])
+
+    @property
+    def is_real_dom(self):
+        return bool(self.__array.real_dom_mask[self.__index])
+
+    @property
+    def is_scintillator(self):
+        return bool(self.__array.scintillator_mask[self.__index])
+
+    def location(self):
+        strnum = self.original_string
+        if strnum is None:
+            strnum = self.string
+
+        pos = self.pos
+        if strnum is not None:
+            if pos is not None:
+                return "%02d-%02d" % (strnum, pos)
+            return "%02d-??" % (strnum, )
+
+        if pos is not None:
+            return "??-%02d" % (pos, )
+
+        return "[Not Deployed]"
+
+    @property
+    def mbid(self):
+        if not self.__array.has_mbid[self.__index]:
+            return None
+        return "%012x" % self.__array.mbids[self.__index]
+
+    @property
+    def name(self):
+        return self.__array.names[self.__index]
+
+    @property
+    def original_order(self):
+        return self.__int_value(self.__array.original_orders)
+
+    @property
+    def original_string(self):
+        return self.__int_value(self.__array.original_strings)
+
+    @property
+    def pos(self):
+        return self.__int_value(self.__array.positions)
+
+    @property
+    def prod_id(self):
+        return self.__array.prod_ids[self.__index]
+
+    @property
+    def rack(self):
+        return self.__int_value(self.__array.racks)
+
+    @property
+    def string(self):
+        return self.__int_value(self.__array.strings)
+
+    @property
+    def x_coord(self):
+        return self.__float_value(self.__array.x_coords)
+
+    @property
+    def y_coord(self):
+        return self.__float_value(self.__array.y_coords)
+
+    @property
+    def z_coord(self):
+        return self.__float_value(self.__array.z_coords)
+
+
+class DomGeometryArray(object):
+    """
+    Struct-of-arrays DOM geometry.  Missing integer values are stored
+    as -1 and missing coordinates as NaN.
+    """
+
+    def __init__(self, doms, string_info=None):
+        """
+        Build the arrays from a sequence of DomGeometry-like objects.
+        'string_info' maps string numbers to (rack, partition) tuples.
+        """
+        if numpy is None:
+            raise DomGeometryException("DomGeometryArray requires NumPy")
+
+        if string_info is None:
+            string_info = {}
+
+        doms = list(doms)
+        num = len(doms)
+
+        self.__mbids = numpy.zeros(num, dtype=numpy.uint64)
+        self.__has_mbid = numpy.zeros(num, dtype=numpy.bool_)
+        self.__strings = numpy.full(num, -1, dtype=numpy.int32)
+        self.__orig_strings = numpy.full(num, -1, dtype=numpy.int32)
+        self.__orig_orders = numpy.full(num, -1, dtype=numpy.int32)
+        self.__positions = numpy.full(num, -1, dtype=numpy.int16)
+        self.__chan_ids = numpy.full(num, -1, dtype=numpy.int32)
+        self.__racks = numpy.full(num, -1, dtype=numpy.int16)
+        self.__x_coords = numpy.full(num, numpy.nan, dtype=numpy.float64)
+        self.__y_coords = numpy.full(num, numpy.nan, dtype=numpy.float64)
+        self.__z_coords = numpy.full(num, numpy.nan, dtype=numpy.float64)
+
+        # string tables
+        self.__names = []
+        self.__prod_ids = []
+        self.__descriptions = []
+        self.__partitions = {}
+
+        for idx, dom in enumerate(doms):
+            if dom.mbid is not None:
+                self.__mbids[idx] = int(dom.mbid, 16)
+                self.__has_mbid[idx] = True
+            if dom.string is not None:
+                self.__strings[idx] = dom.string
+                if dom.string in string_info:
+                    rack, partition = string_info[dom.string]
+                    if rack is not None:
+                        self.__racks[idx] = rack
+                    if partition is not None:
+                        self.__partitions[dom.string] = partition
+            self.__set_value(self.__orig_strings, idx, dom.original_string)
+            self.__set_value(self.__orig_orders, idx, dom.original_order)
+            self.__set_value(self.__positions, idx, dom.pos)
+            self.__set_value(self.__chan_ids, idx, dom.channel_id)
+            self.__set_value(self.__x_coords, idx, dom.x_coord)
+            self.__set_value(self.__y_coords, idx, dom.y_coord)
+            self.__set_value(self.__z_coords, idx, dom.z_coord)
+
+            self.__names.append(dom.name)
+            self.__prod_ids.append(dom.prod_id)
+            if dom.description == "-":
+                self.__descriptions.append(None)
+            else:
+                self.__descriptions.append(dom.description)
+
+        # classify DOMs by their original string number, like DomGeometry
+        base = numpy.where(self.__orig_strings >= 0, self.__orig_strings,
+                           self.__strings)
+        pos = self.__positions
+        real_string = (base >= 1) & (base <= DomGeometry.MAX_STRING)
+        self.__inice = real_string & (pos >= 1) & (pos <= 60)
+        self.__icetop = real_string & (pos >= 61) & (pos <= 64)
+        self.__scint = real_string & (pos >= 65) & (pos <= 66)
+        self.__real_dom = real_string & (pos >= 1) & (pos <= 64)
+
+        # sorted mainboard IDs for binary searches
+        self.__mbid_order = numpy.argsort(self.__mbids, kind="mergesort")
+        self.__sorted_mbids = self.__mbids[self.__mbid_order]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.__names)
+        if index < 0 or index >= len(self.__names):
+            raise IndexError("DOM index %d out of range" % (index, ))
+        return DomGeometryView(self, index)
+
+    def __iter__(self):
+        for idx in range(len(self.__names)):
+            yield DomGeometryView(self, idx)
+
+    def __len__(self):
+        return len(self.__names)
+
+    @classmethod
+    def __set_value(cls, values, idx, value):
+        if value is not None:
+            values[idx] = value
+
+    @classmethod
+    def from_geometry(cls, geom):
+        "Build an array-backed copy of a DefaultDomGeometry object"
+        string_info = {}
+        doms = []
+        for strnum in geom.string_numbers:
+            strobj = geom.string_object(strnum)
+            string_info[strnum] = (strobj.rack, strobj.partition)
+            doms.extend(strobj.doms)
+        return cls(doms, string_info=string_info)
+
+    @classmethod
+    def load(cls, config_dir=None, file_name=None):
+        "Read default-dom-geometry.xml and return its array-backed copy"
+        geom = DefaultDomGeometryReader.parse(config_dir=config_dir,
+                                              file_name=file_name)
+        return cls.from_geometry(geom)
+
+    @property
+    def channel_ids(self):
+        return self.__chan_ids
+
+    @property
+    def descriptions(self):
+        return self.__descriptions
+
+    def doms(self, mask=None):
+        "Return views of all DOMs selected by a boolean mask or index array"
+        if mask is None:
+            return list(self)
+        return [DomGeometryView(self, int(idx))
+                for idx in numpy.arange(len(self))[mask]]
+
+    def find_mbid(self, mbid):
+        "Return the view for the DOM with integer mainboard ID 'mbid'"
+        sorted_ids = self.__sorted_mbids
+        pos = numpy.searchsorted(sorted_ids, numpy.uint64(mbid))
+        while pos < len(sorted_ids) and sorted_ids[pos] == mbid:
+            idx = int(self.__mbid_order[pos])
+            if self.__has_mbid[idx]:
+                return DomGeometryView(self, idx)
+            pos += 1
+        return None
+
+    def get_dom(self, str_num, pos):
+        "Return the view for the first DOM at (str_num, pos), or None"
+        matches = numpy.flatnonzero((self.__strings == str_num) &
+                                    (self.__positions == pos))
+        if len(matches) == 0:  # pylint: disable=len-as-condition
+            return None
+        return DomGeometryView(self, int(matches[0]))
+
+    @property
+    def has_mbid(self):
+        return self.__has_mbid
+
+    @property
+    def icetop_mask(self):
+        return self.__icetop
+
+    @property
+    def inice_mask(self):
+        return self.__inice
+
+    @property
+    def mbids(self):
+        return self.__mbids
+
+    @property
+    def nbytes(self):
+        "Number of bytes used by the numeric arrays"
+        return sum(arr.nbytes for arr in (
+            self.__mbids, self.__has_mbid, self.__strings,
+            self.__orig_strings, self.__orig_orders, self.__positions,
+            self.__chan_ids, self.__racks, self.__x_coords, self.__y_coords,
+            self.__z_coords, self.__inice, self.__icetop, self.__scint,
+            self.__real_dom, self.__mbid_order, self.__sorted_mbids))
+
+    @property
+    def names(self):
+        return self.__names
+
+    @property
+    def original_orders(self):
+        return self.__orig_orders
+
+    @property
+    def original_strings(self):
+        return self.__orig_strings
+
+    def partition_mask(self, partition):
+        "Return a boolean mask selecting all DOMs in 'partition'"
+        strnums = [strnum for strnum, part in self.__partitions.items()
+                   if part == partition]
+        return numpy.isin(self.__strings, strnums)
+
+    @property
+    def positions(self):
+        return self.__positions
+
+    @property
+    def prod_ids(self):
+        return self.__prod_ids
+
+    def rack_mask(self, rack):
+        "Return a boolean mask selecting all DOMs on 'rack'"
+        return self.__racks == rack
+
+    @property
+    def racks(self):
+        return self.__racks
+
+    @property
+    def real_dom_mask(self):
+        return self.__real_dom
+
+    @property
+    def scintillator_mask(self):
+        return self.__scint
+
+    def string_mask(self, str_num):
+        "Return a boolean mask selecting all DOMs on string 'str_num'"
+        return self.__strings == str_num
+
+    @property
+    def strings(self):
+        return self.__strings
+
+    @property
+    def x_coords(self):
+        return self.__x_coords
+
+    @property
+    def y_coords(self):
+        return self.__y_coords
+
+    @property
+    def z_coords(self):
+        return self.__z_coords
+
+
+def main():
+    "Main program"
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--config-dir", dest="config_dir",
+                        help="Configuration directory")
+    parser.add_argument("-f", "--file", dest="file_name",
+                        help="default-dom-geometry file")
+    args = parser.parse_args()
+
+    try:
+        doms = DomGeometryArray.load(config_dir=args.config_dir,
+                                     file_name=args.file_name)
+    except DomGeometryException as dex:
+        raise SystemExit(str(dex))
+
+    print("%d DOMs (%d in-ice, %d icetop, %d scintillator) in %d bytes" %
+          (len(doms), doms.inice_mask.sum(), doms.icetop_mask.sum(),
+           doms.scintillator_mask.sum(), doms.nbytes))
+
+
+if __name__ == "__main__":
+    main()
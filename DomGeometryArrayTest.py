@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"DomGeometryArray unit tests"
+
+import os
+import unittest
+
+from DefaultDomGeometry import DefaultDomGeometry, DefaultDomGeometryReader, \
+     DomGeometry
+from DomGeometryArray import DomGeometryArray
+
+
+class DomGeometryArrayTest(unittest.TestCase):
+    GEOMETRY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "src", "test", "resources", "config",
+                            DefaultDomGeometry.FILENAME)
+
+    ATTRIBUTES = ("mbid", "name", "prod_id", "pos", "string",
+                  "original_string", "original_order", "channel_id",
+                  "x_coord", "y_coord", "z_coord", "description",
+                  "is_icetop", "is_inice", "is_real_dom", "is_scintillator")
+
+    def test_views(self):
+        geom = DefaultDomGeometryReader.parse_xml(self.GEOMETRY)
+        array = DomGeometryArray.from_geometry(geom)
+
+        doms = []
+        for strnum in geom.string_numbers:
+            doms.extend(geom.string_object(strnum).doms)
+        self.assertEqual(len(doms), len(array))
+
+        for dom, view in zip(doms, array):
+            for attr in self.ATTRIBUTES:
+                self.assertEqual(getattr(dom, attr), getattr(view, attr),
+                                 "%s %s should be %s, not %s" %
+                                 (dom, attr, getattr(dom, attr),
+                                  getattr(view, attr)))
+            self.assertEqual(dom.location(), view.location())
+
+    def test_queries(self):
+        doms = [
+            DomGeometry(1, 1, "000000000001", "InIce", "P1", 64),
+            DomGeometry(201, 61, "00000000000a", "IceTop", "P2", 124,
+                        x=1.5, y=2.5, z=3.5),
+            DomGeometry(208, 65, None, "Scint", None),
+            DomGeometry(1, 60, "abcdef012345", "Deep", "P3"),
+        ]
+        doms[1].original_string = 1
+        doms[2].original_string = 12
+
+        array = DomGeometryArray(doms, string_info={1: (3, "A"),
+                                                    201: (5, "B")})
+
+        self.assertEqual(["IceTop"],
+                         [x.name for x in array.doms(array.icetop_mask)])
+        self.assertEqual(["InIce", "Deep"],
+                         [x.name for x in array.doms(array.inice_mask)])
+        self.assertEqual(["Scint"],
+                         [x.name
+                          for x in array.doms(array.scintillator_mask)])
+        self.assertEqual(["InIce", "Deep"],
+                         [x.name for x in array.doms(array.rack_mask(3))])
+        self.assertEqual(["IceTop"],
+                         [x.name
+                          for x in array.doms(array.partition_mask("B"))])
+        self.assertEqual(2, int(array.string_mask(1).sum()))
+
+        self.assertEqual("Deep", array.find_mbid(0xabcdef012345).name)
+        self.assertTrue(array.find_mbid(0) is None, "Found bogus MBID 0")
+        self.assertEqual("IceTop", array.get_dom(201, 61).name)
+        self.assertTrue(array.get_dom(201, 1) is None, "Found bogus DOM")
+
+        view = array[2]
+        self.assertTrue(view.mbid is None, "Bad MBID %s" % (view.mbid, ))
+        self.assertTrue(view.x_coord is None, "Bad X %s" % (view.x_coord, ))
+        self.assertEqual("12-65", view.location())
+        self.assertEqual(3.5, array[1].z_coord)
+        self.assertEqual(view, array[-2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -475,6 +475,10 @@ class FakeClient(object):
         self.__state = "idle"
         self.__registered = True
 
+        # latest (transition number, state), which pings push to CnCServer
+        self.__pushed = (0, self.__state)
+        self.__can_push = True
+
         self.__quiet = quiet
 
         self.__src_id = None
@@ -504,7 +508,7 @@ class FakeClient(object):
         return "CommitSubrun"
 
     def __configure(self, _=None):
-        self.__state = "ready"
+        self.__set_state("ready")
         return self.__state
 
     def __connect(self, conn_list=None):
@@ -523,7 +527,7 @@ class FakeClient(object):
         else:
             print("No connections for %s" % (self, ), file=sys.stderr)
 
-        self.__state = "connected"
+        self.__set_state("connected")
         return self.__state
 
     @classmethod
@@ -695,13 +699,28 @@ class FakeClient(object):
                   (self, log_host, log_port, live_host, live_port))
         return False
 
+    def __ping(self):
+        "Let CnCServer know this component is still alive"
+        if self.__can_push:
+            # pushing the current state doubles as a ping
+            (transition, state) = self.__pushed
+            try:
+                self.__cnc.rpc_component_state(self.__name, self.__num, state,
+                                               transition)
+                return
+            except rpcclient.Fault:
+                # older CnCServers don't accept pushed states
+                self.__can_push = False
+
+        self.__cnc.rpc_ping()
+
     def __prepare_subrun(self, subrun_num):
         if not self.__quiet:
             print("PrepareSubrun %s num %d" % (self, subrun_num))
         return "PrepareSubrun"
 
     def __reset(self):
-        self.__state = "idle"
+        self.__set_state("idle")
         if not self.__quiet:
             print("Reset %s" % self)
         return self.__state
@@ -721,11 +740,23 @@ class FakeClient(object):
             print("SetLastGoodTime %s -> %s" % (self, last_time))
         return "SetLastGoodTime"
 
+    def __set_state(self, state):
+        "Change state and push the new state to CnCServer"
+        self.__state = state
+        self.__pushed = (self.__pushed[0] + 1, state)
+        if self.__cnc is not None and self.__can_push:
+            try:
+                self.__cnc.rpc_component_state(self.__name, self.__num, state,
+                                               self.__pushed[0])
+            except:  # pylint: disable=bare-except
+                # CnCServer will poll for the state instead
+                pass
+
     def __start_run(self, run_num, dom_mode):
         if not self.__quiet:
             print("StartRun %s" % self)
         self.start_run(run_num, dom_mode)
-        self.__state = "running"
+        self.__set_state("running")
         self.__run_num = run_num
         return self.__state
 
@@ -738,7 +769,7 @@ class FakeClient(object):
         if not self.__quiet:
             print("StopRun %s" % self)
         self.stop_run()
-        self.__state = "ready"
+        self.__set_state("ready")
         return False
 
     def __switch_to_new_run(self, new_num):
@@ -766,7 +797,7 @@ class FakeClient(object):
                 break
 
             try:
-                self.__cnc.rpc_ping()
+                self.__ping()
             except socket.error as err:
                 if err[0] == 61 or err[0] == 111:
                     self.__cnc = None
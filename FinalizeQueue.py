@@ -0,0 +1,521 @@
+#!/usr/bin/env python
+"""
+Persistent queue used by CnCServer to finish off stopped runs (combine the
+log files, build the JADE tarball and copy it) on worker processes, so a
+new run can start while the previous run's files are still being packed.
+
+Each job runs in a freshly spawned (not forked) process, since forking the
+multithreaded CnCServer could copy a lock held by another thread into the
+child and deadlock it, and a job which runs too long is killed.
+
+Each job is written to a spool directory before it is queued and removed
+after it has finished, so jobs which were pending or running when CnCServer
+died are picked up again the next time it starts.
+"""
+
+from __future__ import print_function
+
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import SpadeQueue
+
+from exc_string import exc_string, set_exc_string_encoding
+set_exc_string_encoding("ascii")
+
+
+class FinalizeQueueFullException(Exception):
+    "Thrown when a job cannot be queued because the queue is full"
+
+
+class FinalizeJob(object):
+    "Files from a single run which need to be queued for JADE"
+
+    def __init__(self, job_id, run_num, spade_dir, copy_dir, log_dir,
+                 priority, created=None, attempts=0):
+        self.__id = job_id
+        self.__run_num = run_num
+        self.__spade_dir = spade_dir
+        self.__copy_dir = copy_dir
+        self.__log_dir = log_dir
+        self.__priority = priority
+        self.__created = time.time() if created is None else created
+        self.__attempts = attempts
+
+    def __lt__(self, other):
+        return (self.__priority, self.__created) < \
+            (other.priority, other.created)
+
+    def __str__(self):
+        return "FinalizeJob[%s run %d pri %d]" % \
+            (self.__id, self.__run_num, self.__priority)
+
+    @property
+    def attempts(self):
+        return self.__attempts
+
+    @property
+    def copy_dir(self):
+        return self.__copy_dir
+
+    @property
+    def created(self):
+        return self.__created
+
+    @classmethod
+    def from_dict(cls, jdict):
+        "Rebuild a job from the dictionary created by to_dict()"
+        return cls(jdict["id"], jdict["run_num"], jdict["spade_dir"],
+                   jdict["copy_dir"], jdict["log_dir"], jdict["priority"],
+                   created=jdict["created"], attempts=jdict["attempts"])
+
+    @property
+    def id(self):
+        return self.__id
+
+    def increment_attempts(self):
+        self.__attempts += 1
+
+    @property
+    def log_dir(self):
+        return self.__log_dir
+
+    @property
+    def priority(self):
+        return self.__priority
+
+    @property
+    def run_number(self):
+        return self.__run_num
+
+    @property
+    def spade_dir(self):
+        return self.__spade_dir
+
+    def to_dict(self):
+        "Return a JSON-friendly description of this job"
+        return {
+            "id": self.__id,
+            "run_num": self.__run_num,
+            "spade_dir": self.__spade_dir,
+            "copy_dir": self.__copy_dir,
+            "log_dir": self.__log_dir,
+            "priority": self.__priority,
+            "created": self.__created,
+            "attempts": self.__attempts,
+        }
+
+
+class PipeLogger(object):
+    "Logger used by worker processes to send messages back to CnCServer"
+
+    def __init__(self, conn):
+        self.__conn = conn
+
+    def __send(self, level, msg):
+        try:
+            self.__conn.send((level, msg))
+        except:  # pylint: disable=bare-except
+            # don't let a broken pipe stop the job
+            pass
+
+    def error(self, msg):
+        self.__send("error", msg)
+
+    def info(self, msg):
+        self.__send("info", msg)
+
+    def warn(self, msg):
+        self.__send("warn", msg)
+
+
+def run_job(jdict, logger):
+    "Queue a single run's files for JADE and return True if it worked"
+    return SpadeQueue.queue_for_spade(logger, jdict["spade_dir"],
+                                      jdict["copy_dir"], jdict["log_dir"],
+                                      jdict["run_num"])
+
+
+def run_job_process(jdict, conn):
+    "Entry point for worker processes"
+    try:
+        queued = run_job(jdict, PipeLogger(conn))
+    finally:
+        conn.close()
+    if not queued:
+        sys.exit(1)
+
+
+def process_context():
+    """
+    Return the multiprocessing context used to start worker processes
+    (processes are spawned rather than forked, where that's possible)
+    """
+    try:
+        return multiprocessing.get_context("spawn")
+    except AttributeError:
+        # Python 2 can only fork
+        return multiprocessing
+
+
+class FinalizeQueue(object):
+    """
+    Queue run finalization jobs in a spool directory and run them, highest
+    priority (lowest value) first, on a small pool of worker processes.
+    At most 'max_pending' jobs can be waiting; submit() blocks while the
+    queue is full.
+    """
+
+    # spooled job files end with this suffix
+    JOB_SUFFIX = ".job"
+    # jobs which failed too many times are renamed to use this suffix
+    FAILED_SUFFIX = ".failed"
+
+    # jobs for runs which have just stopped
+    PRIORITY_RUN = 10
+    # jobs left over from a previous CnCServer
+    PRIORITY_RECOVERED = 20
+
+    # default number of jobs which can run at the same time
+    NUM_WORKERS = 2
+    # default maximum number of jobs waiting to run
+    MAX_PENDING = 4
+    # give up on a job after this many tries
+    MAX_ATTEMPTS = 3
+    # kill worker processes which take longer than this many seconds
+    JOB_TIMEOUT_SECS = 3600.0
+
+    def __init__(self, logger, spool_dir, num_workers=None, max_pending=None,
+                 use_processes=True, job_timeout=None):
+        if num_workers is None:
+            num_workers = self.NUM_WORKERS
+        if max_pending is None:
+            max_pending = self.MAX_PENDING
+
+        self.__logger = logger
+        self.__spool_dir = spool_dir
+        self.__num_workers = num_workers
+        self.__max_pending = max_pending
+        self.__use_processes = use_processes
+        self.__job_timeout = self.JOB_TIMEOUT_SECS if job_timeout is None \
+          else job_timeout
+
+        self.__pending = []
+        self.__running = {}
+        self.__num_done = 0
+        self.__num_failed = 0
+        self.__next_id = 0
+
+        self.__cond = threading.Condition()
+        self.__workers = []
+        self.__stopping = False
+
+    def __len__(self):
+        with self.__cond:
+            return len(self.__pending) + len(self.__running)
+
+    def __str__(self):
+        with self.__cond:
+            return "FinalizeQueue[pend %d run %d done %d fail %d]" % \
+                (len(self.__pending), len(self.__running), self.__num_done,
+                 self.__num_failed)
+
+    def __execute(self, job):
+        "Run a job and return True if it finished"
+        if not self.__use_processes:
+            try:
+                if run_job(job.to_dict(), self.__logger):
+                    return True
+                self.__logger.error("Could not queue run %d for JADE" %
+                                    (job.run_number, ))
+            except:  # pylint: disable=bare-except
+                self.__logger.error("Finalize job for run %d failed: %s" %
+                                    (job.run_number, exc_string()))
+            return False
+
+        ctx = process_context()
+        (parent_conn, child_conn) = ctx.Pipe(False)
+        proc = ctx.Process(name="Finalize-%d" % job.run_number,
+                           target=run_job_process,
+                           args=(job.to_dict(), child_conn))
+        proc.daemon = True
+        proc.start()
+        child_conn.close()
+
+        # relay log messages until the worker closes its end of the pipe
+        deadline = time.time() + self.__job_timeout
+        timed_out = False
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not parent_conn.poll(remaining):
+                timed_out = True
+                break
+            try:
+                (level, msg) = parent_conn.recv()
+            except (EOFError, IOError):
+                break
+            if level == "info":
+                self.__logger.info(msg)
+            elif level == "warn":
+                self.__logger.warn(msg)
+            else:
+                self.__logger.error(msg)
+        parent_conn.close()
+
+        if timed_out:
+            self.__logger.error("Killing finalize job for run %d after"
+                                " %.0f seconds" % (job.run_number,
+                                                   self.__job_timeout))
+            proc.terminate()
+            proc.join()
+            return False
+
+        proc.join(max(deadline - time.time(), 1.0))
+        if proc.is_alive():
+            self.__logger.error("Killing hung finalize job for run %d" %
+                                (job.run_number, ))
+            proc.terminate()
+            proc.join()
+            return False
+        if proc.exitcode != 0:
+            self.__logger.error("Finalize job for run %d exited with"
+                                " status %s" % (job.run_number,
+                                                proc.exitcode))
+            return False
+        return True
+
+    def __find_job(self, run_num):
+        "This method assumes that self.__cond has already been acquired"
+        for job in self.__pending:
+            if job.run_number == run_num:
+                return job
+        for job in self.__running.values():
+            if job.run_number == run_num:
+                return job
+        return None
+
+    def __job_path(self, job, suffix=None):
+        if suffix is None:
+            suffix = self.JOB_SUFFIX
+        return os.path.join(self.__spool_dir, job.id + suffix)
+
+    def __push(self, job):
+        "This method assumes that self.__cond has already been acquired"
+        heapq.heappush(self.__pending, job)
+        self.__cond.notify_all()
+
+        self.__stopping = False
+        while len(self.__workers) < self.__num_workers:
+            thrd = threading.Thread(name="FinalizeWorker#%d" %
+                                    len(self.__workers), target=self.__work)
+            thrd.setDaemon(True)
+            thrd.start()
+            self.__workers.append(thrd)
+
+    def __remove_job_file(self, job):
+        try:
+            os.unlink(self.__job_path(job))
+        except OSError:
+            pass
+
+    def __work(self):
+        while True:
+            with self.__cond:
+                while not self.__stopping and not self.__pending:
+                    self.__cond.wait()
+                if self.__stopping:
+                    break
+                job = heapq.heappop(self.__pending)
+                self.__running[job.id] = job
+                self.__cond.notify_all()
+
+            job.increment_attempts()
+            try:
+                self.__write_job_file(job)
+            except:  # pylint: disable=bare-except
+                self.__logger.error("Cannot update %s: %s" %
+                                    (job, exc_string()))
+
+            finished = self.__execute(job)
+
+            with self.__cond:
+                del self.__running[job.id]
+                if finished:
+                    self.__num_done += 1
+                    self.__remove_job_file(job)
+                elif self.__stopping:
+                    # leave the job in the spool directory for recover()
+                    pass
+                elif job.attempts < self.MAX_ATTEMPTS:
+                    heapq.heappush(self.__pending, job)
+                else:
+                    self.__num_failed += 1
+                    self.__logger.error("Giving up on finalize job for"
+                                        " run %d after %d attempts" %
+                                        (job.run_number, job.attempts))
+                    try:
+                        os.rename(self.__job_path(job),
+                                  self.__job_path(job, self.FAILED_SUFFIX))
+                    except OSError:
+                        pass
+                self.__cond.notify_all()
+
+    def __write_job_file(self, job):
+        "Atomically write the job description to the spool directory"
+        path = self.__job_path(job)
+        tmppath = os.path.join(self.__spool_dir, "." + job.id)
+        with open(tmppath, "w") as out:
+            json.dump(job.to_dict(), out)
+        os.rename(tmppath, path)
+
+    def recover(self):
+        """
+        Queue all jobs left in the spool directory by a previous CnCServer
+        and return the number of recovered jobs
+        """
+        if not os.path.isdir(self.__spool_dir):
+            return 0
+
+        jobs = []
+        for entry in sorted(os.listdir(self.__spool_dir)):
+            if not entry.endswith(self.JOB_SUFFIX):
+                continue
+
+            path = os.path.join(self.__spool_dir, entry)
+            try:
+                with open(path, "r") as fin:
+                    jdict = json.load(fin)
+                # let newer runs jump ahead of leftover jobs
+                jdict["priority"] = max(jdict["priority"],
+                                        self.PRIORITY_RECOVERED)
+                job = FinalizeJob.from_dict(jdict)
+            except:  # pylint: disable=bare-except
+                self.__logger.error("Ignoring bad finalize job %s: %s" %
+                                    (path, exc_string()))
+                continue
+
+            jobs.append(job)
+
+        with self.__cond:
+            jobs = [job for job in jobs
+                    if self.__find_job(job.run_number) is None]
+            if len(jobs) > 0:  # pylint: disable=len-as-condition
+                self.__logger.info("Recovered %d finalize job%s" %
+                                   (len(jobs), "" if len(jobs) == 1
+                                    else "s"))
+
+            # recovered jobs aren't limited by 'max_pending'
+            for job in jobs:
+                self.__push(job)
+
+        return len(jobs)
+
+    def status(self):
+        "Return a dictionary describing the queue"
+        now = time.time()
+        with self.__cond:
+            pending = [(job, "pending") for job in sorted(self.__pending)]
+            running = [(job, "running") for job in self.__running.values()]
+
+            jobs = []
+            for job, state in running + pending:
+                jobs.append({
+                    "id": job.id,
+                    "run_num": job.run_number,
+                    "state": state,
+                    "priority": job.priority,
+                    "attempts": job.attempts,
+                    "age": now - job.created,
+                })
+
+            return {
+                "pending": len(self.__pending),
+                "running": len(self.__running),
+                "done": self.__num_done,
+                "failed": self.__num_failed,
+                "workers": self.__num_workers,
+                "max_pending": self.__max_pending,
+                "processes": self.__use_processes,
+                "jobs": jobs,
+            }
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker threads after their current jobs finish.  Pending
+        jobs stay in the spool directory and will be recovered later.
+        """
+        with self.__cond:
+            self.__stopping = True
+            self.__cond.notify_all()
+            workers = self.__workers
+            self.__workers = []
+
+        for thrd in workers:
+            thrd.join(timeout)
+
+    def submit(self, run_num, spade_dir, copy_dir, log_dir, priority=None,
+               timeout=None):
+        """
+        Queue a run's files for JADE and return the job.  If the queue is
+        full, wait up to 'timeout' seconds (forever if None) for room and
+        then throw FinalizeQueueFullException.
+        """
+        if priority is None:
+            priority = self.PRIORITY_RUN
+
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        with self.__cond:
+            job = self.__find_job(run_num)
+            if job is not None:
+                return job
+
+            while len(self.__pending) >= self.__max_pending:
+                if timeout is None:
+                    self.__cond.wait()
+                else:
+                    remaining = end_time - time.time()
+                    if remaining <= 0:
+                        raise FinalizeQueueFullException(
+                            "Cannot queue run %d; %d finalize jobs are"
+                            " pending" % (run_num, len(self.__pending)))
+                    self.__cond.wait(remaining)
+
+            job_id = "run%05d-%d-%d" % (run_num, int(time.time() * 1000),
+                                        self.__next_id)
+            self.__next_id += 1
+
+            job = FinalizeJob(job_id, run_num, spade_dir, copy_dir, log_dir,
+                              priority)
+
+            if not os.path.isdir(self.__spool_dir):
+                os.makedirs(self.__spool_dir)
+            self.__write_job_file(job)
+            self.__push(job)
+
+        return job
+
+    def wait(self, timeout=None):
+        """
+        Wait for all queued jobs to finish.  Return False if some are
+        still pending or running after 'timeout' seconds.
+        """
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        with self.__cond:
+            while len(self.__pending) + len(self.__running) > 0:
+                if timeout is None:
+                    self.__cond.wait()
+                else:
+                    remaining = end_time - time.time()
+                    if remaining <= 0:
+                        break
+                    self.__cond.wait(remaining)
+            return len(self.__pending) + len(self.__running) == 0
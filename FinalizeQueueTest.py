@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"FinalizeQueue unit tests"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import SpadeQueue
+
+from FinalizeQueue import FinalizeQueue, FinalizeQueueFullException
+
+from DAQMocks import MockLogger
+
+
+class FinalizeQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.__logger = MockLogger("finalize")
+        self.__temp_dir = tempfile.mkdtemp()
+        self.__spool_dir = os.path.join(self.__temp_dir, "spool")
+        self.__log_dir = os.path.join(self.__temp_dir, "log")
+        self.__queues = []
+
+    def tearDown(self):
+        for fqueue in self.__queues:
+            fqueue.stop()
+        shutil.rmtree(self.__temp_dir, ignore_errors=True)
+        self.__logger.check_status(10)
+
+    def __create_queue(self, **kwargs):
+        fqueue = FinalizeQueue(self.__logger, self.__spool_dir, **kwargs)
+        self.__queues.append(fqueue)
+        return fqueue
+
+    def __create_queued_run(self, run_num):
+        "Create a run directory whose logs have already been queued"
+        run_dir = os.path.join(self.__log_dir, "daqrun%05d" % run_num)
+        os.mkdir(run_dir)
+        with open(os.path.join(run_dir, SpadeQueue.FILE_MARKER), "w"):
+            pass
+
+    def __spooled_failures(self):
+        return sorted(x for x in os.listdir(self.__spool_dir)
+                      if x.endswith(FinalizeQueue.FAILED_SUFFIX))
+
+    def __spooled_jobs(self):
+        return sorted(x for x in os.listdir(self.__spool_dir)
+                      if x.endswith(FinalizeQueue.JOB_SUFFIX))
+
+    def test_back_pressure(self):
+        # without any workers, jobs stay in the queue
+        fqueue = self.__create_queue(num_workers=0, max_pending=2,
+                                     use_processes=False)
+
+        job1 = fqueue.submit(1, "/bad/spade", None, self.__log_dir,
+                             priority=FinalizeQueue.PRIORITY_RECOVERED)
+        fqueue.submit(2, "/bad/spade", None, self.__log_dir)
+        self.assertTrue(fqueue.submit(1, "/bad/spade", None,
+                                      self.__log_dir) is job1,
+                        "Duplicate run was queued twice")
+
+        self.assertRaises(FinalizeQueueFullException, fqueue.submit, 3,
+                          "/bad/spade", None, self.__log_dir, timeout=0.05)
+
+        status = fqueue.status()
+        self.assertEqual(2, status["pending"])
+        self.assertEqual(0, status["running"])
+        self.assertEqual([2, 1], [x["run_num"] for x in status["jobs"]])
+        self.assertEqual(2, len(self.__spooled_jobs()))
+
+    def test_recover(self):
+        first = self.__create_queue(num_workers=0, use_processes=False)
+        for run_num in (11, 12):
+            first.submit(run_num, self.__temp_dir, None, self.__log_dir)
+        self.assertEqual(2, len(self.__spooled_jobs()))
+
+        # a new queue picks up the jobs left behind by the first one and
+        # runs them on worker processes, relaying their log messages
+        os.mkdir(self.__log_dir)
+        self.__logger.add_expected_exact("Recovered 2 finalize jobs")
+        for run_num in (11, 12):
+            self.__create_queued_run(run_num)
+            self.__logger.add_expected_exact("Logs for run %d have already"
+                                             " been queued; Use --force to"
+                                             " requeue them" % run_num)
+
+        second = self.__create_queue()
+        self.assertEqual(2, second.recover())
+        self.assertTrue(second.wait(30), "Jobs did not finish")
+
+        status = second.status()
+        self.assertEqual(2, status["done"])
+        self.assertEqual(0, status["failed"])
+        self.assertEqual([], self.__spooled_jobs())
+
+    def test_failed_job(self):
+        # a job which reports an error is retried, then given up on
+        fqueue = self.__create_queue(use_processes=False)
+
+        for _ in range(FinalizeQueue.MAX_ATTEMPTS):
+            self.__logger.add_expected_exact("Log directory \"%s\" does not"
+                                             " exist" % self.__log_dir)
+            self.__logger.add_expected_exact("Could not queue run 21 for"
+                                             " JADE")
+        self.__logger.add_expected_exact("Giving up on finalize job for run"
+                                         " 21 after %d attempts" %
+                                         FinalizeQueue.MAX_ATTEMPTS)
+
+        fqueue.submit(21, "/bad/spade", None, self.__log_dir)
+        self.assertTrue(fqueue.wait(30), "Job did not finish")
+
+        status = fqueue.status()
+        self.assertEqual(0, status["done"])
+        self.assertEqual(1, status["failed"])
+        self.assertEqual([], self.__spooled_jobs())
+        self.assertEqual(1, len(self.__spooled_failures()))
+
+    def test_job_timeout(self):
+        fqueue = self.__create_queue(num_workers=1, job_timeout=0)
+
+        for _ in range(FinalizeQueue.MAX_ATTEMPTS):
+            self.__logger.add_expected_exact("Killing finalize job for run"
+                                             " 31 after 0 seconds")
+        self.__logger.add_expected_exact("Giving up on finalize job for run"
+                                         " 31 after %d attempts" %
+                                         FinalizeQueue.MAX_ATTEMPTS)
+
+        fqueue.submit(31, self.__temp_dir, None, self.__log_dir)
+        self.assertTrue(fqueue.wait(60), "Job did not finish")
+        self.assertEqual(1, fqueue.status()["failed"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,9 +37,9 @@ except SystemExit:
         SERVICE_NAME = 'dead'
 
 from DAQMocks \
-    import MockClusterConfig, MockCnCLogger, MockIntervalTimer, \
-    MockLeapsecondFile, MockLogger, RunXMLValidator, SocketReader, \
-    SocketReaderFactory, SocketWriter
+    import MockCacheDirectory, MockClusterConfig, MockCnCLogger, \
+    MockIntervalTimer, MockLeapsecondFile, MockLogger, RunXMLValidator, \
+    SocketReader, SocketReaderFactory, SocketWriter
 
 
 class LiveStub(object):
@@ -1954,5 +1954,14 @@ class IntegrationTest(unittest.TestCase):
                         False)
 
 
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -14,6 +14,7 @@ import sys
 from ClusterDescription import ClusterDescription
 from DAQTime import DAQDateTime, PayloadTime
 from i3helper import Comparable
+from moni_index import INDEX_SUFFIX
 from utils.DashXMLLog import DashXMLLog
 
 
@@ -403,8 +404,8 @@ class LogSorter(object):
         log = None
         for entry in os.listdir(dir_name):
             # ignore MBean output files and run summary files
-            if entry.endswith(".moni") or entry == "run.xml" or \
-              entry == "logs-queued":
+            if entry.endswith(".moni") or entry.endswith(INDEX_SUFFIX) or \
+              entry == "run.xml" or entry == "logs-queued":
                 continue
 
             path = os.path.join(dir_name, entry)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"MoniIndex unit tests"
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from MonitorTask import MonitorToFile
+from moni_index import MoniIndex, index_path
+from moni_stream import moni_stream
+
+
+class MoniIndexTest(unittest.TestCase):
+    BASE_TIME = datetime.datetime(2021, 7, 13, 12, 0, 0, 123456)
+
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        try:
+            shutil.rmtree(self.__temp_dir)
+        except:  # pylint: disable=bare-except
+            pass  # ignore errors
+
+    def __write_moni(self, basename, num_secs):
+        "Write a .moni file with two beans reported once per second"
+        mtf = MonitorToFile(self.__temp_dir, basename)
+        for sec in range(num_secs):
+            now = self.BASE_TIME + datetime.timedelta(seconds=sec)
+            mtf.send(now, "fooBean", {"count": sec, "name": "abc"})
+            mtf.send(now, "barBean", {"total": sec * 10})
+        mtf.close()
+        return os.path.join(self.__temp_dir, basename + ".moni")
+
+    def test_written_index(self):
+        path = self.__write_moni("foo-1", 10)
+
+        self.assertTrue(os.path.exists(index_path(path)),
+                        "MonitorToFile did not write an index")
+
+        idx = MoniIndex.load(path)
+        self.assertEqual(20, len(idx))
+        self.assertEqual(["barBean", "fooBean"], idx.beans)
+
+    def test_rebuilt_index(self):
+        path = self.__write_moni("foo-1", 10)
+        os.unlink(index_path(path))
+
+        idx = MoniIndex.load(path)
+        self.assertEqual(20, len(idx))
+        self.assertTrue(os.path.exists(index_path(path)),
+                        "MoniIndex did not save the rebuilt index")
+
+    def test_stale_index(self):
+        path = self.__write_moni("foo-1", 10)
+
+        # append a section which is not in the index
+        with open(path, "a") as fout:
+            fout.write("fooBean: 2021-07-13 12:00:30.000000:\n"
+                       "\tcount: 30\n\n")
+
+        idx = MoniIndex.load(path)
+        self.assertEqual(21, len(idx))
+
+        # rewrite the .moni file so the old index no longer matches
+        self.__write_moni("tmp-0", 3)
+        shutil.move(os.path.join(self.__temp_dir, "tmp-0.moni"), path)
+
+        idx = MoniIndex.load(path)
+        self.assertEqual(6, len(idx))
+
+    def test_live_index(self):
+        "Readers must not replace the index of a file being written"
+        mtf = MonitorToFile(self.__temp_dir, "foo-1")
+        path = os.path.join(self.__temp_dir, "foo-1.moni")
+        try:
+            for sec in range(5):
+                now = self.BASE_TIME + datetime.timedelta(seconds=sec)
+                mtf.send(now, "fooBean", {"count": sec})
+
+            # the writer's index entries may still be buffered, so the
+            # reader scans the .moni file
+            idx = MoniIndex.load(path)
+            self.assertEqual(5, len(idx))
+            self.assertFalse(idx.save(), "Replaced the live index")
+
+            for sec in range(5, 10):
+                now = self.BASE_TIME + datetime.timedelta(seconds=sec)
+                mtf.send(now, "fooBean", {"count": sec})
+        finally:
+            mtf.close()
+
+        with open(index_path(path), "r") as fin:
+            lines = fin.readlines()
+        self.assertEqual(10, len(lines))
+        self.assertTrue(lines[0].startswith("0\tfooBean\t"),
+                        "Bad first index line %s" % (lines[0], ))
+
+        # once the writer is done, a rebuilt index can be saved
+        self.assertTrue(MoniIndex.load(path).save(), "Could not save index")
+
+    def test_filtered_stream(self):
+        path = self.__write_moni("foo-1", 10)
+
+        start = self.BASE_TIME + datetime.timedelta(seconds=3)
+        end = self.BASE_TIME + datetime.timedelta(seconds=5)
+
+        expected = []
+        for fields in moni_stream(path):
+            if fields[1] != "fooBean":
+                continue
+            if str(start) <= fields[0] <= str(end):
+                expected.append(fields)
+
+        found = list(moni_stream(path, start=start, end=end,
+                                 beans=("fooBean", )))
+        self.assertEqual(expected, found)
+        self.assertEqual(6, len(found))
+
+    def test_string_times(self):
+        path = self.__write_moni("foo-1", 10)
+
+        found = list(moni_stream(path, start="2021-07-13 12:00:08",
+                                 beans=("barBean", "noBean")))
+        self.assertEqual([("2021-07-13 12:00:08.123456", "barBean", "total",
+                           80),
+                          ("2021-07-13 12:00:09.123456", "barBean", "total",
+                           90)], found)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,7 @@ from LiveImports import Prio
 from RunOption import RunOption
 from decorators import classproperty
 from i3helper import reraise_excinfo
+from moni_index import MoniIndexWriter
 
 from exc_string import exc_string, set_exc_string_encoding
 set_exc_string_encoding("ascii")
@@ -226,8 +227,14 @@ class MonitorToFile(object):
         "Open pDAQ monitoring file"
         if dirname is None:
             self.__fd = None
+            self.__index = None
         else:
-            self.__fd = open(os.path.join(dirname, basename + ".moni"), "w")
+            path = os.path.join(dirname, basename + ".moni")
+            self.__fd = open(path, "w")
+            try:
+                self.__index = MoniIndexWriter(path)
+            except (IOError, OSError):
+                self.__index = None
         self.__fd_lock = threading.Lock()
 
     def close(self):
@@ -236,16 +243,23 @@ class MonitorToFile(object):
             if self.__fd is not None:
                 self.__fd.close()
                 self.__fd = None
+            if self.__index is not None:
+                self.__index.close()
+                self.__index = None
 
     def send(self, now, bean_name, attrs):
         "Send monitoring data to pDAQ file"
         with self.__fd_lock:
             if self.__fd is not None:
+                if self.__index is not None:
+                    self.__index.add(self.__fd.tell(), bean_name, now)
                 print("%s: %s:" % (bean_name, now), file=self.__fd)
                 for key in attrs:
                     print("\t%s: %s" % (key, attrs[key]), file=self.__fd)
                 print(file=self.__fd)
                 self.__fd.flush()
+                if self.__index is not None:
+                    self.__index.flush()
 
 
 class MonitorToLive(object):
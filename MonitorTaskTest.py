@@ -10,6 +10,7 @@ from DAQClient import BeanTimeoutException
 from LiveImports import Prio
 from MonitorTask import MonitorTask
 from RunOption import RunOption
+from moni_index import INDEX_SUFFIX
 
 from DAQMocks import MockComponent, MockIntervalTimer, MockLiveMoni, \
      MockLogger, MockMBeanClient, MockRunSet, MockTaskManager
@@ -178,9 +179,15 @@ class MonitorTaskTest(unittest.TestCase):
             # if monitoring CnCServer, there should be a cncServer.moni file
             exp_files += 1
 
-        self.assertTrue(len(files) == exp_files,
+        moni_files = [x for x in files if x.endswith(".moni")]
+        self.assertTrue(len(moni_files) == exp_files,
                         "Expected %d files, not %d: %s" %
-                        (exp_files, len(files), files))
+                        (exp_files, len(moni_files), files))
+
+        # every .moni file should have an index
+        for fname in moni_files:
+            self.assertTrue(fname + INDEX_SUFFIX in files,
+                            "Missing index for %s: %s" % (fname, files))
 
     def setUp(self):
         self.__temp_dir = tempfile.mkdtemp()
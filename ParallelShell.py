@@ -18,24 +18,113 @@ will return while the commands continue to run;
 from __future__ import print_function
 
 import datetime
+import errno
 import os
 import random
+import select
 import signal
 import subprocess
 import time
 
 
+# how often (in seconds) to check on commands which can't be watched
+# through an output pipe
+POLL_INTERVAL = 0.01
+# how often to check on commands whose output pipe is still open (usually
+# the pipe closes when the command exits, but background processes may
+# keep it open)
+PIPE_POLL_INTERVAL = 0.1
+
+
 class TimeoutException(Exception):
     "Exception thrown when a running command exceeds the timeout value"
     pass  # pylint: disable=unnecessary-pass
 
 
+def wait_readable(fds, timeout):
+    """
+    Wait up to 'timeout' seconds (forever if 'timeout' is None) for any of
+    the file descriptors in 'fds' to become readable, and return the list
+    of readable descriptors
+    """
+    if len(fds) == 0:  # pylint: disable=len-as-condition
+        if timeout is not None and timeout > 0:
+            time.sleep(timeout)
+        return []
+
+    try:
+        if hasattr(select, "poll"):
+            # poll() isn't limited to descriptors below FD_SETSIZE
+            poller = select.poll()
+            for fdesc in fds:
+                poller.register(fdesc, select.POLLIN | select.POLLHUP |
+                                select.POLLERR)
+            if timeout is None:
+                events = poller.poll()
+            else:
+                events = poller.poll(max(timeout, 0.0) * 1000.0)
+            return [fdesc for fdesc, _ in events]
+
+        ready, _, _ = select.select(fds, [], [], timeout)
+        return ready
+    except (OSError, select.error) as err:
+        if err.args[0] == errno.EINTR:
+            return []
+        raise
+
+
+def wait_for_commands(pcmds, max_wait=None):
+    """
+    Wait until at least one of the running commands in 'pcmds' finishes,
+    reading their output as it arrives, or until 'max_wait' seconds have
+    passed.  Return the list of commands which finished.
+    """
+    running = [cmd for cmd in pcmds if cmd.subproc is not None and
+               not cmd.done]
+    if len(running) == 0:  # pylint: disable=len-as-condition
+        return []
+
+    start = time.time()
+    while True:
+        fds = {}
+        timeout = max_wait
+        for cmd in running:
+            fdesc = cmd.output_fd
+            if fdesc is not None:
+                fds[fdesc] = cmd
+                interval = PIPE_POLL_INTERVAL
+            else:
+                # no pipe to watch, so check back on this command soon
+                interval = POLL_INTERVAL
+            if timeout is None or timeout > interval:
+                timeout = interval
+
+            if cmd.deadline is not None:
+                remaining = cmd.deadline - time.time()
+                if timeout is None or remaining < timeout:
+                    timeout = remaining
+
+        if max_wait is not None:
+            remaining = start + max_wait - time.time()
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+
+        for fdesc in wait_readable(list(fds.keys()), timeout):
+            fds[fdesc].read_output()
+
+        finished = [cmd for cmd in running if cmd.poll()]
+        if len(finished) > 0:  # pylint: disable=len-as-condition
+            return finished
+        if max_wait is not None and time.time() - start >= max_wait:
+            return []
+
+
 class PCmd(object):
     """
     Handle individual shell commands to be executed in parallel.
     """
 
-    # class variable to guarantee unique filenames
+    # class variable to guarantee unique command IDs
     counter = 0
 
     def __init__(self, cmd, parallel=True, dry_run=False,
@@ -50,8 +139,7 @@ class PCmd(object):
         verbose  - If True, print command as they are run along with
                    process IDs and return codes. Default: False
         trace    - If True, use inherited parent's stdout and stderr.  If
-                   False (the default) modifiy command string to redirect
-                   stdout & err to /dev/null.
+                   False (the default) capture stdout & err through a pipe.
         timeout  - If not None, number of seconds to wait before killing
                    process and raising a TimeoutException;
         """
@@ -68,8 +156,11 @@ class PCmd(object):
         self.counter = PCmd.counter
         self.pid = os.getpid()
 
-        filename = "__pcmd__%d__%d.txt" % (self.pid, self.counter)
-        self.__out_file = os.path.join("/", "tmp", filename)
+        # pipe carrying the command's stdout and stderr
+        self.__pipe = None
+        self.__chunks = []
+        self.__start_time = None
+        self.__end_time = None
 
         self.__output = ""
         self.done = False
@@ -100,30 +191,123 @@ class PCmd(object):
         return "'%s' [%s] (pid was %d) returned %d " % \
           (self.cmd, state_str, self.subproc.pid, self.subproc.returncode)
 
+    def __close_pipe(self):
+        "Read anything left in the output pipe, then close it"
+        if self.__pipe is None:
+            return
+
+        # background processes may still hold the pipe open,
+        # so only read what's already there
+        while self.__pipe is not None and \
+          len(wait_readable([self.__pipe.fileno()],
+                            0)) > 0:  # pylint: disable=len-as-condition
+            self.read_output()
+
+        if self.__pipe is not None:
+            self.__pipe.close()
+            self.__pipe = None
+
+    def __finish(self, timed_out=False):
+        "Record the end of this command and harvest its output"
+        self.__end_time = time.time()
+        self.done = True
+        if self.verbose:
+            print("ParallelShell: %s" % self)
+
+        if timed_out:
+            self.__output += "TIMEOUT exceeded (%d seconds)" % self.timeout
+
+        # Harvest results
+        if self.trace:
+            self.__output += "Output not available: went to stdout!"
+        else:
+            self.__close_pipe()
+            self.__output += b"".join(self.__chunks).decode("utf-8",
+                                                            "replace")
+            self.__chunks = []
+
+    @property
+    def deadline(self):
+        "Time when this command will time out, or None if it never will"
+        if not self.timeout or self.__start_time is None or self.done:
+            return None
+        return self.__start_time + self.timeout
+
+    @property
+    def elapsed(self):
+        """
+        Number of seconds this command took to finish (or has been running),
+        or None if it was never started
+        """
+        if self.__start_time is None:
+            return None
+        if self.__end_time is None:
+            return time.time() - self.__start_time
+        return self.__end_time - self.__start_time
+
+    @property
+    def output_fd(self):
+        "File descriptor of the output pipe, or None if it's closed"
+        if self.__pipe is None:
+            return None
+        return self.__pipe.fileno()
+
+    def poll(self):
+        """
+        Check whether this command has finished, killing it if it has
+        exceeded its timeout.  Return True if the command is done.
+        """
+        if self.done:
+            return True
+        if self.subproc is None:
+            return False
+
+        if self.subproc.poll() is not None:
+            self.__finish()
+        elif self.deadline is not None and time.time() >= self.deadline:
+            # Kill child process - note that this may fail
+            # to clean up everything if child has spawned more proc's
+            try:
+                os.kill(self.subproc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self.subproc.wait()
+            self.__finish(timed_out=True)
+
+        return self.done
+
+    def read_output(self):
+        "Read whatever output is available without blocking"
+        if self.__pipe is None:
+            return
+
+        data = os.read(self.__pipe.fileno(), 65536)
+        if len(data) > 0:  # pylint: disable=len-as-condition
+            self.__chunks.append(data)
+        else:
+            # end of file
+            self.__pipe.close()
+            self.__pipe = None
+
     def start(self):
         """ Start this command. """
         self.tstart = datetime.datetime.now()
 
-        # If not tracing, send both stdout and stderr to /dev/null
-        if not self.trace:
-            # Handle the case where the command ends in an '&' (silly
-            # but we shouldn't break)
-            if self.cmd.rstrip().endswith("&"):
-                controlop = " "
-            else:
-                controlop = ";"
-            self.cmd = "{ %s %c } >%s 2>&1" % (self.cmd,
-                                               controlop,
-                                               self.__out_file)
-
         if self.subproc is not None:
             raise RuntimeError("Attempt to start a running command!")
 
         # Create a Popen object for running a shell child proc to
-        # run the command
+        # run the command.  If not tracing, collect both stdout and
+        # stderr through a single pipe
         if not self.dry_run:
-            time.sleep(0.01)
-            self.subproc = subprocess.Popen(self.cmd, shell=True)
+            self.__start_time = time.time()
+            if self.trace:
+                self.subproc = subprocess.Popen(self.cmd, shell=True)
+            else:
+                self.subproc = subprocess.Popen(self.cmd, shell=True,
+                                                stdout=subprocess.PIPE,
+                                                stderr=subprocess.STDOUT)
+                self.__pipe = self.subproc.stdout
 
         if self.verbose:
             print("ParallelShell: %s" % self)
@@ -144,40 +328,8 @@ class PCmd(object):
         if self.dry_run:
             return
 
-        if not self.timeout:
-            self.subproc.wait()
-        else:  # Handle polling/timeout case
-            status = self.subproc.poll()
-            if status is None:
-                elapsed = datetime.datetime.now() - self.tstart
-                if elapsed < datetime.timedelta(seconds=self.timeout):
-                    # we haven't timed out yet
-                    return
-
-                # Kill child process - note that this may fail
-                # to clean up everything if child has spawned more proc's
-                os.kill(self.subproc.pid, signal.SIGKILL)
-                self.done = True
-                self.__output += "TIMEOUT exceeded (%d seconds)" % self.timeout
-
-        self.done = True
-        if self.verbose:
-            print("ParallelShell: %s" % self)
-
-        # Harvest results
-        if self.trace:
-            self.__output += "Output not available: went to stdout!"
-        else:
-            try:
-                with open(self.__out_file, "r") as fin:
-                    self.__output += "".join(fin.readlines())
-                os.unlink(self.__out_file)
-            except Exception as exc:  # pylint: disable=broad-except
-                self.__output += \
-                  "Could not read or delete result file %s (%s)!" % \
-                  (self.__out_file, exc)
-
-        return
+        while not self.done:
+            wait_for_commands([self, ])
 
     @property
     def output(self):
@@ -188,17 +340,25 @@ class PCmd(object):
 class ParallelShell(object):
     """ Class to implement multiple shell commands in parallel. """
     def __init__(self, parallel=True, dry_run=False,
-                 verbose=False, trace=False, timeout=None):
+                 verbose=False, trace=False, timeout=None, max_running=None):
         """ Construct a new ParallelShell object for managing multiple
         shell commands to be run in parallel.  The parallel, dry_run,
         verbose and trace options are identical to and used for each
-        added PCmd object. """
+        added PCmd object.  If 'max_running' is set, no more than that
+        many commands are run at once, and wait() starts the rest as
+        earlier commands finish. """
         self.pcmds = []
         self.__parallel = parallel
         self.dry_run = dry_run
         self.verbose = verbose
         self.trace = trace
         self.timeout = timeout
+        self.max_running = max_running
+
+    def __num_running(self):
+        "Return the number of commands which have started but not finished"
+        return len([cmd for cmd in self.pcmds
+                    if cmd.subproc is not None and not cmd.done])
 
     def add(self, cmd):
         "Add command to list of pending operations."
@@ -206,6 +366,18 @@ class ParallelShell(object):
                                self.verbose, self.trace, self.timeout))
         return len(self.pcmds) - 1  # Start w/ 0
 
+    @property
+    def command_latencies(self):
+        """
+        Return a dictionary mapping each finished command to the number
+        of seconds it took
+        """
+        ret = {}
+        for cmd in self.pcmds:
+            if cmd.done and cmd.elapsed is not None:
+                ret[cmd.orig_cmd] = cmd.elapsed
+        return ret
+
     def shuffle(self):
         """
         Randomize the list of commands as a lame attempt to avoid hammering
@@ -214,40 +386,54 @@ class ParallelShell(object):
         random.shuffle(self.pcmds)
 
     def start(self):
-        """ Start all unstarted commands. """
+        """ Start all unstarted commands (or as many as 'max_running'
+        allows). """
+        if self.max_running is None:
+            num_slots = len(self.pcmds)
+        else:
+            num_slots = self.max_running - self.__num_running()
+
         for cmd in self.pcmds:
-            if cmd.subproc is None:
+            if num_slots <= 0:
+                break
+            if cmd.subproc is None and not cmd.done:
                 cmd.start()
+                if cmd.dry_run:
+                    # nothing was started, so don't wait for it
+                    cmd.done = True
+                else:
+                    num_slots -= 1
 
     def wait(self, monitor_ival=None):
-        """ Wait for all started commands to complete (or time out).  If the
+        """ Wait for all started commands to complete (or time out),
+        starting any commands held back by 'max_running'.  If the
         commands are backgrounded (or fork then return in their
-        parent) then this will return immediately. """
+        parent) then this will return as soon as the shells exit. """
+
+        start_time = time.time()
+        next_report = None
+        if monitor_ival is not None:
+            next_report = start_time + monitor_ival
 
-        start_time = datetime.datetime.now()
         num_to_do = len(self.pcmds)
         while True:
-            still_waiting = False
-            num_done = 0
-            for cmd in self.pcmds:
-                if cmd.subproc:
-                    if cmd.done:
-                        num_done += 1
-                    else:
-                        cmd.wait()  # Can raise TimeoutException
-                        still_waiting = True
-
-            if not still_waiting:
+            if self.max_running is not None:
+                self.start()
+
+            if self.__num_running() == 0:
                 break
 
-            stop_time = datetime.datetime.now()
-            if monitor_ival is not None:
-                monitor_delta = datetime.timedelta(seconds=monitor_ival)
-                if stop_time - start_time > monitor_delta:
-                    dttm = stop_time - start_time
-                    print("%d of %d done (%s)." % (num_done, num_to_do, dttm))
+            max_wait = None
+            if next_report is not None:
+                max_wait = max(next_report - time.time(), 0.0)
+
+            wait_for_commands(self.pcmds, max_wait=max_wait)
 
-            time.sleep(0.3)
+            if next_report is not None and time.time() >= next_report:
+                num_done = len([cmd for cmd in self.pcmds if cmd.done])
+                dttm = datetime.timedelta(seconds=time.time() - start_time)
+                print("%d of %d done (%s)." % (num_done, num_to_do, dttm))
+                next_report = time.time() + monitor_ival
 
     def show_all(self):
         """
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"ParallelShell unit tests"
+
+import time
+import unittest
+
+from ParallelShell import ParallelShell
+
+
+class ParallelShellTest(unittest.TestCase):
+    def test_output(self):
+        psh = ParallelShell(timeout=10)
+        ok_id = psh.add("echo out; echo err >&2")
+        bad_id = psh.add("echo failed; exit 3")
+        psh.start()
+        psh.wait()
+
+        self.assertEqual("out\nerr\n", psh.get_output_by_id(ok_id))
+        self.assertEqual("failed\n", psh.get_output_by_id(bad_id))
+
+        results = psh.command_results
+        self.assertEqual(0, results["echo out; echo err >&2"][0])
+        self.assertEqual(3, results["echo failed; exit 3"][0])
+
+        latencies = psh.command_latencies
+        self.assertEqual(2, len(latencies))
+        for secs in latencies.values():
+            self.assertTrue(0.0 <= secs < 10.0, "Bad latency %s" % (secs, ))
+
+    def test_timeout(self):
+        psh = ParallelShell(timeout=0.5)
+        job = psh.add("echo started; sleep 10")
+
+        start = time.time()
+        psh.start()
+        psh.wait()
+        elapsed = time.time() - start
+
+        self.assertTrue(elapsed < 5.0, "Timeout took %.2f seconds" %
+                        (elapsed, ))
+        output = psh.get_output_by_id(job)
+        self.assertTrue(output.startswith("TIMEOUT exceeded"),
+                        "Unexpected output \"%s\"" % (output, ))
+        self.assertTrue(psh.command_results["echo started; sleep 10"][0] < 0,
+                        "Timed-out command was not killed")
+
+    def test_background(self):
+        # a backgrounded child keeps the output pipe open after the
+        # shell exits, which shouldn't delay wait()
+        psh = ParallelShell(timeout=10)
+        psh.add("sleep 3 &")
+
+        start = time.time()
+        psh.start()
+        psh.wait()
+        elapsed = time.time() - start
+
+        self.assertTrue(elapsed < 2.0, "Background command took %.2f seconds" %
+                        (elapsed, ))
+        self.assertEqual(0, psh.command_results["sleep 3 &"][0])
+
+    def test_max_running(self):
+        psh = ParallelShell(timeout=10, max_running=2)
+        for idx in range(4):
+            psh.add("sleep 0.2; echo %d" % idx)
+
+        start = time.time()
+        psh.start()
+        self.assertEqual(2, len([cmd for cmd in psh.pcmds
+                                 if cmd.subproc is not None]))
+        psh.wait()
+        elapsed = time.time() - start
+
+        self.assertTrue(elapsed >= 0.4, "Commands were not throttled")
+        for cmd, (rtncode, output) in psh.command_results.items():
+            self.assertEqual(0, rtncode)
+            self.assertEqual(cmd[-1] + "\n", output)
+
+    def test_dry_run(self):
+        psh = ParallelShell(dry_run=True)
+        psh.add("exit 1")
+        psh.start()
+        psh.wait()
+
+        self.assertEqual((-1, ''), psh.command_results["exit 1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,7 +16,6 @@ import datetime
 import logging
 import os
 import sys
-import tarfile
 import time
 import traceback
 
@@ -24,6 +23,7 @@ import icetop_hdf5
 
 from DefaultDomGeometry import DefaultDomGeometryReader
 from Process import exclusive_process, ProcessException
+from TarStreamer import TarStreamer
 
 MAX_FILES_PER_TARBALL = 50
 
@@ -277,8 +277,8 @@ def process_files(spade_dir, create_icetop_hdf5=False, dry_run=False,
         # read in default-dom-geometry.xml
         ddg = DefaultDomGeometryReader.parse(translate_doms=True)
 
-        # cache the DOM ID -> DOM dictionary
-        dom_dict = ddg.get_dom_id_to_dom_dict()
+        # cache the mainboard ID -> DOM dictionary
+        dom_dict = ddg.get_mbid_to_dom_dict()
 
         icetop_hdf5.process_list(moni_files, dom_dict, verbose=verbose,
                                  dry_run=dry_run)
@@ -316,33 +316,28 @@ def create_tar_and_sem_files(files_to_tar, verbose=False, dry_run=False,
         time.sleep(1)
         return True
 
-    # Create temporary tarball
-    tmp_tar = "tmp-" + date_tag + ".tar"
+    # Create tarball (written to a temporary file and renamed when done)
     if verbose:
-        print("Creating temporary tarball")
+        print("Creating tarball %s" % spade_tar)
+    tarball = None
     try:
         if not dry_run:
-            tarball = tarfile.open(tmp_tar, "w")
+            tarball = TarStreamer([spade_tar, ])
         for tfile in files_to_tar:
             if verbose:
                 print("  %s" % str(tfile))
             logging.debug("++ %s", tfile)
             if not dry_run:
                 tarball.add(tfile)
-        if not dry_run:
-            tarball.close()
     except:
-        os.unlink(tmp_tar)
+        if tarball is not None:
+            tarball.abort()
         raise
+    if not dry_run:
+        logging.debug("Wrote %s", tarball.close())
     if verbose:
         print("Done.")
 
-    # Rename temporary tarball to SPADE name
-    if verbose:
-        print("Renaming temporary tarball to %s" % spade_tar)
-    if not dry_run:
-        os.rename(tmp_tar, spade_tar)
-
     # Create moni hard link
     if enable_moni_link:
         if verbose:
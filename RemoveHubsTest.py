@@ -5,6 +5,7 @@ import tempfile
 import unittest
 
 from DAQConfig import DAQConfigException, DAQConfigParser
+from DAQMocks import MockCacheDirectory
 from RemoveHubs import create_config
 
 
@@ -54,5 +55,14 @@ class RemoveHubsTest(unittest.TestCase):
             pass
 
 
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
+
 if __name__ == '__main__':
     unittest.main()
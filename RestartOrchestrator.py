@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+"""
+Restart (or "cycle") a set of pDAQ components.
+
+Components are grouped by host and each host is restarted on its own:
+kill its components, wait for CnCServer to forget about them, launch them
+again and wait for them to register.  Up to 'max_parallel' hosts are
+restarted at once, so a slow host doesn't hold up the others, and any
+components which don't come back are killed and launched again (up to
+'max_attempts' times in all, and never for more than 'timeout' seconds).
+
+restart() waits for the whole restart to finish, while start() does it in
+the background so callers (usually RPC requests) don't have to wait for
+components to register.
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from RunTimeline import RunTimeline, timeline_span
+
+from exc_string import exc_string, set_exc_string_encoding
+set_exc_string_encoding("ascii")
+
+
+class HostRestart(object):
+    "Progress of the restart of all components on a single host"
+
+    def __init__(self, host, comps):
+        self.__host = host
+        self.__comps = comps[:]
+        self.__attempts = 0
+        self.__failed = []
+        self.__phase_times = {}
+
+    def __str__(self):
+        times = ", ".join("%s %.2fs" % (name, self.__phase_times[name])
+                          for name in RestartOrchestrator.PHASES
+                          if name in self.__phase_times)
+        return "%s*%d: %d attempt%s (%s)" % \
+            (self.__host, len(self.__comps), self.__attempts,
+             "" if self.__attempts == 1 else "s", times)
+
+    def add_attempt(self):
+        self.__attempts += 1
+
+    def add_time(self, phase, secs):
+        "Add 'secs' to the total time spent in 'phase'"
+        self.__phase_times[phase] = self.__phase_times.get(phase, 0.0) + secs
+
+    @property
+    def attempts(self):
+        return self.__attempts
+
+    @property
+    def components(self):
+        return self.__comps[:]
+
+    @property
+    def failed(self):
+        "Components which never registered"
+        return self.__failed[:]
+
+    @failed.setter
+    def failed(self, comps):
+        self.__failed = comps[:]
+
+    @property
+    def host(self):
+        return self.__host
+
+    @property
+    def phase_times(self):
+        "Dictionary mapping each phase to the total seconds spent in it"
+        return self.__phase_times.copy()
+
+
+class RestartReport(object):
+    "Summary of a restart"
+
+    def __init__(self, hosts, elapsed):
+        self.__hosts = hosts
+        self.__elapsed = elapsed
+
+    def __str__(self):
+        num_comps = sum(len(x.components) for x in self.__hosts)
+        slowest = self.slowest_phases
+        times = ", ".join("%s %.2fs" % (name, slowest[name])
+                          for name in RestartOrchestrator.PHASES
+                          if name in slowest)
+        return "Restarted %d component%s on %d host%s in %.2fs" \
+            " (slowest %s)" % \
+            (num_comps, "" if num_comps == 1 else "s", len(self.__hosts),
+             "" if len(self.__hosts) == 1 else "s", self.__elapsed, times)
+
+    @property
+    def elapsed(self):
+        "Total number of seconds taken by the restart"
+        return self.__elapsed
+
+    @property
+    def failed(self):
+        "List of components which could not be restarted"
+        comps = []
+        for hrs in self.__hosts:
+            comps += hrs.failed
+        return comps
+
+    @property
+    def hosts(self):
+        "List of HostRestart objects"
+        return self.__hosts[:]
+
+    @property
+    def slowest_phases(self):
+        "Dictionary mapping each phase to the longest time any host took"
+        slowest = {}
+        for hrs in self.__hosts:
+            for name, secs in hrs.phase_times.items():
+                if name not in slowest or slowest[name] < secs:
+                    slowest[name] = secs
+        return slowest
+
+
+class RestartOrchestrator(object):
+    """
+    Restart components, one host at a time on each of a bounded number of
+    worker threads.
+
+    kill_func(comps) - kill the processes for all 'comps' (on a single host)
+    launch_func(comps) - launch new processes for all 'comps'
+    registered_func() - return the full names of all components currently
+                        registered with CnCServer.  If this is None, don't
+                        wait for components to come and go (or retry them)
+    """
+
+    # phases of each host's restart, in order
+    PHASES = ("kill", "deregister", "launch", "register")
+
+    # maximum number of hosts being restarted at once
+    MAX_PARALLEL = 16
+    # maximum number of times each component is killed and launched
+    MAX_ATTEMPTS = 2
+    # seconds to wait for killed components to disappear from CnCServer
+    DEREGISTER_SECS = 10.0
+    # seconds to wait for launched components to register
+    REGISTER_SECS = 60.0
+    # seconds between checks of the registered components
+    POLL_SECS = 0.25
+    # maximum number of seconds for an entire restart
+    TIMEOUT_SECS = 120.0
+
+    # full names of components being restarted by any orchestrator
+    __RESTARTING = set()
+    __RESTARTING_LOCK = threading.Lock()
+
+    def __init__(self, kill_func, launch_func, registered_func=None,
+                 logger=None, max_parallel=None, max_attempts=None,
+                 deregister_secs=None, register_secs=None, poll_secs=None,
+                 timeout=None):
+        self.__kill_func = kill_func
+        self.__launch_func = launch_func
+        self.__registered_func = registered_func
+        self.__logger = logger
+
+        self.__max_parallel = self.MAX_PARALLEL if max_parallel is None \
+          else max(max_parallel, 1)
+        self.__max_attempts = self.MAX_ATTEMPTS if max_attempts is None \
+          else max(max_attempts, 1)
+        self.__deregister_secs = self.DEREGISTER_SECS \
+          if deregister_secs is None else deregister_secs
+        self.__register_secs = self.REGISTER_SECS if register_secs is None \
+          else register_secs
+        self.__poll_secs = self.POLL_SECS if poll_secs is None else poll_secs
+        self.__timeout = self.TIMEOUT_SECS if timeout is None else timeout
+
+    def __error(self, msg):
+        if self.__logger is not None:
+            self.__logger.error(msg)
+
+    @classmethod
+    def __group_by_host(cls, comp_list):
+        "Return a list of HostRestart objects, in order of first appearance"
+        order = []
+        host_comps = {}
+        for comp in comp_list:
+            if comp.host not in host_comps:
+                order.append(comp.host)
+                host_comps[comp.host] = []
+            host_comps[comp.host].append(comp)
+
+        return [HostRestart(host, host_comps[host]) for host in order]
+
+    def __claim(self, comp_list):
+        """
+        Return the components in 'comp_list' which aren't already being
+        restarted, and mark them as being restarted
+        """
+        claimed = []
+        busy = []
+        with self.__RESTARTING_LOCK:
+            for comp in comp_list:
+                if comp.fullname in self.__RESTARTING:
+                    busy.append(comp)
+                else:
+                    self.__RESTARTING.add(comp.fullname)
+                    claimed.append(comp)
+
+        if busy:
+            self.__error("Not restarting %s: already being restarted" %
+                         (self.__names(busy), ))
+        return claimed
+
+    def __release(self, comp_list):
+        with self.__RESTARTING_LOCK:
+            for comp in comp_list:
+                self.__RESTARTING.discard(comp.fullname)
+
+    def __restart_all(self, comp_list, deadline):
+        hosts = self.__group_by_host(comp_list)
+
+        work = queue.Queue()
+        for hrs in hosts:
+            work.put(hrs)
+
+        # worker threads record their spans in the caller's timeline
+        timeline = RunTimeline.active()
+
+        threads = []
+        for num in range(min(self.__max_parallel, len(hosts))):
+            thrd = threading.Thread(name="Restart#%d" % num,
+                                    target=self.__worker,
+                                    args=(work, timeline, deadline))
+            thrd.setDaemon(True)
+            thrd.start()
+            threads.append(thrd)
+
+        for thrd in threads:
+            thrd.join()
+
+        return hosts
+
+    def __restart_host(self, hrs, deadline):
+        "Kill and launch all components on one host until they register"
+        pending = hrs.components
+        while pending and hrs.attempts < self.__max_attempts and \
+          (hrs.attempts == 0 or time.time() < deadline):
+            hrs.add_attempt()
+
+            self.__run_phase(hrs, "kill", self.__kill_func, pending)
+
+            stale = self.__wait_phase(hrs, "deregister", pending, False,
+                                      self.__deregister_secs, deadline)
+            if stale:
+                self.__error("%s: %s did not unregister" %
+                             (hrs.host, self.__names(stale)))
+
+            if not self.__run_phase(hrs, "launch", self.__launch_func,
+                                    pending):
+                continue
+
+            pending = self.__wait_phase(hrs, "register", pending, True,
+                                        self.__register_secs, deadline)
+            if pending and hrs.attempts < self.__max_attempts and \
+              time.time() < deadline:
+                self.__error("%s: %s did not register, retrying" %
+                             (hrs.host, self.__names(pending)))
+
+        hrs.failed = pending
+
+    def __run_phase(self, hrs, phase, func, comps):
+        "Call func(comps), returning False if it failed"
+        start = time.time()
+        try:
+            with timeline_span(phase, "restart", lane=hrs.host):
+                func(comps)
+            return True
+        except:  # pylint: disable=bare-except
+            self.__error("%s: cannot %s %s: %s" %
+                         (hrs.host, phase, self.__names(comps),
+                          exc_string()))
+            return False
+        finally:
+            hrs.add_time(phase, time.time() - start)
+
+    @classmethod
+    def __names(cls, comps):
+        return ", ".join(comp.fullname for comp in comps)
+
+    def __wait_phase(self, hrs, phase, comps, registered, timeout, deadline):
+        """
+        Wait up to 'timeout' seconds (but not past 'deadline') until all
+        'comps' are registered (or, if 'registered' is False, until none of
+        them are), and return the list of components which never reached
+        that state
+        """
+        if self.__registered_func is None:
+            return []
+
+        start = time.time()
+        timeout = min(timeout, deadline - start)
+        with timeline_span(phase, "restart", lane=hrs.host):
+            while True:
+                try:
+                    names = set(self.__registered_func())
+                except:  # pylint: disable=bare-except
+                    self.__error("Cannot fetch registered components: %s" %
+                                 (exc_string(), ))
+                    names = None
+
+                if names is None:
+                    waiting = comps[:]
+                else:
+                    waiting = [comp for comp in comps
+                               if (comp.fullname in names) != registered]
+                if not waiting or time.time() - start >= timeout:
+                    break
+
+                time.sleep(self.__poll_secs)
+
+        hrs.add_time(phase, time.time() - start)
+        return waiting
+
+    def __worker(self, work, timeline, deadline):
+        with RunTimeline.activated(timeline):
+            while True:
+                try:
+                    hrs = work.get_nowait()
+                except queue.Empty:
+                    break
+
+                try:
+                    self.__restart_host(hrs, deadline)
+                except:  # pylint: disable=bare-except
+                    self.__error("Cannot restart %s: %s" %
+                                 (hrs.host, exc_string()))
+                    hrs.failed = hrs.components
+
+    def restart(self, comp_list):
+        "Restart all components in 'comp_list' and return a RestartReport"
+        start = time.time()
+        deadline = start + self.__timeout
+
+        comp_list = self.__claim(comp_list)
+        try:
+            hosts = self.__restart_all(comp_list, deadline)
+        finally:
+            self.__release(comp_list)
+
+        return RestartReport(hosts, time.time() - start)
+
+    def start(self, comp_list, callback=None):
+        """
+        Restart all components in 'comp_list' in a background thread, then
+        pass the RestartReport to 'callback' (if specified).  Return the
+        thread.
+        """
+        timeline = RunTimeline.active()
+
+        def run():
+            with RunTimeline.activated(timeline):
+                report = self.restart(comp_list)
+            if callback is not None:
+                try:
+                    callback(report)
+                except:  # pylint: disable=bare-except
+                    self.__error("Cannot report restart: %s" %
+                                 (exc_string(), ))
+
+        thrd = threading.Thread(name="Restart", target=run)
+        thrd.setDaemon(True)
+        thrd.start()
+        return thrd
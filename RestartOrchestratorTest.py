@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+"RestartOrchestrator unit tests"
+
+import threading
+import time
+import unittest
+
+from RestartOrchestrator import RestartOrchestrator
+from RunTimeline import RunTimeline
+
+from DAQMocks import MockLogger
+
+
+class FakeComponent(object):
+    def __init__(self, name, num, host):
+        self.__name = name
+        self.__num = num
+        self.__host = host
+
+    def __repr__(self):
+        return self.fullname
+
+    @property
+    def fullname(self):
+        if self.__num == 0:
+            return self.__name
+        return "%s#%d" % (self.__name, self.__num)
+
+    @property
+    def host(self):
+        return self.__host
+
+
+class FakeCluster(object):
+    """
+    Pretend to kill and launch components, which (un)register themselves
+    with a fake CnCServer a short time later
+    """
+
+    def __init__(self, comps, delay=0.05):
+        self.__delay = delay
+        self.__registered = set(comp.fullname for comp in comps)
+        self.__lock = threading.Lock()
+
+        # components which ignore the next N launches
+        self.__duds = {}
+
+        # number of times each component has been launched, so a delayed
+        # unregistration from an earlier kill can't undo a later launch
+        self.__generation = {}
+
+        self.__busy_hosts = set()
+        self.__max_busy = 0
+        self.__launched = []
+
+    def __later(self, func, *args):
+        thrd = threading.Timer(self.__delay, func, args)
+        thrd.setDaemon(True)
+        thrd.start()
+
+    def __mark_busy(self, comps, busy):
+        with self.__lock:
+            for comp in comps:
+                if busy:
+                    self.__busy_hosts.add(comp.host)
+                else:
+                    self.__busy_hosts.discard(comp.host)
+            self.__max_busy = max(self.__max_busy, len(self.__busy_hosts))
+
+    def __register(self, name):
+        with self.__lock:
+            self.__registered.add(name)
+
+    def __unregister(self, name, generation):
+        with self.__lock:
+            if self.__generation.get(name, 0) == generation:
+                self.__registered.discard(name)
+
+    def add_dud(self, comp, num_launches):
+        self.__duds[comp.fullname] = num_launches
+
+    def kill(self, comps):
+        self.__mark_busy(comps, True)
+        time.sleep(self.__delay)
+        for comp in comps:
+            self.__later(self.__unregister, comp.fullname,
+                         self.__generation.get(comp.fullname, 0))
+
+    def launch(self, comps):
+        for comp in comps:
+            self.__launched.append(comp.fullname)
+            with self.__lock:
+                self.__generation[comp.fullname] = \
+                  self.__generation.get(comp.fullname, 0) + 1
+            if self.__duds.get(comp.fullname, 0) > 0:
+                self.__duds[comp.fullname] -= 1
+                continue
+            self.__later(self.__register, comp.fullname)
+        self.__mark_busy(comps, False)
+
+    @property
+    def launched(self):
+        return self.__launched[:]
+
+    @property
+    def max_busy(self):
+        return self.__max_busy
+
+    def registered(self):
+        with self.__lock:
+            return list(self.__registered)
+
+
+class RestartOrchestratorTest(unittest.TestCase):
+    def setUp(self):
+        self.__logger = MockLogger("restart")
+
+    def tearDown(self):
+        self.__logger.check_status(10)
+
+    @classmethod
+    def __create_comps(cls, num_hosts, hubs_per_host):
+        comps = []
+        for hnum in range(num_hosts):
+            host = "sps-ichub%02d" % (hnum + 1, )
+            for idx in range(hubs_per_host):
+                comps.append(FakeComponent("stringHub",
+                                           hnum * hubs_per_host + idx + 1,
+                                           host))
+        comps.append(FakeComponent("eventBuilder", 0, "sps-evbuilder"))
+        return comps
+
+    def __create_orchestrator(self, cluster, **kwargs):
+        return RestartOrchestrator(cluster.kill, cluster.launch,
+                                   registered_func=cluster.registered,
+                                   logger=self.__logger, poll_secs=0.01,
+                                   **kwargs)
+
+    def test_restart(self):
+        comps = self.__create_comps(6, 2)
+        cluster = FakeCluster(comps)
+
+        timeline = RunTimeline("restart")
+        with RunTimeline.activated(timeline):
+            report = self.__create_orchestrator(cluster,
+                                                max_parallel=3).restart(comps)
+
+        self.assertEqual([], report.failed)
+        self.assertEqual(7, len(report.hosts))
+        self.assertEqual(sorted(x.fullname for x in comps),
+                         sorted(cluster.launched))
+        self.assertTrue(cluster.max_busy <= 3,
+                        "%d hosts were restarted at once" % cluster.max_busy)
+        self.assertEqual(set(x.fullname for x in comps),
+                         set(cluster.registered()))
+
+        for hrs in report.hosts:
+            self.assertEqual(1, hrs.attempts)
+            self.assertEqual(sorted(RestartOrchestrator.PHASES),
+                             sorted(hrs.phase_times.keys()))
+
+        # each host's phases were recorded in the caller's timeline
+        names = set((span.lane, span.name) for span in timeline.spans)
+        for hrs in report.hosts:
+            for phase in RestartOrchestrator.PHASES:
+                self.assertTrue((hrs.host, phase) in names,
+                                "No %s span for %s" % (phase, hrs.host))
+
+        self.assertTrue(str(report).startswith("Restarted 13 components on"
+                                               " 7 hosts in "),
+                        "Bad report \"%s\"" % (report, ))
+
+    def test_retry(self):
+        comps = self.__create_comps(2, 2)
+        cluster = FakeCluster(comps)
+
+        # one hub doesn't come back the first time, another never does
+        cluster.add_dud(comps[0], 1)
+        cluster.add_dud(comps[3], 99)
+
+        self.__logger.add_expected_exact("sps-ichub01: stringHub#1 did not"
+                                         " register, retrying")
+        self.__logger.add_expected_exact("sps-ichub02: stringHub#4 did not"
+                                         " register, retrying")
+
+        orch = self.__create_orchestrator(cluster, max_attempts=2,
+                                          register_secs=2)
+        report = orch.restart(comps)
+
+        self.assertEqual([comps[3], ], report.failed)
+        attempts = dict((x.host, x.attempts) for x in report.hosts)
+        self.assertEqual({"sps-ichub01": 2, "sps-ichub02": 2,
+                          "sps-evbuilder": 1}, attempts)
+
+        # only the missing hubs were launched a second time
+        self.assertEqual(2, cluster.launched.count("stringHub#1"))
+        self.assertEqual(1, cluster.launched.count("stringHub#2"))
+
+    def test_no_registry(self):
+        comps = self.__create_comps(2, 1)
+        cluster = FakeCluster(comps)
+        cluster.add_dud(comps[0], 99)
+
+        # without a way to check registrations, every host gets one attempt
+        orch = RestartOrchestrator(cluster.kill, cluster.launch,
+                                   logger=self.__logger)
+        report = orch.restart(comps)
+
+        self.assertEqual([], report.failed)
+        for hrs in report.hosts:
+            self.assertEqual(1, hrs.attempts)
+            self.assertEqual(["kill", "launch"],
+                             sorted(hrs.phase_times.keys()))
+
+    def test_timeout(self):
+        comps = self.__create_comps(1, 1)
+        cluster = FakeCluster(comps)
+        cluster.add_dud(comps[0], 99)
+
+        # the overall timeout cuts the registration wait short and
+        # leaves no time for a retry
+        orch = self.__create_orchestrator(cluster, max_attempts=3,
+                                          register_secs=60, timeout=0.5)
+        start = time.time()
+        report = orch.restart(comps)
+
+        self.assertTrue(time.time() - start < 5,
+                        "Restart took %.2fs" % (time.time() - start))
+        self.assertEqual([comps[0], ], report.failed)
+        self.assertEqual(1, report.hosts[0].attempts)
+
+    def test_background(self):
+        comps = self.__create_comps(2, 1)
+        cluster = FakeCluster(comps)
+        cluster.add_dud(comps[0], 99)
+
+        self.__logger.add_expected_exact("sps-ichub01: stringHub#1 did not"
+                                         " register, retrying")
+        self.__logger.add_expected_regexp(r"Not restarting stringHub#1, .*:"
+                                          r" already being restarted")
+
+        reports = []
+        orch = self.__create_orchestrator(cluster, register_secs=0.5)
+        thrd = orch.start(comps, callback=reports.append)
+
+        # a second restart of the same components is ignored
+        time.sleep(0.05)
+        self.assertEqual([], orch.restart(comps).hosts)
+
+        thrd.join(10)
+        self.assertFalse(thrd.is_alive(), "Restart did not finish")
+        self.assertEqual(1, len(reports))
+        self.assertEqual([comps[0], ], reports[0].failed)
+
+    def test_launch_error(self):
+        comps = [FakeComponent("eventBuilder", 0, "sps-evbuilder"), ]
+        cluster = FakeCluster(comps)
+
+        def bad_launch(comps):
+            raise OSError("No such file")
+
+        self.__logger.add_expected_regexp(r"sps-evbuilder: cannot launch"
+                                          r" eventBuilder: .*No such file")
+        self.__logger.add_expected_regexp(r"sps-evbuilder: cannot launch"
+                                          r" eventBuilder: .*No such file")
+
+        orch = RestartOrchestrator(cluster.kill, bad_launch,
+                                   registered_func=cluster.registered,
+                                   logger=self.__logger, poll_secs=0.01)
+        report = orch.restart(comps)
+
+        self.assertEqual(comps, report.failed)
+        self.assertEqual(2, report.hosts[0].attempts)
+
+
+if __name__ == '__main__':
+    unittest.main()
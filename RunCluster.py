@@ -134,7 +134,7 @@ class RunCluster(CachedConfigName):
 
         self.__hub_list = self.__extract_hubs(cfg)
 
-        self.__cluster_desc = ClusterDescription(config_dir, descrName)
+        self.__cluster_desc = ClusterDescription.get(config_dir, descrName)
 
         # set the name to the run config plus cluster config
         name = os.path.basename(cfg.fullpath)
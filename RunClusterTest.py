@@ -4,8 +4,11 @@ from __future__ import print_function
 
 import os
 import re
+import shutil
+import tempfile
 import unittest
 from DAQConfig import DAQConfigParser
+from DAQMocks import MockCacheDirectory
 from RunCluster import RunCluster, RunClusterError
 from locate_pdaq import set_pdaq_config_dir
 
@@ -140,15 +143,34 @@ class RunClusterTest(unittest.TestCase):
     def setUp(self):
         set_pdaq_config_dir(RunClusterTest.CONFIG_DIR)
 
-    def test_cluster_file(self):  # pylint: disable=no-self-use
+    def test_cluster_file(self):
         cfg = DAQConfigParser.parse(RunClusterTest.CONFIG_DIR, "simpleConfig")
 
         cluster = RunCluster(cfg, "localhost", RunClusterTest.CONFIG_DIR)
 
-        cluster.clear_active_config()
-
-        cluster.write_cache_file(write_active_config=False)
-        cluster.write_cache_file(write_active_config=True)
+        # write the cached names to a scratch directory, not to the test
+        # configuration directory or the user's home directory
+        tmp_dir = tempfile.mkdtemp()
+        saved_home = os.environ.get("HOME")
+        os.environ["HOME"] = tmp_dir
+        set_pdaq_config_dir(tmp_dir, override=True)
+        try:
+            cluster.clear_active_config()
+
+            cluster.write_cache_file(write_active_config=False)
+            cluster.write_cache_file(write_active_config=True)
+
+            for name in (".config", ".active"):
+                with open(os.path.join(tmp_dir, name), "r") as fin:
+                    self.assertEqual(cluster.config_name,
+                                     fin.read().rstrip())
+        finally:
+            set_pdaq_config_dir(RunClusterTest.CONFIG_DIR, override=True)
+            if saved_home is None:
+                del os.environ["HOME"]
+            else:
+                os.environ["HOME"] = saved_home
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
     def test_deploy_localhost(self):
         cfg_name = 'simpleConfig'
@@ -462,5 +484,14 @@ class RunClusterTest(unittest.TestCase):
                              daq_log_dir, daq_data_dir)
 
 
+def setUpModule():
+    "Don't cache parsed files in the user's cache directory"
+    MockCacheDirectory.disable()
+
+
+def tearDownModule():
+    MockCacheDirectory.restore()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -13,7 +13,7 @@ from DAQMocks import MockComponent, MockLogger
 from DAQTime import PayloadTime
 
 from RunOption import RunOption
-from RunSet import RunData, RunSetException
+from RunSet import RateTracker, RunData, RunSetException
 
 
 class TinyClusterConfig(object):
@@ -547,6 +547,52 @@ class RunDataTest(unittest.TestCase):
                                    msg="Expected rate#%d %s, not %s" %
                                    (idx, exp_rate, rate))
 
+    def test_rate_tracker(self):
+        window = 10 * self.TICKS_PER_SEC
+
+        big = RateTracker((window, ), 100)
+        small = RateTracker((window, ), 3)
+        for tracker in (big, small):
+            self.assertEqual(0.0, tracker.rate(window))
+
+        for secs, count in ((0, 0), (4, 100), (8, 300), (12, 600),
+                            (16, 1000)):
+            for tracker in (big, small):
+                tracker.add(secs * self.TICKS_PER_SEC, count)
+
+        # the window starts at the newest entry more than 10 seconds old
+        self.assertAlmostEqual((1000 - 100) / 12.0, big.rate(window))
+        # ... or at the oldest entry left in the ring buffer
+        self.assertEqual(3, len(small))
+        self.assertAlmostEqual((1000 - 300) / 8.0, small.rate(window))
+
+    def test_stream_rates(self):
+        clu_cfg = TinyClusterConfig("xxxCluCfg")
+        run_cfg = TinyRunConfig("xxxRunCfg")
+
+        rdata = MyRunData(None, None, clu_cfg, run_cfg,
+                          RunOption.LOG_TO_LIVE, None, None, None, None)
+
+        first_pay_time = 9 * self.TICKS_PER_SEC
+        for idx in range(5):
+            ticks = first_pay_time + 30 * self.TICKS_PER_SEC * idx
+            rdata.update_event_counts(1000 * idx, None, first_pay_time, ticks,
+                                      10 * idx, ticks, 20 * idx, ticks,
+                                      30 * idx, ticks, add_rate=True)
+
+        # physics rate covers the last 5 minutes, which is the whole run
+        self.assertAlmostEqual((4000 - 1) / 120.0, rdata.rate)
+
+        rates = rdata.stream_rates("physics")
+        self.assertEqual([10, 60, 300, 600], sorted(rates.keys()))
+        self.assertAlmostEqual(1000 / 30.0, rates[10])
+        self.assertAlmostEqual(2000 / 60.0, rates[60])
+
+        for stream, mult in (("moni", 10), ("sn", 20), ("tcal", 30)):
+            rates = rdata.stream_rates(stream)
+            self.assertAlmostEqual(mult / 30.0, rates[10])
+            self.assertAlmostEqual(mult * 4 / 120.0, rates[600])
+
     def test_report_first_good_time(self):
         runset = TinyRunSet()
         run_num = None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Finish off switched-out runs (final report, event counts, run.xml, JADE
+queueing) in a background thread so the new run isn't held up
+"""
+
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from exc_string import exc_string, set_exc_string_encoding
+set_exc_string_encoding("ascii")
+
+
+class RunFinalizer(object):
+    """
+    Run finalization tasks, one at a time and in order, in a background
+    thread.  At most 'max_pending' tasks can be waiting; submit() blocks
+    when the queue is full so a backlog can't grow without bound.
+    """
+
+    # default maximum number of queued tasks
+    MAX_PENDING = 2
+
+    def __init__(self, logger, name="RunFinalizer", max_pending=None):
+        if max_pending is None:
+            max_pending = self.MAX_PENDING
+
+        self.__logger = logger
+        self.__name = name
+        self.__queue = queue.Queue(max_pending)
+
+        # number of tasks which have been submitted but haven't finished
+        self.__active = 0
+        self.__cond = threading.Condition()
+
+        self.__thread = None
+
+    def __str__(self):
+        return "%s*%d" % (self.__name, self.__active)
+
+    def __run(self):
+        while True:
+            task = self.__queue.get()
+            if task is None:
+                break
+
+            (desc, func, args) = task
+            try:
+                func(*args)
+            except:  # pylint: disable=bare-except
+                self.__logger.error("%s failed to %s: %s" %
+                                    (self.__name, desc, exc_string()))
+            finally:
+                with self.__cond:
+                    self.__active -= 1
+                    self.__cond.notify_all()
+
+    @property
+    def num_pending(self):
+        "Number of tasks which haven't finished"
+        with self.__cond:
+            return self.__active
+
+    def stop(self):
+        "Finish all queued tasks and stop the background thread"
+        with self.__cond:
+            thrd = self.__thread
+            self.__thread = None
+        if thrd is not None:
+            self.__queue.put(None)
+            thrd.join()
+
+    def submit(self, desc, func, *args):
+        "Queue func(*args) to be run in the background"
+        with self.__cond:
+            self.__active += 1
+            if self.__thread is None:
+                self.__thread = threading.Thread(name=self.__name,
+                                                 target=self.__run)
+                self.__thread.setDaemon(True)
+                self.__thread.start()
+
+        self.__queue.put((desc, func, args))
+
+    def wait(self, timeout=None):
+        """
+        Wait for all submitted tasks to finish.  Return False if some are
+        still running after 'timeout' seconds.
+        """
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        with self.__cond:
+            while self.__active > 0:
+                if timeout is None:
+                    self.__cond.wait()
+                else:
+                    remaining = end_time - time.time()
+                    if remaining <= 0:
+                        break
+                    self.__cond.wait(remaining)
+            return self.__active == 0
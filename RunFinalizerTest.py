@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"RunFinalizer unit tests"
+
+import threading
+import unittest
+
+from RunFinalizer import RunFinalizer
+
+from DAQMocks import MockLogger
+
+
+class RunFinalizerTest(unittest.TestCase):
+    def setUp(self):
+        self.__logger = MockLogger("finalizer")
+        self.__finalizer = None
+
+    def tearDown(self):
+        if self.__finalizer is not None:
+            self.__finalizer.stop()
+        self.__logger.check_status(10)
+
+    def test_order(self):
+        self.__finalizer = RunFinalizer(self.__logger)
+
+        done = []
+        for num in range(5):
+            self.__finalizer.submit("finish run %d" % num, done.append, num)
+
+        self.assertTrue(self.__finalizer.wait(10), "Tasks did not finish")
+        self.assertEqual(list(range(5)), done)
+        self.assertEqual(0, self.__finalizer.num_pending)
+
+    def test_back_pressure(self):
+        self.__finalizer = RunFinalizer(self.__logger, max_pending=1)
+
+        gate = threading.Event()
+        self.__finalizer.submit("block", gate.wait)
+        self.__finalizer.submit("queued", lambda: None)
+
+        # the queue is full, so a third task has to wait for room
+        submitted = threading.Event()
+
+        def submit_third():
+            self.__finalizer.submit("third", lambda: None)
+            submitted.set()
+
+        thrd = threading.Thread(target=submit_third)
+        thrd.start()
+
+        self.assertFalse(submitted.wait(0.2), "Submit should have blocked")
+        self.assertFalse(self.__finalizer.wait(0.1), "Tasks finished early")
+
+        gate.set()
+        thrd.join()
+        self.assertTrue(self.__finalizer.wait(10), "Tasks did not finish")
+
+    def test_error(self):
+        self.__finalizer = RunFinalizer(self.__logger, name="Fin")
+
+        def fail():
+            raise ValueError("oops")
+
+        done = []
+        self.__logger.add_expected_regexp(r"Fin failed to finish run 1: .*"
+                                          r"oops")
+        self.__finalizer.submit("finish run 1", fail)
+        self.__finalizer.submit("finish run 2", done.append, 2)
+
+        self.assertTrue(self.__finalizer.wait(10), "Tasks did not finish")
+        self.assertEqual([2, ], done)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,10 @@
 Main thread which manages all components during a detector "run"
 """
 
+import collections
 import datetime
 import os
+import random
 import threading
 import time
 import traceback
@@ -20,15 +22,21 @@ from CompOp import ComponentGroup, OpConfigureComponent, OpConfigureLogging, \
      OpResetComponent, OpResetLogging, OpSetReplayOffset, OpStartRun, \
      OpStartSubrun, OpStopLocalLogger, OpStopRun, OpSwitchRun
 from ComponentManager import ComponentManager
+from ComponentStateBoard import ComponentStateBoard
 from DAQClient import DAQClientState
 from DAQConfig import DOMNotInConfigException
 from DAQConst import DAQPort
-from DAQLog import DAQLog, FileAppender, LiveSocketAppender, LogSocketServer
+from DAQLog import DAQLog, FileAppender, LiveSocketAppender, \
+     LogSocketHub, LogSocketServer
 from DAQRPC import RPCClient
 from DAQTime import PayloadTime
+from FinalizeQueue import FinalizeQueueFullException
 from LiveImports import LIVE_IMPORT, MoniClient, MoniPort, Prio
+from RestartOrchestrator import RestartOrchestrator
+from RunFinalizer import RunFinalizer
 from RunOption import RunOption
 from RunSetState import RunSetState
+from RunTimeline import RunTimeline, timed_step, timeline_span
 from TaskManager import TaskManager
 from UniqueID import UniqueID
 from i3helper import Comparable, reraise_excinfo
@@ -199,6 +207,57 @@ class ConnTypeEntry(object):
                 conn_map[out_comp].append(entry)
 
 
+class GoodTimeHistory(object):
+    """
+    Remember how long each hub took to report a good time in earlier runs
+    so the first query can be put off until it's likely to succeed
+    """
+
+    # weight given to the newest measurement
+    WEIGHT = 0.5
+
+    def __init__(self):
+        self.__ready = {}
+        self.__lock = threading.Lock()
+
+    def clear(self):
+        "Forget all measurements"
+        with self.__lock:
+            self.__ready.clear()
+
+    def expected(self, key):
+        """
+        Return the expected number of seconds before hub 'key' has a good
+        time, or None if it has never reported one
+        """
+        with self.__lock:
+            return self.__ready.get(key)
+
+    def first_delay(self, keys):
+        """
+        Return the number of seconds before the earliest of the hubs in
+        'keys' is expected to be ready (zero if any hub is unknown)
+        """
+        delay = None
+        with self.__lock:
+            for key in keys:
+                if key not in self.__ready:
+                    return 0.0
+                if delay is None or self.__ready[key] < delay:
+                    delay = self.__ready[key]
+        if delay is None:
+            return 0.0
+        return delay
+
+    def record(self, key, secs):
+        "Record the number of seconds hub 'key' took to report a good time"
+        with self.__lock:
+            if key not in self.__ready:
+                self.__ready[key] = secs
+            else:
+                self.__ready[key] += (secs - self.__ready[key]) * self.WEIGHT
+
+
 class GoodTimeThread(CnCThread):
     """
     A thread which queries all hubs for either the latest first hit time
@@ -209,6 +268,18 @@ class GoodTimeThread(CnCThread):
     NONZOMBIE_FIELD = "NumberOfNonZombies"
     # maximum number of attempts to get the time from all hubs
     MAX_ATTEMPTS = 5
+    # maximum number of seconds to wait for each round of queries
+    QUERY_SECS = 2.0
+
+    # delay before the second attempt, doubled after each later attempt
+    BACKOFF_INITIAL_SECS = 0.1
+    # longest delay between attempts
+    BACKOFF_MAX_SECS = 2.0
+    # fraction of a hub's usual readiness time to wait before the first query
+    HISTORY_FRACTION = 0.75
+
+    # per-hub readiness times from earlier runs
+    HISTORY = GoodTimeHistory()
 
     def __init__(self, src_set, other_set, runset, data, log, quick_set=False,
                  thread_name=None):
@@ -236,10 +307,17 @@ class GoodTimeThread(CnCThread):
         self.__good_time = None
         self.__final_time = None
 
+        self.__start_time = None
+        self.__num_queries = 0
+
         self.__stopped = False
+        self.__stop_event = threading.Event()
 
         super(GoodTimeThread, self).__init__(thread_name, log)
 
+    def __history_key(self, comp):
+        return (self.moniname, comp.fullname)
+
     def __fetch_time(self):
         """
         Query all hubs which haven't yet reported a time
@@ -249,6 +327,7 @@ class GoodTimeThread(CnCThread):
             if comp not in self.__time_dict:
                 args = (self.NONZOMBIE_FIELD, self.beanfield())
                 tgroup.run_thread(comp, args, logger=self.__log)
+                self.__num_queries += 1
 
         if self.wait_for_all():
             # if we don't need results as soon as possible,
@@ -256,82 +335,69 @@ class GoodTimeThread(CnCThread):
             tgroup.wait()
             tgroup.report_errors(self.__log, "getGoodTimes")
 
+        # wait for up to QUERY_SECS for the remaining results
+        end_time = time.time() + self.QUERY_SECS
+        for thrd in tgroup.threads:
+            remaining = end_time - time.time()
+            if remaining <= 0 or self.__stopped:
+                break
+            thrd.join(remaining)
+
         complete = True
         updated = False
+        hanging = []
 
-        # wait for up to two seconds for a result
-        sleep_secs = 0.1
-        sleep_reps = 20
-
-        for _ in range(sleep_reps):
-            hanging = None
-            complete = True
-
-            for thrd, result in list(tgroup.results().items()):
-                # start with no hanging components
-                hanging = None
-
-                if self.__stopped:
-                    # run has been stopped, don't bother checking anymore
-                    break
-
-                comp = thrd.component
-                if comp in self.__time_dict:
-                    # already have a time for this hub
-                    continue
-
-                if result is None or \
-                   result == ComponentGroup.RESULT_HANGING:
-                    # still waiting for results
-                    complete = False
-                    if hanging is None:
-                        hanging = []
-                    hanging.append(comp)
-                    continue
-
-                if not ComponentGroup.has_value(result):
-                    # component operation failed
-                    self.__bad_comps[comp] = 1
-                    continue
+        for thrd, result in list(tgroup.results().items()):
+            if self.__stopped:
+                # run has been stopped, don't bother checking anymore
+                break
 
-                if not isinstance(result, dict):
-                    self.__log.error("Expected dictionary, not %s for %s"
-                                     " (result=%s)" %
-                                     (type(result), result, comp.fullname))
-                    continue
+            comp = thrd.component
+            if comp in self.__time_dict:
+                # already have a time for this hub
+                continue
 
-                if comp in self.__bad_comps:
-                    # got a result from a component which previously failed
-                    del self.__bad_comps[comp]
+            if result is None or \
+               result == ComponentGroup.RESULT_HANGING:
+                # still waiting for results
+                complete = False
+                hanging.append(comp)
+                continue
 
-                if self.beanfield() in result:
-                    val = result[self.beanfield()]
-                else:
-                    val = None
-                if val is None or val <= 0:
-                    # No results yet, need to poll again
-                    complete = False
-                    continue
+            if not ComponentGroup.has_value(result):
+                # component operation failed
+                self.__bad_comps[comp] = 1
+                continue
 
-                self.__time_dict[comp] = val
-                if self.__good_time is None or \
-                   self.is_better(self.__good_time, val):
-                    # got new good time, tell the builders
-                    self.__good_time = val
-                    updated = True
+            if not isinstance(result, dict):
+                self.__log.error("Expected dictionary, not %s for %s"
+                                 " (result=%s)" %
+                                 (type(result), result, comp.fullname))
+                continue
 
-            if complete:
-                # quit if we've got all the results
-                break
+            if comp in self.__bad_comps:
+                # got a result from a component which previously failed
+                del self.__bad_comps[comp]
 
-            if hanging is None and not self.wait_for_all():
-                # quit if all threads are done or if we don't need to wait
-                break
+            if self.beanfield() in result:
+                val = result[self.beanfield()]
+            else:
+                val = None
+            if val is None or val <= 0:
+                # No results yet, need to poll again
+                complete = False
+                continue
 
-            # wait a bit more for the threads to finish
-            time.sleep(sleep_secs)
+            self.__time_dict[comp] = val
+            self.HISTORY.record(self.__history_key(comp),
+                                time.time() - self.__start_time)
+            if self.__good_time is None or \
+               self.is_better(self.__good_time, val):
+                # got new good time, tell the builders
+                self.__good_time = val
+                updated = True
 
-        if hanging is not None:
+        if len(hanging) > 0:  # pylint: disable=len-as-condition
             hang_str = ComponentManager.format_component_list(hanging)
             self.__log.error("%s found %d hanging component%s: %s" %
                              (self.moniname, len(hanging),
@@ -348,26 +414,35 @@ class GoodTimeThread(CnCThread):
 
         return complete
 
+    def __initial_delay(self):
+        """
+        Return the number of seconds to wait before the first query, based
+        on how long these hubs took to report a time in earlier runs
+        """
+        if self.__quick_set:
+            return 0.0
+
+        keys = [self.__history_key(comp) for comp in self.__src_set]
+        return self.HISTORY.first_delay(keys) * self.HISTORY_FRACTION
+
     def _run(self):
         "Gather good hit time data from all hubs"
+        self.__start_time = time.time()
         try:
-            complete = False
-            for num in range(self.MAX_ATTEMPTS):
+            delay = self.__initial_delay()
+            if delay > 0:
+                self.__stop_event.wait(delay)
+
+            backoff = self.BACKOFF_INITIAL_SECS
+            for _ in range(self.MAX_ATTEMPTS):
                 complete = self.__fetch_time()
-                loud = False
                 if complete or self.__stopped:
-                    if loud:
-                        if complete:
-                            status = "complete"
-                        elif self.__stopped:
-                            status = "stopped"
-                        else:
-                            status = "unknown"
-                        self.__log.error("GetGoodTime %s after %d attempts" %
-                                         (status, num))
                     # we're done, break out of the loop
                     break
-                time.sleep(0.1)
+
+                # back off, with jitter so hubs aren't queried in lockstep
+                self.__stop_event.wait(random.uniform(backoff / 2, backoff))
+                backoff = min(backoff * 2, self.BACKOFF_MAX_SECS)
         except:  # pylint: disable=bare-except
             self.__log.error("Couldn't find %s: %s" %
                              (self.moniname, exc_string()))
@@ -411,8 +486,14 @@ class GoodTimeThread(CnCThread):
         "Notify the builder of the good time"
         raise NotImplementedError("Unimplemented")
 
+    @property
+    def num_queries(self):
+        "Number of getGoodTimes requests sent to hubs"
+        return self.__num_queries
+
     def stop(self):
         self.__stopped = True
+        self.__stop_event.set()
 
     def time(self):
         "Return the time marking the start or end of good data taking"
@@ -535,6 +616,66 @@ class RateEntry(Comparable):
         return self.__ticks
 
 
+class RateTracker(object):
+    """
+    Keep the most recent (ticks, cumulative count) entries for a stream in
+    a ring buffer, along with the oldest entry needed for each rate window,
+    so adding an entry and fetching a rate are both (amortized) O(1)
+    """
+
+    def __init__(self, windows, max_entries):
+        self.__entries = collections.deque(maxlen=max_entries)
+        # total number of entries ever added
+        self.__num_added = 0
+        # absolute index of the entry at the start of each window
+        self.__starts = dict((window, 0) for window in windows)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __str__(self):
+        return "RateTracker*%d" % (len(self.__entries), )
+
+    def add(self, ticks, count):
+        "Add the cumulative count at time 'ticks'"
+        self.__entries.append(RateEntry(ticks, count))
+        self.__num_added += 1
+
+        first = self.__num_added - len(self.__entries)
+        last = self.__num_added - 1
+        for window, start in self.__starts.items():
+            # each window starts at the newest entry which is more than
+            # 'window' ticks older than the latest entry
+            start = max(start, first)
+            while start + 1 < last and \
+              ticks - self.__entries[start + 1 - first].ticks > window:
+                start += 1
+            self.__starts[window] = start
+
+    @property
+    def entries(self):
+        return list(self.__entries)
+
+    def rate(self, window):
+        "Return the rate (per second) over the latest 'window' ticks"
+        if len(self.__entries) < 2:
+            return 0.0
+
+        first = self.__num_added - len(self.__entries)
+        bin_start = self.__entries[max(self.__starts[window], first) - first]
+        bin_end = self.__entries[-1]
+
+        tick_seconds = bin_end.diff_ticks(bin_start) / 1E10
+        if tick_seconds == 0.0:
+            return 0.0
+
+        return bin_end.diff_count(bin_start) / tick_seconds
+
+    @property
+    def windows(self):
+        return sorted(self.__starts.keys())
+
+
 class StreamData(object):
     def __init__(self, count, ticks):
         self.__count = count
@@ -556,12 +697,171 @@ class StreamData(object):
         self.__ticks = ticks
 
 
+class ConnectionMapCache(object):
+    """
+    Remember the connection map and start order computed for each detector
+    configuration so runsets built from the same components can skip
+    recomputing them.  Entries are keyed by the run configuration name plus
+    every component's name, number and connectors, and are checked
+    against the new runset's components before they're reused.
+    """
+
+    # maximum number of configurations to remember
+    MAX_ENTRIES = 8
+
+    # cached singleton instance
+    __INSTANCE = None
+    __INSTANCE_LOCK = threading.Lock()
+
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = self.MAX_ENTRIES
+
+        self.__max_entries = max_entries
+
+        # key -> [connection list for each component, order dictionary]
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.__hits = 0
+        self.__misses = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __str__(self):
+        return "ConnectionMapCache*%d[hits %d, misses %d]" % \
+            (len(self.__entries), self.__hits, self.__misses)
+
+    def __get_entry(self, key):
+        "This method assumes that self.__lock has already been acquired"
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            self.__misses += 1
+            return None
+
+        # move this entry to the end so it's the last to be discarded
+        self.__entries[key] = entry
+        self.__hits += 1
+        return entry
+
+    def clear(self):
+        "Forget all cached configurations"
+        with self.__lock:
+            self.__entries.clear()
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @classmethod
+    def instance(cls):
+        "Return the process-wide cache"
+        with cls.__INSTANCE_LOCK:
+            if cls.__INSTANCE is None:
+                cls.__INSTANCE = ConnectionMapCache()
+            return cls.__INSTANCE
+
+    @classmethod
+    def make_key(cls, config_name, comps):
+        "Build the cache key for a run configuration and its components"
+        # hosts and ports aren't needed since rebuilt maps use the current
+        # components' connectors
+        entries = []
+        for comp in comps:
+            conns = [(conn.name, conn.is_input, conn.is_optional)
+                     for conn in comp.connectors()]
+            entries.append((comp.name, comp.num, comp.is_source,
+                            tuple(sorted(conns))))
+        return (config_name, tuple(sorted(entries)))
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    def get_map(self, key, comps):
+        """
+        Return a connection map for 'comps' built from the cached entry, or
+        None if there is no (valid) entry for 'key'
+        """
+        with self.__lock:
+            entry = self.__get_entry(key)
+        if entry is None:
+            return None
+
+        comp_dict = {}
+        for comp in comps:
+            inputs = dict((conn.name, conn) for conn in comp.connectors()
+                          if conn.is_input)
+            comp_dict[(comp.name, comp.num)] = (comp, inputs)
+
+        conn_map = {}
+        for comp_key, targets in entry[0].items():
+            try:
+                comp = comp_dict[comp_key][0]
+                conn_map[comp] = [Connection(comp_dict[tkey][1][name],
+                                             comp_dict[tkey][0])
+                                  for name, tkey in targets]
+            except KeyError:
+                # cached entry doesn't match these components
+                with self.__lock:
+                    self.__entries.pop(key, None)
+                return None
+
+        return conn_map
+
+    def put_map(self, key, conn_map):
+        "Remember the connection map for 'key'"
+        targets = {}
+        for comp, conn_list in conn_map.items():
+            targets[(comp.name, comp.num)] = \
+                [(conn.conn.name, (conn.comp.name, conn.comp.num))
+                 for conn in conn_list]
+
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = [targets, None]
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+    def apply_order(self, key, comps):
+        """
+        Set the start order of 'comps' from the cached entry and return
+        True, or return False if no order has been cached
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            order = None if entry is None else entry[1]
+        if order is None:
+            return False
+
+        for comp in comps:
+            if (comp.name, comp.num) not in order:
+                return False
+
+        for comp in comps:
+            comp.order = order[(comp.name, comp.num)]
+        return True
+
+    def put_order(self, key, comps):
+        "Remember the start order of 'comps' for 'key'"
+        order = dict(((comp.name, comp.num), comp.order) for comp in comps)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                entry[1] = order
+
+
 class RunData(object):
     # True if we've printed a warning about the failed IceCube Live code import
     LIVE_WARNING = False
     # rate interval (in 0.1ns)
     RATE_INTERVAL = 300 * 10000000000
-    # maximum number of physics count entries
+    # additional rate windows (10 seconds, 1 minute, 10 minutes)
+    RATE_WINDOWS = (10 * 10000000000, 60 * 10000000000, 600 * 10000000000)
+    # streams whose rates are tracked
+    RATE_STREAMS = ("physics", "moni", "sn", "tcal")
+    # maximum number of count entries for each stream
     MAX_PHYSICS_ENTRIES = 1000
 
     # NOTE: These values must match the Java IComponent.DOMMODE_* values
@@ -639,8 +939,11 @@ class RunData(object):
         # track number of monitoring messages
         self.__num_event_count_messages = 0
 
-        # Calculates rate over latest 5min interval
-        self.__physics_entries = []
+        # calculate rates over the latest 5min interval and other windows
+        windows = (self.RATE_INTERVAL, ) + self.RATE_WINDOWS
+        self.__rates = dict((stream,
+                             RateTracker(windows, self.MAX_PHYSICS_ENTRIES))
+                            for stream in self.RATE_STREAMS)
 
         # cache monitoring data for 'event_count_update'
         self.__stream_data = {}
@@ -650,15 +953,12 @@ class RunData(object):
             (self.__run_number, self.__num_evts, self.__num_moni,
              self.__num_sn, self.__num_tcal)
 
-    def __add_rate(self, pay_time, num_evts):
-        while len(self.__physics_entries) >= self.MAX_PHYSICS_ENTRIES:
-            self.__physics_entries.pop(0)
-
-        self.__physics_entries.append(RateEntry(pay_time, num_evts))
+    def __add_rate(self, pay_time, num_evts, stream="physics"):
+        self.__rates[stream].add(pay_time, num_evts)
 
     @property
     def _physics_entries(self):
-        return self.__physics_entries[:]
+        return self.__rates["physics"].entries
 
     @property
     def cached_monitor_data(self):
@@ -777,7 +1077,7 @@ class RunData(object):
     def first_physics_time(self, paytime):
         if self.__first_pay_time is None:
             self.__first_pay_time = paytime
-        no_physics = len(self.__physics_entries) == 0
+        no_physics = len(self.__rates["physics"]) == 0
         if no_physics:
             self.__add_rate(self.__first_pay_time, 1)
 
@@ -866,28 +1166,16 @@ class RunData(object):
         """
         Get latest physics rate value.
         """
-        # Find the first and last times for the current bin
-        # This is a bit crude but we don't need to worry about performance
-        # for the target application (pDAQ rate calculation)
-        bin_end = None
-        bin_start = None
-        for entry in reversed(self.__physics_entries):
-            if bin_end is None:
-                bin_end = entry
-            else:
-                bin_start = entry
-                if bin_end.diff_ticks(entry) > self.RATE_INTERVAL:
-                    break
-
-        if bin_end is None or bin_start is None:
-            return 0.0
+        return self.__rates["physics"].rate(self.RATE_INTERVAL)
 
-        tick_seconds = bin_end.diff_ticks(bin_start) / 1E10
-        if tick_seconds == 0.0:
-            return 0.0
-
-        num_evts_in_bin = bin_end.diff_count(bin_start)
-        return num_evts_in_bin / tick_seconds
+    def stream_rates(self, stream):
+        """
+        Return a dictionary mapping each rate window (in seconds) to the
+        latest rate for 'stream' ("physics", "moni", "sn" or "tcal")
+        """
+        tracker = self.__rates[stream]
+        return dict((window // 10000000000, tracker.rate(window))
+                    for window in tracker.windows)
 
     @property
     def release(self):
@@ -1259,6 +1547,13 @@ class RunData(object):
 
             if add_rate:
                 self.__add_rate(self.__evt_pay_time, self.__num_evts)
+                for stream, count, ticks in \
+                  (("moni", moni_count, moni_time),
+                   ("sn", sn_count, sn_time),
+                   ("tcal", tcal_count, tcal_time)):
+                    if count is not None and ticks is not None and \
+                      ticks > 0:
+                        self.__add_rate(ticks, count, stream=stream)
 
         return (self.__num_evts, self.__wall_time, self.__first_pay_time,
                 self.__evt_pay_time, self.__num_moni, self.__moni_time,
@@ -1316,6 +1611,19 @@ class RunSet(object):
     #
     TIMEOUT_SECS = RPCClient.TIMEOUT_SECS - 5
 
+    # number of seconds between 'getState' polls while waiting for
+    # components which don't push their state changes to CnCServer
+    #
+    STATE_POLL_SECS = 1.0
+    # fallback polling interval for components which push their states
+    #
+    PUSHED_STATE_POLL_SECS = 5.0
+
+    # number of seconds to wait for room in CnCServer's finalize queue
+    # before queueing a run's files from a local thread
+    #
+    FINALIZE_QUEUE_SECS = 30.0
+
     STATE_DEAD = DAQClientState.DEAD
     STATE_ERROR = DAQClientState.ERROR
     STATE_HANGING = DAQClientState.HANGING
@@ -1361,6 +1669,16 @@ class RunSet(object):
 
         self.__final_thread = None
 
+        # cache key and connection map from the last build_connection_map()
+        self.__cached_conn_map = None
+
+        # timeline of the current run's transitions
+        self.__timeline = None
+
+        # finishes switched-out runs in the background
+        self.__finalizer = RunFinalizer(logger, name="RunFinalizer#%d" %
+                                        (self.__id, ))
+
         # make sure components are in a known order
         self.__set.sort()
 
@@ -1444,6 +1762,14 @@ class RunSet(object):
             badlist.append("%s[%s]" % (state, cstr))
         return ", ".join(badlist)
 
+    @classmethod
+    def __begin_timeline(cls, run_num):
+        "Return the caller's timeline, or a new one for run 'run_num'"
+        timeline = RunTimeline.active()
+        if timeline is None:
+            timeline = RunTimeline("run %d" % (run_num, ))
+        return timeline
+
     def __build_start_sets(self):
         """
         Return several lists of components.  The first list contains all the
@@ -1646,7 +1972,13 @@ class RunSet(object):
 
         return cs_str
 
+    @timed_step("finishStop", "runset")
     def __finish_stop(self, run_data, caller_name, had_error=False):
+        # let any switched-out runs finish before this one
+        if not self.__finalizer.wait(self.TIMEOUT_SECS):
+            self.__logger.error("%s: still finishing %d previous run(s)" %
+                                (self, self.__finalizer.num_pending))
+
         # try to finish end-of-run reporting and move catchall.log to run dir
         if run_data is not None:
             try:
@@ -1677,11 +2009,14 @@ class RunSet(object):
             sent_error = "No run data"
         else:
             try:
-                run_data.send_event_counts(self)
+                with timeline_span("sendEventCounts", "runset"):
+                    run_data.send_event_counts(self)
             except:  # pylint: disable=bare-except
                 if sent_error is None:
                     sent_error = exc_string()
 
+            self.__write_timeline(self.__timeline, run_data)
+
             # NOTE: ALL FILES MUST BE WRITTEN OUT BEFORE THIS POINT
             # THIS IS WHERE EVERYTHING IS PUT IN A TARBALL FOR JADE
             # AND THE RUN DATA OBJECT IS DESTROYED
@@ -1695,6 +2030,40 @@ class RunSet(object):
             self.__logger.error("Could not send event counts for %s (%s): %s" %
                                 (self, caller_name, sent_error))
 
+    def __finish_switched_run(self, run_data, timeline):
+        "Finish off a run which has been switched out"
+        with RunTimeline.activated(timeline):
+            try:
+                self.final_report(self.__set, run_data, had_error=False,
+                                  switching=True)
+            except:  # pylint: disable=bare-except
+                self.__logger.error("Could not finish run %s for %s: %s" %
+                                    (run_data.run_number, self,
+                                     exc_string()))
+
+            # move catchall.log once the final report has been logged to it
+            try:
+                self.__parent.save_catchall(run_data.run_directory)
+            except:  # pylint: disable=bare-except
+                self.__logger.error("Could not save run %s catchall.log for"
+                                    " %s: %s" % (run_data.run_number, self,
+                                                 exc_string()))
+
+            try:
+                with timeline_span("sendEventCounts", "runset"):
+                    run_data.send_event_counts(self)
+            except:  # pylint: disable=bare-except
+                self.__logger.error("Could not send run %s event counts for"
+                                    " %s: %s" % (run_data.run_number, self,
+                                                 exc_string()))
+
+            self.__write_timeline(timeline, run_data)
+
+            # NOTE: ALL FILES MUST BE WRITTEN OUT BEFORE THIS POINT
+            # THIS IS WHERE EVERYTHING IS PUT IN A TARBALL FOR JADE
+            # AND THE RUN DATA OBJECT IS DESTROYED
+            self.__queue_data_and_destroy(run_data)
+
     def __get_replay_hubs(self):
         "Return the list of replay hubs in this runset"
         replay_hubs = []
@@ -1847,15 +2216,30 @@ class RunSet(object):
                 self.__logger.error("%s :: %s: %s" %
                                     (text, comp.fullname, connstr))
 
+    @timed_step("queueForSpade", "runset")
     def __queue_data_and_destroy(self, run_data):
         if run_data.log_directory is None:
             run_data.error("Not logging to file so cannot queue to JADE")
             return
 
-        if run_data.spade_directory is not None:
+        if run_data.spade_directory is None:
             run_data.error("Cannot queue to unknown JADE directory")
             return
 
+        fin_queue = self.__parent.finalize_queue
+        if fin_queue is not None:
+            try:
+                fin_queue.submit(run_data.run_number,
+                                 run_data.spade_directory,
+                                 run_data.copy_directory,
+                                 run_data.log_directory,
+                                 timeout=self.FINALIZE_QUEUE_SECS)
+            except FinalizeQueueFullException as fqe:
+                run_data.error("%s; queueing in the background" % (fqe, ))
+            else:
+                run_data.destroy()
+                return
+
         if self.__final_thread is not None:
             # attempt to clean up the previous final thread
             if self.__final_thread.is_alive():
@@ -1898,16 +2282,17 @@ class RunSet(object):
         moni_client.sendMoni("runstart", data, prio=Prio.SCP,
                              time=start_time)
 
+    @timed_step("resetLogging", "runset")
     def __reset_logging(self):
         "Reset logging for all components in the runset"
         ComponentGroup.run_simple(OpResetLogging, self.__set, (),
                                   self.__logger, report_errors=False)
 
-    def __start_components(self, quiet):
+    @timed_step("startLogging", "runset")
+    def __start_component_logging(self, quiet):
+        "Create new log servers and point all components at them"
         log_host = ip.get_local_address()
 
-        old_servers = self.__comp_log.copy()
-
         tgroup = ComponentGroup(OpConfigureLogging)
         for comp in self.__set:
             new_log \
@@ -1924,6 +2309,11 @@ class RunSet(object):
         tgroup.wait()
         tgroup.report_errors(self.__run_data, "startLogging")
 
+    def __start_components(self, quiet):
+        old_servers = self.__comp_log.copy()
+
+        self.__start_component_logging(quiet)
+
         self.__stop_log_servers(old_servers)
 
         src_set, middle_set, bldr_set = self.__build_start_sets()
@@ -1939,11 +2329,13 @@ class RunSet(object):
 
         # start non-sources
         #
-        self.__start_set("NonHubs", other_set)
+        with timeline_span("startNonHubs", "runset"):
+            self.__start_set("NonHubs", other_set)
 
         # start sources
         #
-        self.__start_set("Hubs", src_set)
+        with timeline_span("startHubs", "runset"):
+            self.__start_set("Hubs", src_set)
 
         # start thread to find latest first time from hubs
         #
@@ -1953,10 +2345,8 @@ class RunSet(object):
 
         # wait up to 30 seconds for the thread to finish
         #
-        for _ in range(300):
-            if good_thread.finished:
-                break
-            time.sleep(0.1)
+        with timeline_span("firstGoodTime", "runset"):
+            good_thread.join(30)
 
         if not good_thread.finished:
             raise RunSetException("Could not get runset#%s latest first time" %
@@ -2043,6 +2433,7 @@ class RunSet(object):
 
         return changed
 
+    @timed_step("stopLogServers", "runset")
     def __stop_log_servers(self, servers):
         """
         Stop all log servers
@@ -2057,6 +2448,7 @@ class RunSet(object):
         ComponentGroup.run_simple(OpStopLocalLogger, loglist, servers,
                                   self.__logger, report_errors=True)
 
+    @timed_step("stopComponents", "runset")
     def __stop_run_internal(self, run_data, timeout=20):
         """
         Stop all components in the runset
@@ -2164,6 +2556,26 @@ class RunSet(object):
             doms.append(args)
         return (doms, not_found)
 
+    @classmethod
+    def __poll_interval(cls, board, comp):
+        "Return the number of seconds between 'getState' polls of 'comp'"
+        if board.has_pushed(comp.name, comp.num):
+            return cls.PUSHED_STATE_POLL_SECS
+        return cls.STATE_POLL_SECS
+
+    def __write_timeline(self, timeline, run_data):
+        "Save the run's timeline in its run directory"
+        run_dir = run_data.run_directory
+        if timeline is None or run_dir is None or not os.path.isdir(run_dir):
+            return
+
+        try:
+            timeline.write(run_dir)
+        except:  # pylint: disable=bare-except
+            self.__logger.error("Cannot write %s timeline: %s" %
+                                (run_data, exc_string()))
+
+    @timed_step("waitForState", "runset")
     def __wait_for_state_change(self, logger, valid_states,
                                 timeout_secs=TIMEOUT_SECS, components=None):
         """
@@ -2180,16 +2592,47 @@ class RunSet(object):
         else:
             waitlist = components[:]
 
+        # states pushed after this point are newer than any 'getState' reply
+        board = ComponentStateBoard.instance()
+        start_seq = board.sequence
+        last_poll = {}
+
         start_secs = time.time()
         end_secs = start_secs + timeout_secs
         while time.time() < end_secs and \
            len(waitlist) > 0:  # pylint: disable=len-as-condition
             new_list = waitlist[:]
-            states = ComponentGroup.run_simple(OpGetState, waitlist, (),
-                                               self.__logger)
+            seq = board.sequence
+            now = time.time()
+
+            # use pushed states where they settle things, and only poll
+            # the remaining components once their polling interval is up
+            pushed = {}
+            poll_list = []
+            for comp in waitlist:
+                state_str = board.get(comp.name, comp.num, since=start_seq)
+                if state_str is not None and \
+                  (state_str in valid_states or state_str.upper() == "ERROR"):
+                    pushed[comp] = state_str
+                elif comp not in last_poll or \
+                  now - last_poll[comp] >= self.__poll_interval(board, comp):
+                    poll_list.append(comp)
+
+            if len(poll_list) > 0:  # pylint: disable=len-as-condition
+                states = ComponentGroup.run_simple(OpGetState, poll_list, (),
+                                                   self.__logger)
+                for comp in poll_list:
+                    last_poll[comp] = now
+            else:
+                states = {}
+
             found_error = False
             for comp in waitlist:
-                if comp not in states:
+                if comp in pushed:
+                    state_str = pushed[comp]
+                elif comp not in poll_list:
+                    continue
+                elif comp not in states:
                     state_str = self.STATE_DEAD
                 else:
                     result = states[comp]
@@ -2213,8 +2656,14 @@ class RunSet(object):
                 break
 
             if len(waitlist) == len(new_list):
-                # if no components changed state, wait a bit and check again
-                time.sleep(1)
+                # if no components changed state, wait for a pushed update
+                # or until the next component is due to be polled
+                next_poll = min(last_poll.get(comp, now) +
+                                self.__poll_interval(board, comp)
+                                for comp in waitlist)
+                wait_secs = min(next_poll, end_secs) - time.time()
+                if wait_secs > 0:
+                    board.wait(seq, wait_secs)
             else:
                 # something changed, print a new 'Waiting' message
                 waitlist = new_list
@@ -2242,6 +2691,20 @@ class RunSet(object):
 
     def build_connection_map(self):
         "Validate and fill the map of connections for each component"
+        cache = ConnectionMapCache.instance()
+        cfg_name = None if self.__cfg is None else self.__cfg.basename
+        key = cache.make_key(cfg_name, self.__set)
+
+        conn_map = cache.get_map(key, self.__set)
+        if conn_map is None:
+            conn_map = self.__build_connection_map()
+            cache.put_map(key, conn_map)
+
+        # set_order() can only use the cache with this map
+        self.__cached_conn_map = (key, conn_map)
+        return conn_map
+
+    def __build_connection_map(self):
         conn_dict = {}
 
         for comp in self.__set:
@@ -2291,6 +2754,7 @@ class RunSet(object):
     def config_name(self):
         return self.__cfg.basename
 
+    @timed_step("configure", "runset")
     def configure(self):
         "Configure all components in the runset"
         self.__state = RunSetState.CONFIGURING
@@ -2318,6 +2782,7 @@ class RunSet(object):
     def configured(self):
         return self.__configured
 
+    @timed_step("connect", "runset")
     def connect(self, conn_map):
         self.__state = RunSetState.CONNECTING
 
@@ -2347,10 +2812,11 @@ class RunSet(object):
                                   run_dir)
 
         log_name = os.path.join(run_dir, "%s-%d.log" % (comp.name, comp.num))
-        sock = LogSocketServer(port, comp.fullname, log_name, quiet=quiet)
+        sock = LogSocketServer(port, comp.fullname, log_name, quiet=quiet,
+                               hub=LogSocketHub.instance())
         sock.start_serving()
 
-        # wait for the server thread to start
+        # wait for the server to start (hub-based servers start immediately)
         reps = 100
         for _ in range(reps):
             if sock.is_serving:
@@ -2398,7 +2864,16 @@ class RunSet(object):
     @classmethod
     def cycle_components(cls, comp_list, config_dir, daq_data_dir, logger,
                          verbose=False, kill_with_9=False, event_check=False,
-                         check_exists=True):
+                         check_exists=True, registered=None,
+                         max_parallel=None):
+        """
+        Kill and relaunch the listed components, restarting each host
+        separately (and up to 'max_parallel' hosts at once).  If
+        'registered' is a function returning the names of all registered
+        components, the restart runs in the background, waiting for the
+        components to reregister (and relaunching them if they don't), so
+        the caller isn't held up; make_runset() already waits for them.
+        """
 
         # sort list into a predictable order for unit tests
         #
@@ -2406,20 +2881,46 @@ class RunSet(object):
                      (ComponentManager.format_component_list(comp_list), ))
 
         dry_run = False
-        ComponentManager.kill_components(comp_list, dry_run=dry_run,
-                                         verbose=verbose,
-                                         kill_with_9=kill_with_9)
-        ComponentManager.start_components(comp_list, dry_run, verbose,
-                                          config_dir, daq_data_dir,
-                                          logger.log_port, logger.live_port,
-                                          event_check=event_check,
-                                          check_exists=check_exists)
+
+        def kill(comps):
+            ComponentManager.kill_components(comps, dry_run=dry_run,
+                                             verbose=verbose,
+                                             kill_with_9=kill_with_9,
+                                             logger=logger)
+
+        def launch(comps):
+            ComponentManager.start_components(comps, dry_run, verbose,
+                                              config_dir, daq_data_dir,
+                                              logger.log_port,
+                                              logger.live_port,
+                                              event_check=event_check,
+                                              check_exists=check_exists,
+                                              logger=logger)
+
+        orchestrator = RestartOrchestrator(kill, launch,
+                                           registered_func=registered,
+                                           logger=logger,
+                                           max_parallel=max_parallel)
+
+        def report_restart(report):
+            failed = report.failed
+            if len(failed) > 0:  # pylint: disable=len-as-condition
+                cstr = ComponentManager.format_component_list(failed)
+                logger.error("Could not restart %s" % (cstr, ))
+            logger.info(str(report))
+
+        if registered is None:
+            report_restart(orchestrator.restart(comp_list))
+        else:
+            orchestrator.start(comp_list, callback=report_restart)
 
     def destroy(self, ignore_components=False):
         if not ignore_components and \
           len(self.__set) > 0:  # pylint: disable=len-as-condition
             raise RunSetException('RunSet #%s is not empty' % self.__id)
 
+        self.__finalizer.stop()
+
         if self.__run_data is not None:
             self.__run_data.destroy()
 
@@ -2429,6 +2930,7 @@ class RunSet(object):
         self.__run_data = None
 
     @classmethod
+    @timed_step("finalReport", "runset")
     def final_report(cls, comps, run_data, had_error=False, switching=False):
         """
         Gather end-of-run statistics and send them to various places
@@ -2526,6 +3028,7 @@ class RunSet(object):
 
         return duration
 
+    @timed_step("finishSetup", "runset")
     def finish_setup(self, run_data, start_time):
         """
         Tell Live that we're starting a new run, launch run-related threads
@@ -2777,7 +3280,9 @@ class RunSet(object):
 
         self.cycle_components(clu_cfg_list, config_dir, daq_data_dir,
                               self.__logger, verbose=verbose,
-                              kill_with_9=kill_with_9, event_check=event_check)
+                              kill_with_9=kill_with_9, event_check=event_check,
+                              registered=self.__parent.registered_names,
+                              max_parallel=self.__parent.restart_parallel)
 
     def return_components(self, pool, cluster_config, config_dir, daq_data_dir,
                           verbose=False, kill_with_9=False, event_check=False):
@@ -2824,7 +3329,25 @@ class RunSet(object):
 
     def set_order(self, conn_map, logger):
         "Set the order in which components are started/stopped"
+        cache = ConnectionMapCache.instance()
+        if self.__cached_conn_map is None or \
+          self.__cached_conn_map[1] is not conn_map:
+            key = None
+        else:
+            key = self.__cached_conn_map[0]
+            if cache.apply_order(key, self.__set):
+                return
+
+        if self.__compute_order(conn_map, logger) and key is not None:
+            cache.put_order(key, self.__set)
+
+    def __compute_order(self, conn_map, logger):
+        """
+        Set the component order and return True if nothing unusual was
+        logged along the way
+        """
         # pylint: disable=len-as-condition
+        clean = True
 
         # build initial lists of source components
         #
@@ -2835,6 +3358,7 @@ class RunSet(object):
             #
             if comp in all_comps:
                 logger.error('Found multiple instances of %s' % (comp, ))
+                clean = False
                 continue
 
             # clear order
@@ -2874,6 +3398,7 @@ class RunSet(object):
                     if comp.is_source:
                         logger.warn('No connection map entry for %s' %
                                     (comp, ))
+                        clean = False
                 else:
                     for conn in conn_map[comp]:
                         # XXX hack -- ignore source->builder links
@@ -2900,6 +3425,8 @@ class RunSet(object):
             if fail_str:
                 raise RunSetException(fail_str)
 
+        return clean
+
     def set_run_error(self, caller_name):
         """
         Used by WatchdogTask (via TaskManager) to stop the current run
@@ -2925,17 +3452,22 @@ class RunSet(object):
             raise RunSetException("Cannot start runset from state \"%s\"" %
                                   self.__state)
 
-        self.__run_data = self.create_run_data(run_num, cluster_config,
-                                               run_options, version_info,
-                                               jade_dir, copy_dir, log_dir)
+        self.__timeline = self.__begin_timeline(run_num)
 
-        # record the earliest possible start time
-        #
-        start_time = datetime.datetime.now()
+        with RunTimeline.activated(self.__timeline):
+            self.__run_data = self.create_run_data(run_num, cluster_config,
+                                                   run_options, version_info,
+                                                   jade_dir, copy_dir, log_dir)
 
-        self.__run_data.connect_to_live()
-        self.__start_components(quiet)
-        self.finish_setup(self.__run_data, start_time)
+            # record the earliest possible start time
+            #
+            start_time = datetime.datetime.now()
+
+            with timeline_span("connectToLive", "runset"):
+                self.__run_data.connect_to_live()
+            with timeline_span("startComponents", "runset"):
+                self.__start_components(quiet)
+            self.finish_setup(self.__run_data, start_time)
 
     @property
     def state(self):
@@ -2984,29 +3516,32 @@ class RunSet(object):
 
             self.__stopping = caller_name
 
-        try:
-            waitlist = self.__stop_run_internal(run_data, timeout=timeout)
-        except:
-            waitlist = []
-            had_error = True
-            self.__logger.error("Could not stop run for %s (%s): %s" %
-                                (self, caller_name, exc_string()))
-            raise
-        finally:
-            if len(waitlist) > 0:  # pylint: disable=len-as-condition
-                self.__logger.error("Could not stop %d component%s: %s" %
-                                    (len(waitlist),
-                                     "" if len(waitlist) == 1 else "s",
-                                     ", ".join(str(obj) for obj in waitlist)))
-                had_error = True
+        with RunTimeline.activated(self.__timeline):
             try:
-                self.__finish_stop(run_data, caller_name, had_error=had_error)
+                waitlist = self.__stop_run_internal(run_data, timeout=timeout)
+            except:
+                waitlist = []
+                had_error = True
+                self.__logger.error("Could not stop run for %s (%s): %s" %
+                                    (self, caller_name, exc_string()))
+                raise
             finally:
-                with self.__stop_lock:
-                    self.__stopping = None
+                if len(waitlist) > 0:  # pylint: disable=len-as-condition
+                    self.__logger.error("Could not stop %d component%s: %s" %
+                                        (len(waitlist),
+                                         "" if len(waitlist) == 1 else "s",
+                                         ", ".join(str(obj)
+                                                   for obj in waitlist)))
+                    had_error = True
+                try:
+                    self.__finish_stop(run_data, caller_name,
+                                       had_error=had_error)
+                finally:
+                    with self.__stop_lock:
+                        self.__stopping = None
 
-        # throw an exception if any component state is not READY
-        self.__check_stopped_components(waitlist)
+            # throw an exception if any component state is not READY
+            self.__check_stopped_components(waitlist)
 
         return had_error
 
@@ -3112,6 +3647,12 @@ class RunSet(object):
 
     def switch_run(self, new_num):
         "Switch all components in the runset to a new run"
+        timeline = self.__begin_timeline(new_num)
+        with RunTimeline.activated(timeline):
+            self.__switch_run_internal(new_num, timeline)
+
+    def __switch_run_internal(self, new_num, timeline):
+        "Switch to a new run, recording the transition in 'timeline'"
         if self.__run_data is None:
             raise RunSetException("RunSet #%s is not running" % self.__id)
         if self.__state != RunSetState.RUNNING:
@@ -3150,12 +3691,14 @@ class RunSet(object):
         # switch builders first
         #
         for comp in bldr_set:
-            comp.switch_to_new_run(new_data.run_number)
+            with timeline_span("SwitchRun", "component", lane=comp.fullname):
+                comp.switch_to_new_run(new_data.run_number)
 
         # switch non-builders in order
         #
         for comp in middle_set:
-            comp.switch_to_new_run(new_data.run_number)
+            with timeline_span("SwitchRun", "component", lane=comp.fullname):
+                comp.switch_to_new_run(new_data.run_number)
 
         # switch sources in parallel
         #
@@ -3165,22 +3708,23 @@ class RunSet(object):
 
         # wait for builders to finish switching
         #
-        bldr_sleep = 0.5
-        bldr_max_sleep = 30   # wait up to 30 seconds
-        for i in range(int(bldr_max_sleep / bldr_sleep)):
-            for comp in bldr_set:
-                num = comp.get_run_number()
-                if num == new_data.run_number:
-                    bldr_set.remove(comp)
-
-            if len(bldr_set) == 0:  # pylint: disable=len-as-condition
-                break
+        with timeline_span("waitForBuilders", "runset"):
+            bldr_sleep = 0.5
+            bldr_max_sleep = 30   # wait up to 30 seconds
+            for i in range(int(bldr_max_sleep / bldr_sleep)):
+                for comp in bldr_set:
+                    num = comp.get_run_number()
+                    if num == new_data.run_number:
+                        bldr_set.remove(comp)
+
+                if len(bldr_set) == 0:  # pylint: disable=len-as-condition
+                    break
 
-            if i > 0 and i % 10 == 0:
-                self.__run_data.error("Waiting for builders to switch"
-                                      " (after %.1f seconds): %s" %
-                                      ((i * bldr_sleep), bldr_set))
-            time.sleep(bldr_sleep)
+                if i > 0 and i % 10 == 0:
+                    self.__run_data.error("Waiting for builders to switch"
+                                          " (after %.1f seconds): %s" %
+                                          ((i * bldr_sleep), bldr_set))
+                time.sleep(bldr_sleep)
 
         # from this point, cache any failures until the end
         saved_exc = None
@@ -3201,7 +3745,9 @@ class RunSet(object):
         # switch to new run data
         #
         old_data = self.__run_data
+        old_timeline = self.__timeline
         self.__run_data = new_data
+        self.__timeline = timeline
 
         # finish new run data setup
         #
@@ -3211,32 +3757,16 @@ class RunSet(object):
             if saved_exc is None:
                 saved_exc = sys.exc_info()
 
-        try:
-            self.final_report(self.__set, old_data, had_error=False,
-                              switching=True)
-        except:  # pylint: disable=bare-except
-            if not saved_exc:
-                saved_exc = sys.exc_info()
-        finally:
-            self.__parent.save_catchall(old_data.run_directory)
-
-        try:
-            old_data.send_event_counts(self)
-        except:  # pylint: disable=bare-except
-            if not saved_exc:
-                saved_exc = sys.exc_info()
-
-        try:
-            # NOTE: ALL FILES MUST BE WRITTEN OUT BEFORE THIS POINT
-            # THIS IS WHERE EVERYTHING IS PUT IN A TARBALL FOR JADE
-            # AND THE RUN DATA OBJECT IS DESTROYED
-            self.__queue_data_and_destroy(old_data)
-        except:  # pylint: disable=bare-except
-            if not saved_exc:
-                saved_exc = sys.exc_info()
+        # the final report, catchall.log, event counts, run.xml and JADE
+        # queueing for the old run don't affect the new run, so finish them
+        # in the background
+        self.__finalizer.submit("finish run %s" % (old_data.run_number, ),
+                                self.__finish_switched_run, old_data,
+                                old_timeline)
 
         try:
-            new_data.report_first_good_time(self)
+            with timeline_span("firstGoodTime", "runset"):
+                new_data.report_first_good_time(self)
         except:  # pylint: disable=bare-except
             if not saved_exc:
                 saved_exc = sys.exc_info()
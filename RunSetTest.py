@@ -1,14 +1,18 @@
 #!/usr/bin/env python
 
 import numbers
+import threading
+import time
 import unittest
 
 from ComponentManager import ComponentManager
+from ComponentStateBoard import ComponentStateBoard
 from DAQLog import LogSocketServer
 from DAQTime import PayloadTime
 from LiveImports import LIVE_IMPORT, Prio
 from RunOption import RunOption
-from RunSet import ConnectionException, RunData, RunSet, RunSetException
+from RunSet import ConnectionException, ConnectionMapCache, \
+     FirstGoodTimeThread, GoodTimeHistory, RunData, RunSet, RunSetException
 from locate_pdaq import set_pdaq_config_dir
 from scmversion import get_scmversion_str
 
@@ -57,6 +61,17 @@ class MyParent(object):
     def __init__(self):
         pass
 
+    @property
+    def finalize_queue(self):
+        return None
+
+    def registered_names(self):
+        return []
+
+    @property
+    def restart_parallel(self):
+        return None
+
     def save_catchall(self, run_dir):
         pass
 
@@ -237,7 +252,8 @@ class MyRunSet(RunSet):
     @classmethod
     def cycle_components(cls, comp_list, config_dir, daq_data_dir, logger,
                          verbose=False, kill_with_9=False, event_check=False,
-                         check_exists=True):
+                         check_exists=True, registered=None,
+                         max_parallel=None):
         pass
 
     def final_report(self, comps, run_data, had_error=False, switching=False):
@@ -855,6 +871,147 @@ class TestRunSet(unittest.TestCase):
 
         self.__run_tests(comp_list, 2)
 
+    def test_pushed_states(self):
+        comp_list = self.__build_comp_list(("foo", "bar"))
+        for comp in comp_list:
+            comp.configure_wait = 2
+
+        run_config = FakeRunConfig(None, "XXXrunCfgXXX")
+        logger = MockLogger('foo#0')
+
+        runset = MyRunSet(MyParent(), run_config, comp_list, logger,
+                          FakeMoniClient())
+
+        # push "ready" the way a live component would, so the runset
+        # doesn't need to poll while the mock components lag behind
+        board = ComponentStateBoard.instance()
+        stopped = threading.Event()
+
+        def push_ready():
+            while not stopped.is_set():
+                for comp in comp_list:
+                    board.update(comp.name, comp.num, "ready")
+                stopped.wait(0.05)
+
+        thrd = threading.Thread(target=push_ready)
+        thrd.start()
+        try:
+            start = time.time()
+            runset.configure()
+            elapsed = time.time() - start
+        finally:
+            stopped.set()
+            thrd.join()
+            for comp in comp_list:
+                board.forget(comp.name, comp.num)
+
+        self.assertTrue(elapsed < 1.0, "Configuration took %.2f seconds" %
+                        (elapsed, ))
+        logger.check_status(10)
+
+    def test_cached_connection_map(self):
+        cache = ConnectionMapCache.instance()
+        cache.clear()
+        hits = cache.hits
+
+        run_config = FakeRunConfig(None, "XXXcacheCfgXXX")
+        logger = MockLogger('foo#0')
+
+        runsets = []
+        for port in (1234, 2345):
+            hub = MockComponent("someHub", 1)
+            hub.add_mock_output("hitData")
+            trig = MockComponent("inIceTrigger", 0)
+            trig.add_mock_input("hitData", port)
+            trig.add_mock_output("trigger")
+            bldr = MockComponent("eventBuilder", 0)
+            bldr.add_mock_input("trigger", port + 1)
+
+            runset = MyRunSet(MyParent(), run_config, [bldr, hub, trig],
+                              logger, FakeMoniClient())
+            conn_map = runset.build_connection_map()
+            runset.set_order(conn_map, logger)
+            runsets.append((runset, conn_map, hub, trig, bldr))
+
+        self.assertEqual(hits + 1, cache.hits)
+
+        # the second map uses the second runset's components and ports
+        (_, conn_map, hub, trig, bldr) = runsets[1]
+        self.assertEqual(["hitData:inIceTrigger#0@localhost:2345"],
+                         [str(x) for x in conn_map[hub]])
+        self.assertTrue(conn_map[hub][0].comp is trig,
+                        "Map does not refer to the new component")
+        self.assertEqual(["trigger:eventBuilder#0@localhost:2346"],
+                         [str(x) for x in conn_map[trig]])
+        self.assertEqual([1, 2, 3], [hub.order, trig.order, bldr.order])
+
+        # a different configuration isn't found in the cache
+        other = MockComponent("someHub", 2)
+        other.add_mock_output("hitData")
+        runset = MyRunSet(MyParent(), run_config, [bldr, other, trig],
+                          logger, FakeMoniClient())
+        runset.build_connection_map()
+        self.assertEqual(hits + 1, cache.hits)
+
+        cache.clear()
+        logger.check_status(10)
+
+    def test_good_time_history(self):
+        hist = GoodTimeHistory()
+        self.assertTrue(hist.expected("a") is None, "Found bogus history")
+        self.assertEqual(0.0, hist.first_delay(()))
+
+        hist.record("a", 2.0)
+        hist.record("b", 1.0)
+        self.assertEqual(1.0, hist.first_delay(("a", "b")))
+        self.assertEqual(0.0, hist.first_delay(("a", "b", "c")))
+
+        # newer measurements are averaged in
+        hist.record("a", 1.0)
+        self.assertEqual(1.5, hist.expected("a"))
+
+    def test_first_good_time(self):
+        hubs = self.__build_comp_list(("fooHub", "barHub"))
+        for hub, val in zip(hubs, (0, 20)):
+            hub.mbean.add_mock_data("stringhub", "LatestFirstChannelHitTime",
+                                    val)
+            hub.mbean.add_mock_data("stringhub", "NumberOfNonZombies", 1)
+
+        class GoodTimeRunSet(object):
+            def __init__(self):
+                self.good_time = None
+
+            def report_good_time(self, _, name, pay_time):
+                self.good_time = (name, pay_time)
+
+        # the first hub reports a time while the thread is backing off
+        setter = threading.Timer(0.2, hubs[0].mbean.set_data,
+                                 ("stringhub", "LatestFirstChannelHitTime",
+                                  30))
+        setter.start()
+
+        runset = GoodTimeRunSet()
+        logger = MockLogger("goodTime")
+        FirstGoodTimeThread.HISTORY.clear()
+        try:
+            thrd = FirstGoodTimeThread(hubs, [], runset, None, logger)
+            thrd.start()
+            thrd.join(30)
+            setter.join()
+
+            self.assertEqual(("firstGoodTime", 30), runset.good_time)
+            max_queries = len(hubs) * FirstGoodTimeThread.MAX_ATTEMPTS
+            self.assertTrue(thrd.num_queries < max_queries,
+                            "Sent %d queries" % (thrd.num_queries, ))
+            for hub in hubs:
+                key = ("firstGoodTime", hub.fullname)
+                self.assertTrue(FirstGoodTimeThread.HISTORY.expected(key)
+                                is not None, "No history for %s" % (hub, ))
+        finally:
+            FirstGoodTimeThread.HISTORY.clear()
+
+        logger.check_status(10)
+
     def test_subrun_good(self):
         comp_list = self.__build_comp_list(("fooHub", "barHub", "bazBuilder"))
 
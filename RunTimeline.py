@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+"""
+Record how long each step of a run transition (start, stop, switch) takes.
+
+Code marks interesting steps with
+
+    with timeline_span("configure", "runset"):
+        ...
+
+or by decorating a method with @timed_step("configure", "runset").  Each
+step is recorded by whichever RunTimeline is active in the current thread
+(and costs almost nothing if there isn't one).  Each run's timeline is
+written to its run directory in Chrome's trace event format, so it can be
+loaded into chrome://tracing or Perfetto, and `pdaq timeline` summarizes
+it on the command line.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from functools import wraps
+
+
+class TimelineSpan(object):
+    "A single timed step"
+
+    def __init__(self, name, category, lane, start, end, args=None):
+        self.__name = name
+        self.__category = category
+        self.__lane = lane
+        self.__start = start
+        self.__end = end
+        self.__args = args
+
+    def __str__(self):
+        return "%s/%s[%s] %.3fs" % (self.__category, self.__name, self.__lane,
+                                    self.duration)
+
+    @property
+    def args(self):
+        return self.__args
+
+    @property
+    def category(self):
+        return self.__category
+
+    @property
+    def duration(self):
+        return self.__end - self.__start
+
+    @property
+    def end(self):
+        return self.__end
+
+    @property
+    def lane(self):
+        return self.__lane
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def start(self):
+        return self.__start
+
+
+class RunTimeline(object):
+    "Collection of spans covering a single run's transitions"
+
+    # name of the trace file written to the run directory
+    FILENAME = "timeline.json"
+
+    # timeline active in each thread
+    __ACTIVE = threading.local()
+
+    def __init__(self, name=None):
+        self.__name = name
+        self.__spans = []
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__spans)
+
+    def __str__(self):
+        return "RunTimeline(%s)*%d" % (self.__name, len(self.__spans))
+
+    @classmethod
+    def activate(cls, timeline):
+        """
+        Make 'timeline' the active timeline for this thread and return the
+        previously active timeline
+        """
+        prev = getattr(cls.__ACTIVE, "timeline", None)
+        cls.__ACTIVE.timeline = timeline
+        return prev
+
+    @classmethod
+    @contextmanager
+    def activated(cls, timeline):
+        "Make 'timeline' active in this thread for the duration of a block"
+        prev = cls.activate(timeline)
+        try:
+            yield timeline
+        finally:
+            cls.activate(prev)
+
+    @classmethod
+    def active(cls):
+        "Return the timeline active in this thread, or None"
+        return getattr(cls.__ACTIVE, "timeline", None)
+
+    def add(self, name, category, start, end, lane=None, args=None):
+        "Add a completed span"
+        if lane is None:
+            lane = threading.current_thread().name
+        with self.__lock:
+            self.__spans.append(TimelineSpan(name, category, lane, start,
+                                             end, args=args))
+
+    @classmethod
+    def load(cls, path):
+        "Read a trace file written by write()"
+        with open(path, "r") as fin:
+            trace = json.load(fin)
+
+        lanes = {}
+        for event in trace["traceEvents"]:
+            if event["ph"] == "M" and event["name"] == "thread_name":
+                lanes[event["tid"]] = event["args"]["name"]
+
+        timeline = cls(trace.get("otherData", {}).get("name"))
+        for event in trace["traceEvents"]:
+            if event["ph"] != "X":
+                continue
+            start = event["ts"] / 1000000.0
+            end = start + event["dur"] / 1000000.0
+            timeline.add(event["name"], event["cat"], start, end,
+                         lane=lanes.get(event["tid"], str(event["tid"])),
+                         args=event.get("args"))
+        return timeline
+
+    @property
+    def name(self):
+        return self.__name
+
+    @contextmanager
+    def span(self, name, category, lane=None, args=None):
+        "Time a block of code"
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.time(), lane=lane,
+                     args=args)
+
+    @property
+    def spans(self):
+        "Return a list of all spans, ordered by start time"
+        with self.__lock:
+            spans = self.__spans[:]
+        return sorted(spans, key=lambda x: x.start)
+
+    def summary(self):
+        """
+        Return a list of (category, name, count, total_secs, max_secs,
+        slowest_lane) tuples, slowest steps first
+        """
+        totals = {}
+        for span in self.spans:
+            key = (span.category, span.name)
+            if key not in totals:
+                totals[key] = [0, 0.0, 0.0, None]
+            entry = totals[key]
+            entry[0] += 1
+            entry[1] += span.duration
+            if entry[3] is None or span.duration > entry[2]:
+                entry[2] = span.duration
+                entry[3] = span.lane
+
+        rows = [(key[0], key[1], val[0], val[1], val[2], val[3])
+                for key, val in totals.items()]
+        return sorted(rows, key=lambda x: x[3], reverse=True)
+
+    def to_trace(self):
+        "Return a dictionary in Chrome's trace event format"
+        spans = self.spans
+        if len(spans) == 0:  # pylint: disable=len-as-condition
+            origin = 0.0
+        else:
+            origin = spans[0].start
+
+        lanes = {}
+        events = []
+        for span in spans:
+            if span.lane not in lanes:
+                lanes[span.lane] = len(lanes) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": 1,
+                               "tid": lanes[span.lane],
+                               "args": {"name": span.lane}})
+
+            event = {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "pid": 1,
+                "tid": lanes[span.lane],
+                "ts": int((span.start - origin) * 1000000),
+                "dur": int(span.duration * 1000000),
+            }
+            if span.args is not None:
+                event["args"] = span.args
+            events.append(event)
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"name": self.__name, "origin": origin},
+        }
+
+    def write(self, directory):
+        "Write the trace file to 'directory' and return its path"
+        path = os.path.join(directory, self.FILENAME)
+        with open(path, "w") as fout:
+            json.dump(self.to_trace(), fout)
+        return path
+
+
+@contextmanager
+def timeline_span(name, category, lane=None, args=None):
+    "Time a block of code if there's an active timeline in this thread"
+    timeline = RunTimeline.active()
+    if timeline is None:
+        yield
+    else:
+        with timeline.span(name, category, lane=lane, args=args):
+            yield
+
+
+def timed_step(name, category):
+    "Decorator which records each call to a function as a timeline span"
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timeline = RunTimeline.active()
+            if timeline is None:
+                return func(*args, **kwargs)
+            with timeline.span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_arguments(parser):
+    "Add command-line arguments"
+
+    parser.add_argument("-D", "--log-directory", dest="log_directory",
+                        default="/mnt/data/pdaq/log",
+                        help=("Directory where 'daqrunXXXXXX' directories"
+                              " are stored"))
+    parser.add_argument("-n", "--num-steps", type=int, dest="num_steps",
+                        default=20,
+                        help="Number of slowest steps to list")
+    parser.add_argument(dest="runs", nargs="+",
+                        help="Run number, run directory or trace file")
+
+
+def find_trace(log_dir, run):
+    "Return the path to the trace file for a run number, directory or file"
+    if os.path.isfile(run):
+        return run
+    if os.path.isdir(run):
+        return os.path.join(run, RunTimeline.FILENAME)
+
+    try:
+        run_num = int(run)
+    except ValueError:
+        raise SystemExit("Bad run \"%s\"" % (run, ))
+
+    return os.path.join(log_dir, "daqrun%05d" % (run_num, ),
+                        RunTimeline.FILENAME)
+
+
+def summarize_timelines(args):
+    "Print the slowest steps in each run's timeline"
+    for run in args.runs:
+        path = find_trace(args.log_directory, run)
+        if not os.path.exists(path):
+            print("No timeline for %s (%s)" % (run, path))
+            continue
+
+        timeline = RunTimeline.load(path)
+        spans = timeline.spans
+        if len(spans) == 0:  # pylint: disable=len-as-condition
+            print("%s: empty timeline" % (path, ))
+            continue
+
+        total = max(x.end for x in spans) - spans[0].start
+        print("%s: %d steps over %.3f seconds" % (path, len(spans), total))
+        for cat, name, count, tot_secs, max_secs, lane in \
+          timeline.summary()[:args.num_steps]:
+            print("  %8.3fs %-10s %-28s x%-4d max %.3fs (%s)" %
+                  (tot_secs, cat, name, count, max_secs, lane))
+
+
+def main():
+    "Main program"
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    summarize_timelines(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"RunTimeline unit tests"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from CompOp import ComponentGroup, OpGetState
+from RunTimeline import RunTimeline, timed_step, timeline_span
+
+from DAQMocks import MockComponent
+
+
+class RunTimelineTest(unittest.TestCase):
+    def setUp(self):
+        self.__temp_dir = None
+
+    def tearDown(self):
+        if self.__temp_dir is not None:
+            shutil.rmtree(self.__temp_dir, ignore_errors=True)
+
+    def test_inactive(self):
+        self.assertTrue(RunTimeline.active() is None, "Found active timeline")
+
+        @timed_step("step", "test")
+        def step(val):
+            return val + 1
+
+        with timeline_span("ignored", "test"):
+            self.assertEqual(2, step(1))
+
+    def test_spans(self):
+        @timed_step("step", "test")
+        def step(val):
+            return val * 2
+
+        timeline = RunTimeline("run 123")
+        with RunTimeline.activated(timeline):
+            self.assertTrue(RunTimeline.active() is timeline,
+                            "Timeline was not activated")
+            with timeline_span("outer", "test", lane="main"):
+                self.assertEqual(6, step(3))
+                self.assertEqual(8, step(4))
+        self.assertTrue(RunTimeline.active() is None,
+                        "Timeline was not deactivated")
+
+        spans = timeline.spans
+        self.assertEqual(["outer", "step", "step"], [x.name for x in spans])
+        self.assertEqual("main", spans[0].lane)
+        for span in spans[1:]:
+            self.assertTrue(spans[0].start <= span.start and
+                            span.end <= spans[0].end,
+                            "%s is not inside %s" % (span, spans[0]))
+
+        summary = dict(((row[0], row[1]), row[2:])
+                       for row in timeline.summary())
+        self.assertEqual(2, summary[("test", "step")][0])
+        self.assertEqual(1, summary[("test", "outer")][0])
+
+    def test_component_ops(self):
+        comps = [MockComponent("foo", 1), MockComponent("bar", 2)]
+
+        timeline = RunTimeline("run 1")
+        with RunTimeline.activated(timeline):
+            states = ComponentGroup.run_simple(OpGetState, comps, (), None)
+        self.assertEqual(2, len(states))
+
+        spans = timeline.spans
+        self.assertEqual(["group"], [x.category for x in spans
+                                     if x.lane not in ("foo#1", "bar#2")])
+        lanes = sorted(x.lane for x in spans if x.category == "component")
+        self.assertEqual(["bar#2", "foo#1"], lanes)
+        for span in spans:
+            self.assertEqual("GetState", span.name)
+
+    def test_write(self):
+        self.__temp_dir = tempfile.mkdtemp()
+
+        timeline = RunTimeline("run 456")
+        timeline.add("configure", "runset", 100.0, 101.5, lane="RunSet")
+        timeline.add("Configure", "component", 100.5, 101.0, lane="foo#1",
+                     args={"state": "ready"})
+
+        path = timeline.write(self.__temp_dir)
+        self.assertEqual(os.path.join(self.__temp_dir, RunTimeline.FILENAME),
+                         path)
+
+        trace = timeline.to_trace()
+        events = [x for x in trace["traceEvents"] if x["ph"] == "X"]
+        self.assertEqual(0, events[0]["ts"])
+        self.assertEqual(1500000, events[0]["dur"])
+        self.assertEqual(500000, events[1]["ts"])
+
+        loaded = RunTimeline.load(path)
+        self.assertEqual("run 456", loaded.name)
+        self.assertEqual([(x.name, x.category, x.lane, x.duration, x.args)
+                          for x in timeline.spans],
+                         [(x.name, x.category, x.lane, x.duration, x.args)
+                          for x in loaded.spans])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,10 +14,10 @@ import errno
 import os
 import shutil
 import subprocess
-import tarfile
 
 from ClusterDescription import ClusterDescription
 from LogSorter import LogSorter
+from TarStreamer import TarStreamer
 from utils.DashXMLLog import DashXMLLog, FileNotFoundException
 
 from exc_string import exc_string, set_exc_string_encoding
@@ -135,6 +135,13 @@ def __indicate_daq_logs_queued(spade_dir, dry_run=False):
     __touch_file(os.path.join(spade_dir, FILE_MARKER), dry_run=dry_run)
 
 
+def __on_same_device(path1, path2):
+    try:
+        return os.stat(path1).st_dev == os.stat(path2).st_dev
+    except OSError:
+        return False
+
+
 def __sizefmt(size):
     for ext in ('bytes', 'KB', 'MB', 'GB'):
         if size < 1024.0:
@@ -156,25 +163,46 @@ def __write_spade_semaphore(spade_dir, spade_base_name, dry_run=False):
 
 
 def __write_spade_tar_file(spade_dir, spade_base_name, run_dir, run_num,
-                           logger=None, dry_run=False, force=False):
+                           copy_dir=None, logger=None, dry_run=False,
+                           force=False):
+    """
+    Write the tar file to the SPADE directory and return a tuple containing
+    its path and the path of the copy written to 'copy_dir' (or None if
+    the caller should link or copy the file itself)
+    """
     # ignore huge directories
     dirsize = __get_size(run_dir, run_num, logger=logger)
     if dirsize >= TOO_LARGE and not force:
         if logger is not None:
             logger.error("Not sending %s; %s is too large" %
                          (run_dir, __sizefmt(dirsize)))
-            return None
+            return (None, None)
 
     tar_path = os.path.join(spade_dir, spade_base_name + ".dat.tar")
 
+    # hard links are cheaper, but if the copy directory is on another
+    # device, write the copy while writing the original
+    if copy_dir is None or __on_same_device(spade_dir, copy_dir):
+        copy_path = None
+        paths = [tar_path, ]
+    else:
+        copy_path = os.path.join(copy_dir, spade_base_name + ".dat.tar")
+        paths = [tar_path, copy_path]
+
     if dry_run:
-        print("tar cvf %s %s" % (tar_path, run_dir))
+        print("tar cvf %s %s" % (" ".join(paths), run_dir))
     else:
-        tar_obj = tarfile.TarFile(tar_path, "w")
-        tar_obj.add(run_dir, os.path.basename(run_dir), True)
-        tar_obj.close()
+        tar_obj = TarStreamer(paths)
+        try:
+            tar_obj.add(run_dir, os.path.basename(run_dir), True)
+        except:
+            tar_obj.abort()
+            raise
+        summary = tar_obj.close()
+        if logger is not None:
+            logger.info("Wrote %s" % (summary, ))
 
-    return tar_path
+    return (tar_path, copy_path)
 
 
 def add_arguments(parser):
@@ -225,31 +253,35 @@ def check_all(logger, spade_dir, copy_dir, log_dir, no_combine=False,
 
 def queue_for_spade(logger, spade_dir, copy_dir, log_dir, run_num,
                     no_combine=False, force=False, dry_run=False):
+    """
+    Queue a run's log files for SPADE/JADE.  Return True if the files were
+    queued (or had already been queued), False if they could not be.
+    """
     if log_dir is None or not os.path.exists(log_dir):
         logger.error("Log directory \"%s\" does not exist" % log_dir)
-        return
+        return False
 
     run_dir = os.path.join(log_dir, "daqrun%05d" % run_num)
     if run_dir is None or not os.path.exists(run_dir):
         logger.error("Run directory \"%s\" does not exist" % run_dir)
-        return
+        return False
 
     if spade_dir is None or not os.path.exists(spade_dir):
         logger.error("SPADE directory \"%s\" does not exist" % spade_dir)
-        return
+        return False
 
     if os.path.exists(os.path.join(run_dir, FILE_MARKER)) and \
        not force:
         logger.error(("Logs for run %d have already been queued;" +
                       " Use --force to requeue them") % run_num)
-        return
+        return True
 
     try:
         (run_time, run_duration) = __get_run_data(run_dir)
     except FileNotFoundException:
         if __in_progress(logger, run_num):
             # don't try to queue log files from current run
-            return
+            return False
         (run_time, run_duration) = (None, 0)
 
     path = os.path.join(run_dir, COMBINED_LOG)
@@ -280,24 +312,32 @@ def queue_for_spade(logger, spade_dir, copy_dir, log_dir, run_num,
             (run_num, run_time.year, run_time.month, run_time.day,
              run_time.hour, run_time.minute, run_time.second, run_duration)
 
-        tar_file = __write_spade_tar_file(spade_dir, spade_base_name, run_dir,
-                                          run_num, logger=logger,
-                                          dry_run=dry_run, force=force)
-        if tar_file is not None:
-            if copy_dir is not None and os.path.exists(copy_dir):
-                __copy_spade_tar_file(logger, copy_dir, spade_base_name,
-                                      tar_file, dry_run=dry_run)
+        if copy_dir is not None and not os.path.exists(copy_dir):
+            copy_dir = None
 
-            __write_spade_semaphore(spade_dir, spade_base_name,
-                                    dry_run=dry_run)
+        (tar_file, copy_file) = \
+            __write_spade_tar_file(spade_dir, spade_base_name, run_dir,
+                                   run_num, copy_dir=copy_dir, logger=logger,
+                                   dry_run=dry_run, force=force)
+        if tar_file is None:
+            return False
 
-            __indicate_daq_logs_queued(run_dir, dry_run=dry_run)
+        if copy_dir is not None and copy_file is None:
+            __copy_spade_tar_file(logger, copy_dir, spade_base_name,
+                                  tar_file, dry_run=dry_run)
 
-            logger.info(("Queued data for SPADE (spadeDir=%s" +
-                         ", run_dir=%s, run_num=%s)...") %
-                        (spade_dir, run_dir, run_num))
+        __write_spade_semaphore(spade_dir, spade_base_name, dry_run=dry_run)
+
+        __indicate_daq_logs_queued(run_dir, dry_run=dry_run)
+
+        logger.info(("Queued data for SPADE (spadeDir=%s" +
+                     ", run_dir=%s, run_num=%s)...") %
+                    (spade_dir, run_dir, run_num))
     except:  # pylint: disable=bare-except
         logger.error("FAILED to queue data for SPADE: " + exc_string())
+        return False
+
+    return True
 
 
 def queue_logs(args):
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+"""
+Write a tar file to one or more destinations in a single pass.
+
+The tar stream is built in the calling thread while separate threads write
+it to each destination file and compute its checksum, so reading the input
+files, writing each copy and checksumming all overlap.  Each destination
+is written under a temporary name and renamed once the tar file is
+complete, so a crash never leaves a truncated tarball behind.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import os
+import tarfile
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class TarSummary(object):
+    "Description of a finished tar file"
+
+    def __init__(self, paths, num_members, num_bytes, checksum):
+        self.__paths = paths
+        self.__num_members = num_members
+        self.__num_bytes = num_bytes
+        self.__checksum = checksum
+
+    def __str__(self):
+        return "%s (%d files, %d bytes, sha1 %s)" % \
+            (", ".join(self.__paths), self.__num_members, self.__num_bytes,
+             self.__checksum)
+
+    @property
+    def checksum(self):
+        "SHA1 checksum of the tar file"
+        return self.__checksum
+
+    @property
+    def num_bytes(self):
+        "Size of the tar file"
+        return self.__num_bytes
+
+    @property
+    def num_members(self):
+        "Number of files, directories, etc. in the tar file"
+        return self.__num_members
+
+    @property
+    def paths(self):
+        return self.__paths[:]
+
+
+class StreamSink(threading.Thread):
+    "Thread which feeds queued chunks of data to a single consumer"
+
+    def __init__(self, name, consume, max_chunks):
+        self.__consume = consume
+        self.__queue = queue.Queue(max_chunks)
+        self.__error = None
+
+        super(StreamSink, self).__init__(name=name)
+        self.setDaemon(True)
+
+    @property
+    def error(self):
+        "Exception thrown by the consumer (or None)"
+        return self.__error
+
+    def put(self, data):
+        "Queue a chunk of data, blocking if the consumer has fallen behind"
+        self.__queue.put(data)
+
+    def run(self):
+        while True:
+            data = self.__queue.get()
+            if data is None:
+                break
+            if self.__error is not None:
+                # drain the queue so the producer doesn't block
+                continue
+            try:
+                self.__consume(data)
+            except Exception as exc:  # pylint: disable=broad-except
+                self.__error = exc
+
+
+class TarStreamer(object):
+    """
+    File-like object which writes a tar file to all of 'paths' at once.
+    Use add() to add files, then close() to finish the tar files.
+    """
+
+    # size of chunks handed to the writer threads
+    CHUNK_SIZE = 1024 * 1024
+    # maximum number of chunks queued for each writer thread
+    MAX_CHUNKS = 8
+
+    def __init__(self, paths, chunk_size=None, max_chunks=None):
+        if chunk_size is None:
+            chunk_size = self.CHUNK_SIZE
+        if max_chunks is None:
+            max_chunks = self.MAX_CHUNKS
+
+        self.__paths = paths[:]
+        self.__chunk_size = chunk_size
+
+        self.__buffer = []
+        self.__buffered = 0
+        self.__num_bytes = 0
+        self.__num_members = 0
+        self.__sha = hashlib.sha1()
+
+        self.__files = []
+        self.__sinks = []
+        try:
+            for path in self.__paths:
+                fout = open(self.__temp_path(path), "wb")
+                self.__files.append(fout)
+                self.__sinks.append(StreamSink("Tar>" + path, fout.write,
+                                               max_chunks))
+            self.__sinks.append(StreamSink("Tar>sha1", self.__sha.update,
+                                           max_chunks))
+        except:
+            self.__close_files(remove=True)
+            raise
+
+        for sink in self.__sinks:
+            sink.start()
+
+        self.__tar = tarfile.open(fileobj=self, mode="w|")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __close_files(self, remove=False):
+        for fout in self.__files:
+            fout.close()
+        self.__files = []
+
+        if remove:
+            for path in self.__paths:
+                try:
+                    os.unlink(self.__temp_path(path))
+                except OSError:
+                    pass
+
+    def __count_member(self, tarinfo):
+        self.__num_members += 1
+        return tarinfo
+
+    def __flush(self):
+        if self.__buffered == 0:
+            return
+
+        data = b"".join(self.__buffer)
+        self.__buffer = []
+        self.__buffered = 0
+
+        for sink in self.__sinks:
+            if sink.error is not None:
+                raise sink.error
+            sink.put(data)
+
+    def __stop_sinks(self):
+        "Wait for all queued data to be consumed; return the first error"
+        for sink in self.__sinks:
+            sink.put(None)
+
+        error = None
+        for sink in self.__sinks:
+            sink.join()
+            if error is None:
+                error = sink.error
+        self.__sinks = []
+        return error
+
+    @classmethod
+    def __temp_path(cls, path):
+        (dirname, basename) = os.path.split(path)
+        return os.path.join(dirname, "." + basename + ".tmp")
+
+    def abort(self):
+        "Stop writing and remove any partially written files"
+        self.__buffer = []
+        self.__buffered = 0
+        if self.__sinks:
+            self.__stop_sinks()
+        self.__close_files(remove=True)
+
+    def add(self, path, arcname=None, recursive=True):
+        "Add a file (or directory tree) to the tar file"
+        self.__tar.add(path, arcname=arcname, recursive=recursive,
+                       filter=self.__count_member)
+
+    def close(self):
+        """
+        Finish the tar file, move each copy to its final name and return a
+        TarSummary
+        """
+        try:
+            self.__tar.close()
+            self.__flush()
+        except:
+            self.abort()
+            raise
+
+        error = self.__stop_sinks()
+        if error is not None:
+            self.__close_files(remove=True)
+            raise error
+
+        self.__close_files()
+        for path in self.__paths:
+            os.rename(self.__temp_path(path), path)
+
+        return TarSummary(self.__paths, self.__num_members, self.__num_bytes,
+                          self.__sha.hexdigest())
+
+    def write(self, data):
+        "Called by 'tarfile' to write the next piece of the tar stream"
+        self.__buffer.append(data)
+        self.__buffered += len(data)
+        self.__num_bytes += len(data)
+        if self.__buffered >= self.__chunk_size:
+            self.__flush()
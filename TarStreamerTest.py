@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"TarStreamer unit tests"
+
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from TarStreamer import TarStreamer
+
+
+class TarStreamerTest(unittest.TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+
+        self.__run_dir = os.path.join(self.__temp_dir, "daqrun00123")
+        os.mkdir(self.__run_dir)
+        for idx in range(4):
+            with open(os.path.join(self.__run_dir, "file%d" % idx),
+                      "wb") as fout:
+                fout.write(os.urandom(100000 * idx))
+
+    def tearDown(self):
+        shutil.rmtree(self.__temp_dir, ignore_errors=True)
+
+    def test_copies(self):
+        paths = [os.path.join(self.__temp_dir, "%s.dat.tar" % name)
+                 for name in ("spade", "copy")]
+
+        # use tiny chunks so the writer threads have to keep up
+        tar_obj = TarStreamer(paths, chunk_size=4096, max_chunks=2)
+        tar_obj.add(self.__run_dir, os.path.basename(self.__run_dir))
+        summary = tar_obj.close()
+
+        self.assertEqual(paths, summary.paths)
+        self.assertEqual(5, summary.num_members)
+
+        with open(paths[0], "rb") as fin:
+            data = fin.read()
+        with open(paths[1], "rb") as fin:
+            self.assertTrue(data == fin.read(), "Copies do not match")
+        self.assertEqual(len(data), summary.num_bytes)
+        self.assertEqual(hashlib.sha1(data).hexdigest(), summary.checksum)
+
+        tar_obj = tarfile.open(paths[0], "r")
+        try:
+            names = sorted(tar_obj.getnames())
+        finally:
+            tar_obj.close()
+        self.assertEqual(["daqrun00123", ] +
+                         ["daqrun00123/file%d" % x for x in range(4)], names)
+
+        # temporary files have all been renamed
+        self.assertEqual(sorted(["copy.dat.tar", "daqrun00123",
+                                 "spade.dat.tar"]),
+                         sorted(os.listdir(self.__temp_dir)))
+
+    def test_abort(self):
+        path = os.path.join(self.__temp_dir, "spade.dat.tar")
+
+        tar_obj = TarStreamer([path, ])
+        try:
+            tar_obj.add(self.__run_dir, os.path.basename(self.__run_dir))
+            tar_obj.add(os.path.join(self.__temp_dir, "missing"))
+        except OSError:
+            tar_obj.abort()
+        else:
+            self.fail("Adding a missing file should fail")
+
+        self.assertEqual(["daqrun00123", ], os.listdir(self.__temp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"TimeParser unit tests"
+
+import datetime
+import threading
+import time
+import unittest
+
+from timeparse import TimeParser
+
+
+class TimeParseTest(unittest.TestCase):
+    DATESTRS = (
+        "2021-07-13 12:34:56.123456",
+        "2021-07-13 12:34:56.654321",
+        "2021-07-13 12:34:57",
+        "2021-12-31 23:59:59.5",
+        "2021-7-3 1:02:03.000100",
+    )
+
+    def test_datetime(self):
+        tparse = TimeParser()
+        for dstr in self.DATESTRS:
+            if dstr.find(".") > 0:
+                fmt = "%Y-%m-%d %H:%M:%S.%f"
+            else:
+                fmt = "%Y-%m-%d %H:%M:%S"
+            expected = datetime.datetime.strptime(dstr, fmt)
+            self.assertEqual(expected, tparse.datetime(dstr),
+                             "Bad datetime for \"%s\"" % (dstr, ))
+
+    def test_epoch(self):
+        tparse = TimeParser()
+        for dstr in self.DATESTRS:
+            flds = dstr.split(".")
+            expected = time.mktime(time.strptime(flds[0],
+                                                 "%Y-%m-%d %H:%M:%S"))
+            if len(flds) > 1:
+                expected += float("0." + flds[1])
+            self.assertAlmostEqual(expected, tparse.epoch(dstr), places=6,
+                                   msg="Bad epoch for \"%s\"" % (dstr, ))
+
+    def test_fields(self):
+        tparse = TimeParser()
+        self.assertEqual((2021, 7, 13, 12, 34, 56, "123456"),
+                         tparse.fields(self.DATESTRS[0]))
+        self.assertEqual((2021, 7, 13, 12, 34, 57, ""),
+                         tparse.fields(self.DATESTRS[2]))
+
+    def test_bad_date(self):
+        tparse = TimeParser()
+        for dstr in ("2021-13-01 00:00:00.0", "2021-02-30 00:00:00.0",
+                     "not a date"):
+            self.assertRaises(ValueError, tparse.datetime, dstr)
+
+    def test_cache_limit(self):
+        tparse = TimeParser()
+        base = datetime.datetime(2021, 1, 1)
+        for sec in range(TimeParser.MAX_CACHED * 2):
+            now = base + datetime.timedelta(seconds=sec, microseconds=7)
+            self.assertEqual(now, tparse.datetime(str(now)))
+
+    def test_threads(self):
+        tparse = TimeParser()
+        base = datetime.datetime(2021, 1, 1)
+        errors = []
+
+        def parse(offset):
+            for sec in range(2000):
+                now = base + datetime.timedelta(seconds=(sec + offset) % 50)
+                got = tparse.datetime(str(now))
+                if got != now:
+                    errors.append((now, got))
+
+        threads = [threading.Thread(target=parse, args=(num * 7, ))
+                   for num in range(4)]
+        for thrd in threads:
+            thrd.start()
+        for thrd in threads:
+            thrd.join()
+
+        self.assertEqual([], errors[:5])
+
+
+if __name__ == '__main__':
+    unittest.main()
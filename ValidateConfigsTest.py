@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"validate_configs unit tests"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lxml import etree
+
+import config.validate_configs as validate_configs
+from config.validate_configs import ValidationCache
+
+
+TYPES_XSD = """<?xml version="1.0"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:simpleType name="countType">
+    <xs:restriction base="xs:integer">
+      <xs:maxInclusive value="%d"/>
+    </xs:restriction>
+  </xs:simpleType>
+</xs:schema>
+"""
+
+MAIN_XSD = """<?xml version="1.0"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:include schemaLocation="types.xsd"/>
+  <xs:element name="count" type="countType"/>
+</xs:schema>
+"""
+
+
+class ValidateConfigsTest(unittest.TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+        self.__validations = 0
+
+        # don't read or write verdicts outside the temporary directory
+        self.__saved_verdicts = validate_configs.VERDICTS
+        validate_configs.VERDICTS = ValidationCache(self.__temp_dir)
+
+    def tearDown(self):
+        validate_configs.VERDICTS = self.__saved_verdicts
+        shutil.rmtree(self.__temp_dir, ignore_errors=True)
+
+    def __create(self, name, text):
+        path = os.path.join(self.__temp_dir, name)
+        with open(path, "w") as fout:
+            fout.write(text)
+        return path
+
+    def __create_schema(self, max_count=10):
+        self.__create("types.xsd", TYPES_XSD % max_count)
+        return self.__create("main.xsd", MAIN_XSD)
+
+    def __validator(self, result):
+        def validate():
+            self.__validations += 1
+            return result
+        return validate
+
+    def test_relative_include(self):
+        schema = self.__create_schema()
+
+        # the included schema is found relative to the main schema,
+        # not the current directory
+        good = self.__create("good.xml", "<count>3</count>")
+        self.assertEqual((True, ""),
+                         validate_configs._validate_xml(good, schema))
+
+        bad = self.__create("bad.xml", "<count>12</count>")
+        (valid, reason) = validate_configs._validate_xml(bad, schema)
+        self.assertFalse(valid)
+        self.assertTrue("count" in reason, "Bad reason \"%s\"" % reason)
+
+    def test_schema_cached(self):
+        schema = self.__create_schema()
+
+        first = validate_configs._load_schema(schema, "XSD schema",
+                                              etree.XMLSchema)
+        second = validate_configs._load_schema(schema, "XSD schema",
+                                               etree.XMLSchema)
+        self.assertTrue(first[0] is second[0], "Schema was recompiled")
+        self.assertEqual(first[1], second[1])
+
+    def test_schema_changed(self):
+        schema = self.__create_schema()
+        xml_path = self.__create("count.xml", "<count>50</count>")
+
+        (valid, _) = validate_configs._validate_xml(xml_path, schema)
+        self.assertFalse(valid)
+        (_, old_hash) = validate_configs._load_schema(schema, "XSD schema",
+                                                      etree.XMLSchema)
+
+        # the new limit is picked up when only the included schema changes
+        self.__create("types.xsd", TYPES_XSD % 100)
+        (_, new_hash) = validate_configs._load_schema(schema, "XSD schema",
+                                                      etree.XMLSchema)
+        self.assertNotEqual(old_hash, new_hash)
+        self.assertEqual((True, ""),
+                         validate_configs._validate_xml(xml_path, schema))
+
+    def test_verdict_cached(self):
+        xml_path = self.__create("foo.xml", "<count>1</count>")
+
+        cache = ValidationCache(self.__temp_dir)
+        self.assertEqual((True, ""),
+                         cache.check(xml_path, "abc",
+                                     self.__validator((True, ""))))
+        self.assertEqual((True, ""),
+                         cache.check(xml_path, "abc",
+                                     self.__validator((False, "bad"))))
+        self.assertEqual(1, self.__validations)
+
+        # verdicts are shared through the cache file
+        cache.save()
+        cache = ValidationCache(self.__temp_dir)
+        self.assertEqual((True, ""),
+                         cache.check(xml_path, "abc",
+                                     self.__validator((False, "bad"))))
+        self.assertEqual(1, self.__validations)
+
+        # a new schema hash needs a new verdict
+        self.assertEqual((False, "bad"),
+                         cache.check(xml_path, "def",
+                                     self.__validator((False, "bad"))))
+        self.assertEqual(2, self.__validations)
+
+    def test_verdict_changed(self):
+        xml_path = self.__create("foo.xml", "<count>1</count>")
+
+        cache = ValidationCache(self.__temp_dir)
+        cache.check(xml_path, "abc", self.__validator((True, "")))
+
+        # touching the file doesn't force revalidation
+        stat = os.stat(xml_path)
+        os.utime(xml_path, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual((True, ""),
+                         cache.check(xml_path, "abc",
+                                     self.__validator((False, "bad"))))
+        self.assertEqual(1, self.__validations)
+
+        # changing its contents does
+        self.__create("foo.xml", "<count>2</count>")
+        self.assertEqual((False, "bad"),
+                         cache.check(xml_path, "abc",
+                                     self.__validator((False, "bad"))))
+        self.assertEqual(2, self.__validations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,14 @@
 
 from __future__ import print_function
 
+import hashlib
 import os
+import pickle
 import sys
 import glob
+import threading
+
+from io import BytesIO
 
 from lxml import etree
 from lxml.etree import XMLSyntaxError
@@ -22,28 +27,281 @@ except ImportError:
     from locate_pdaq import find_pdaq_config, find_pdaq_trunk
 
 from ClusterDescription import ClusterDescription
+from DefaultDomGeometry import DefaultDomGeometryCache
 
 
 PDAQ_HOME = find_pdaq_trunk()
 
 
+class ValidationCache(object):
+    """
+    Persistent cache of schema validation verdicts, keyed by file path and
+    schema hash.  A file is only revalidated if its contents (or the
+    schema) have changed since it was last checked.  Verdicts are saved
+    in DefaultDomGeometryCache.default_directory(), or only kept in memory
+    if caching is disabled
+    """
+
+    # increment this whenever the cached data layout changes
+    VERSION = 1
+
+    FILENAME = "validated.pkl"
+
+    def __init__(self, cache_dir=None):
+        # the default directory is looked up when the cache is first used,
+        # since VERDICTS is created when this module is imported
+        self.__cache_dir = cache_dir
+        self.__path = None
+
+        # (path, schema hash) -> (size, mtime, file hash, valid, reason)
+        self.__entries = None
+        self.__dirty = False
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def __hash_file(cls, path):
+        "Return the SHA1 hash of the contents of 'path'"
+        sha = hashlib.sha1()
+        with open(path, "rb") as fin:
+            sha.update(fin.read())
+        return sha.hexdigest()
+
+    def __load(self):
+        "Read the cache file, if it hasn't already been read"
+        if self.__entries is not None:
+            return
+
+        self.__entries = {}
+
+        cache_dir = self.__cache_dir
+        if cache_dir is None:
+            cache_dir = DefaultDomGeometryCache.default_directory()
+        if cache_dir is None:
+            return
+        self.__path = os.path.join(cache_dir, self.FILENAME)
+
+        try:
+            with open(self.__path, "rb") as fin:
+                version, entries = pickle.load(fin)
+            if version == self.VERSION and isinstance(entries, dict):
+                self.__entries = entries
+        except (IOError, OSError, EOFError, ValueError, TypeError,
+                pickle.UnpicklingError):
+            pass
+
+    def check(self, xml_filename, schema_hash, validator):
+        """
+        Return the (valid, reason) verdict for 'xml_filename', calling
+        'validator' if there is no verdict for the current file contents
+        """
+        try:
+            stat = os.stat(xml_filename)
+        except OSError:
+            # let the validator report the problem
+            return validator()
+
+        key = (os.path.abspath(xml_filename), schema_hash)
+        with self.__lock:
+            self.__load()
+            entry = self.__entries.get(key)
+
+        file_hash = None
+        if entry is not None and entry[0] == stat.st_size:
+            if entry[1] == stat.st_mtime:
+                return entry[3], entry[4]
+
+            # file was touched; see if its contents changed
+            file_hash = self.__hash_file(xml_filename)
+            if file_hash == entry[2]:
+                with self.__lock:
+                    self.__entries[key] = (stat.st_size, stat.st_mtime) + \
+                      entry[2:]
+                    self.__dirty = True
+                return entry[3], entry[4]
+
+        (valid, reason) = validator()
+
+        if file_hash is None:
+            file_hash = self.__hash_file(xml_filename)
+        with self.__lock:
+            self.__entries[key] = (stat.st_size, stat.st_mtime, file_hash,
+                                   valid, reason)
+            self.__dirty = True
+
+        return (valid, reason)
+
+    def save(self):
+        "Write any new verdicts to the cache file"
+        with self.__lock:
+            if not self.__dirty or self.__path is None:
+                return
+
+            tmp_path = "%s.%d" % (self.__path, os.getpid())
+            try:
+                cache_dir = os.path.dirname(self.__path)
+                if not os.path.isdir(cache_dir):
+                    os.makedirs(cache_dir)
+                with open(tmp_path, "wb") as fout:
+                    pickle.dump((self.VERSION, self.__entries), fout,
+                                pickle.HIGHEST_PROTOCOL)
+                os.rename(tmp_path, self.__path)
+                self.__dirty = False
+            except (IOError, OSError):
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+
+# validation verdicts shared by everything in this process
+VERDICTS = ValidationCache()
+
+
+class CompiledSchema(object):
+    """
+    A compiled schema, along with the lock which guards it.  lxml schema
+    objects hold the error log from their last validation, so each one can
+    only validate one document at a time
+    """
+
+    def __init__(self, schema):
+        self.__schema = schema
+        self.__lock = threading.Lock()
+
+    def check(self, doc_xml):
+        "Return a (valid, reason) tuple"
+        with self.__lock:
+            if not self.__schema.validate(doc_xml):
+                return (False, "%s" % self.__schema.error_log)
+        return (True, "")
+
+
+# compiled schemas, keyed by schema file name and type
+_SCHEMAS = {}
+_SCHEMAS_LOCK = threading.Lock()
+
+# elements (and their attributes) which pull other files into a schema
+_XSD_NS = "{http://www.w3.org/2001/XMLSchema}"
+_RNG_NS = "{http://relaxng.org/ns/structure/1.0}"
+_SCHEMA_REFS = {
+    _XSD_NS + "include": "schemaLocation",
+    _XSD_NS + "import": "schemaLocation",
+    _XSD_NS + "redefine": "schemaLocation",
+    _RNG_NS + "include": "href",
+    _RNG_NS + "externalRef": "href",
+}
+
+
 def _open_schema(path, description):
     try:
-        return open(path, 'r')
+        return open(path, 'rb')
     except IOError:
         # look in the schema directory
         path2 = os.path.join(PDAQ_HOME, 'schema', os.path.basename(path))
         try:
-            return open(path2, 'r')
+            return open(path2, 'rb')
         except IOError:
             raise IOError("Could not open %s '%s'" % (description, path))
 
 
+def _read_schema_files(path, data):
+    """
+    Return a list of (path, contents) for schema 'path' (whose contents
+    are 'data') and every local file it includes or imports
+    """
+    files = [(path, data)]
+    seen = set([path, ])
+    idx = 0
+    while idx < len(files):
+        cur_path, cur_data = files[idx]
+        idx += 1
+
+        try:
+            tree = etree.parse(BytesIO(cur_data))
+        except XMLSyntaxError:
+            continue  # the schema compiler will report this
+
+        for elem in tree.iter(*_SCHEMA_REFS.keys()):
+            loc = elem.get(_SCHEMA_REFS[elem.tag])
+            if loc is None or "://" in loc:
+                continue
+
+            ref_path = os.path.normpath(os.path.join(os.path.dirname(cur_path),
+                                                     loc))
+            if ref_path in seen:
+                continue
+            seen.add(ref_path)
+
+            try:
+                with open(ref_path, "rb") as fin:
+                    files.append((ref_path, fin.read()))
+            except IOError:
+                pass  # the schema compiler will report this
+
+    return files
+
+
+def _stamp_files(paths):
+    "Return a tuple of (path, size, mtime), or None if a file is missing"
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamps.append((path, stat.st_size, stat.st_mtime))
+    return tuple(stamps)
+
+
+def _load_schema(schema_filename, description, schema_class):
+    """
+    Return a tuple containing the compiled schema and the SHA1 hash of the
+    schema and all the files it includes.  Each schema is only recompiled
+    if one of those files has changed
+    """
+    key = (schema_filename, schema_class)
+    with _SCHEMAS_LOCK:
+        with _open_schema(schema_filename, description) as schema_fd:
+            path = os.path.abspath(schema_fd.name)
+
+            cached = _SCHEMAS.get(key)
+            if cached is not None and cached[0] is not None and \
+              cached[0][0][0] == path and \
+              _stamp_files(x[0] for x in cached[0]) == cached[0]:
+                return cached[1:]
+
+            data = schema_fd.read()
+
+        files = _read_schema_files(path, data)
+
+        sha = hashlib.sha1()
+        for _, file_data in files:
+            sha.update(file_data)
+
+        # pass the schema's location so relative includes are found
+        tree = etree.parse(BytesIO(data), base_url=path)
+        _SCHEMAS[key] = (_stamp_files(x[0] for x in files),
+                         CompiledSchema(schema_class(tree)), sha.hexdigest())
+        return _SCHEMAS[key][1:]
+
+
+def _check_schema(schema, doc_xml):
+    "Return a (valid, reason) tuple"
+    return schema.check(doc_xml)
+
+
 validated_def_dom_geom = None
 validated_cluster_cfg = None
 
 
 def validate_configs(cluster_xml_filename, runconfig_xml_filename):
+    try:
+        return _validate_configs(cluster_xml_filename, runconfig_xml_filename)
+    finally:
+        VERDICTS.save()
+
+
+def _validate_configs(cluster_xml_filename, runconfig_xml_filename):
 
     config_dir = find_pdaq_config()
 
@@ -234,24 +492,22 @@ def validate_dom_config_spts(xml_filename):
 
 def _validate_dom_config_xml(xml_filename, rng_real_filename):
 
-    try:
-        with open(xml_filename, 'r') as xml_fd:
-            try:
-                doc_xml = etree.parse(xml_fd)
-            except XMLSyntaxError as exc:
-                return (False, "file: '%s', %s" % (xml_filename, exc))
-    except IOError:
-        return (False, "Cannot open: %s" % xml_filename)
-
-    with _open_schema(rng_real_filename, "RelaxNG file") as rng_real_fd:
-        rng_doc = etree.parse(rng_real_fd)
+    (rng_real, schema_hash) = _load_schema(rng_real_filename, "RelaxNG file",
+                                           etree.RelaxNG)
 
-    rng_real = etree.RelaxNG(rng_doc)
+    def validator():
+        try:
+            with open(xml_filename, 'r') as xml_fd:
+                try:
+                    doc_xml = etree.parse(xml_fd)
+                except XMLSyntaxError as exc:
+                    return (False, "file: '%s', %s" % (xml_filename, exc))
+        except IOError:
+            return (False, "Cannot open: %s" % xml_filename)
 
-    if not rng_real.validate(doc_xml):
-        return (False, "%s" % rng_real.error_log)
+        return _check_schema(rng_real, doc_xml)
 
-    return (True, "")
+    return VERDICTS.check(xml_filename, schema_hash, validator)
 
 
 def _validate_xml_rng(xml_filename, relaxng_filename):
@@ -269,26 +525,13 @@ def _validate_xml_rng(xml_filename, relaxng_filename):
     """
 
     try:
-        with _open_schema(relaxng_filename, "RNG schema") as relaxng_fd:
-            relaxng_doc = etree.parse(relaxng_fd)
+        (relaxng, schema_hash) = _load_schema(relaxng_filename, "RNG schema",
+                                              etree.RelaxNG)
     except IOError as exc:
         return (False, str(exc))
 
-    relaxng = etree.RelaxNG(relaxng_doc)
-
-    try:
-        with open(xml_filename, 'r') as doc_fd:
-            try:
-                doc_xml = etree.parse(doc_fd)
-            except XMLSyntaxError as exc:
-                return (False, "file: '%s' %s" % (xml_filename, exc))
-    except IOError:
-        return (False, "Could not open '%s'" % xml_filename)
-
-    if not relaxng.validate(doc_xml):
-        return (False, "%s" % relaxng.error_log)
-
-    return (True, "")
+    return VERDICTS.check(xml_filename, schema_hash,
+                          lambda: _parse_and_check(xml_filename, relaxng))
 
 
 def _validate_xml(xml_filename, xsd_filename):
@@ -307,13 +550,17 @@ def _validate_xml(xml_filename, xsd_filename):
 
     # real dom config xsd
     try:
-        with _open_schema(xsd_filename, "XSD schema") as xsd_fd:
-            xmlschema_doc = etree.parse(xsd_fd)
+        (xsd, schema_hash) = _load_schema(xsd_filename, "XSD schema",
+                                          etree.XMLSchema)
     except IOError as exc:
         return (False, str(exc))
 
-    xsd = etree.XMLSchema(xmlschema_doc)
+    return VERDICTS.check(xml_filename, schema_hash,
+                          lambda: _parse_and_check(xml_filename, xsd))
+
 
+def _parse_and_check(xml_filename, schema):
+    "Parse 'xml_filename' and validate it against a compiled schema"
     try:
         with open(xml_filename, 'r') as doc_fd:
             try:
@@ -323,10 +570,7 @@ def _validate_xml(xml_filename, xsd_filename):
     except IOError:
         return (False, "Could not open '%s'" % xml_filename)
 
-    if not xsd.validate(doc_xml):
-        return (False, "%s" % xsd.error_log)
-
-    return (True, "")
+    return _check_schema(schema, doc_xml)
 
 
 def main():
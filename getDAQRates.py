@@ -6,10 +6,18 @@ in the IceCube DAQ, using data from the pDAQ .moni files.
 
 from __future__ import print_function
 
+import multiprocessing
 import os
 import re
 import sys
-import time
+
+from moni_index import INDEX_SUFFIX
+from timeparse import parse_epoch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 MONISEC_PAT = \
     re.compile(r'^(.*):\s+(\d+-\d+-\d+ \d+:\d+:\d+)\.(\d+):\s*$')
@@ -17,8 +25,6 @@ MONILINE_PAT = re.compile(r'^\s+([^:]+):\s+(.*)$')
 
 TRIG_PAT = re.compile(r'^\S+Trigger[0-9]*$')
 
-TIMEFMT = '%Y-%m-%d %H:%M:%S'
-
 COMP_FIELDS = {
     'amandaHub': {
         'moniData': 'RecordsSent',
@@ -144,8 +150,48 @@ class Component(object):
         return (self.name, self.num)
 
 
+def to_series(data_dict):
+    """
+    Convert a {time: value} dictionary into a compact time series, a pair of
+    NumPy arrays (times, values) sorted by time.  If NumPy is not available,
+    the dictionary is returned unchanged.
+    """
+    if numpy is None or isinstance(data_dict, tuple):
+        return data_dict
+
+    times = numpy.fromiter(sorted(data_dict.keys()), dtype=numpy.float64,
+                           count=len(data_dict))
+    vals = numpy.fromiter((data_dict[k] for k in times),
+                          dtype=numpy.float64, count=len(data_dict))
+    return (times, vals)
+
+
+def __compute_series_rates(series):
+    """Vectorized version of compute_rates() for a (times, values) series"""
+    times, vals = series
+    if len(times) < 2:
+        return (None, None)
+
+    if len(times) == 2:
+        rate = float(vals[1] - vals[0]) / float(times[1] - times[0])
+        if rate == 0.0:
+            return (None, None)
+        return (rate, None)
+
+    rates = numpy.diff(vals) / numpy.diff(times)
+    tot_rate = float(vals[-1] - vals[0]) / float(times[-1] - times[0])
+
+    return (tot_rate, rates.tolist())
+
+
 def compute_rates(data_dict):
-    """Compute rates from the data saved in the data dictionary"""
+    """
+    Compute rates from the data saved in the data dictionary (or from a
+    (times, values) series created by to_series())
+    """
+    if isinstance(data_dict, tuple):
+        return __compute_series_rates(data_dict)
+
     keys = list(data_dict.keys())
 
     prev_time = None
@@ -193,12 +239,30 @@ def format_rates(rates):
     return r_str + ']'
 
 
-def process_dir(dir_name, time_interval):
-    """Process all .moni files in the specified directory"""
-    all_data = {}
+def __process_entry(args):
+    """
+    Pool worker which processes a single .moni file and returns the
+    component and its per-section time series
+    """
+    path, comp, time_interval = args
+
+    data = process_file(path, comp, time_interval)
+    for sect in data:
+        data[sect] = to_series(data[sect])
+    return (comp, data)
+
+
+def process_dir(dir_name, time_interval, processes=None):
+    """
+    Process all .moni files in the specified directory.
+    Files are parsed in a pool of 'processes' worker processes (by default,
+    one per CPU); if 'processes' is 1, files are parsed in this process.
+    """
+    work = []
     for entry in os.listdir(dir_name):
         if entry.endswith('.log') or entry.endswith('.html') or \
-               entry.endswith('.xml') or entry == "logs-queued":
+               entry.endswith('.xml') or entry.endswith(INDEX_SUFFIX) or \
+               entry == "logs-queued":
             continue
 
         try:
@@ -207,8 +271,27 @@ def process_dir(dir_name, time_interval):
             print(str(msg), file=sys.stderr)
             continue
 
-        all_data[comp] = process_file(os.path.join(dir_name, entry), comp,
-                                      time_interval)
+        work.append((os.path.join(dir_name, entry), comp, time_interval))
+
+    if processes is None:
+        processes = min(multiprocessing.cpu_count(), len(work))
+
+    if processes <= 1:
+        results = [__process_entry(args) for args in work]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            # larger chunks cut IPC overhead for run directories with
+            # hundreds of small hub files
+            chunksize = max(1, len(work) // (processes * 4))
+            results = pool.map(__process_entry, work, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    all_data = {}
+    for comp, data in results:
+        all_data[comp] = data
 
     return all_data
 
@@ -320,8 +403,7 @@ def process_file(file_name, comp, time_interval):
 
                 sec_name = name
                 msec = float(mtch.group(3)) / 1000000.0
-                sec_time = time.mktime(time.strptime(mtch.group(2),
-                                                     TIMEFMT)) + msec
+                sec_time = parse_epoch(mtch.group(2)) + msec
 
                 summary.register(sec_name)
 
@@ -521,6 +603,8 @@ def main():
     time_interval = None
     print_secondary = True
     verbose = False
+    grab_processes = False
+    processes = None
 
     dir_list = []
     file_list = []
@@ -528,6 +612,9 @@ def main():
         if grab_time_interval:
             time_interval = int(arg)
             grab_time_interval = False
+        elif grab_processes:
+            processes = int(arg)
+            grab_processes = False
         elif arg == '-v':
             if not verbose:
                 verbose = True
@@ -538,6 +625,11 @@ def main():
                 grab_time_interval = True
             else:
                 time_interval = int(arg[2:])
+        elif arg.startswith('-j'):
+            if arg == '-j':
+                grab_processes = True
+            else:
+                processes = int(arg[2:])
         elif os.path.isdir(arg):
             dir_list.append(arg)
         elif os.path.exists(arg):
@@ -559,6 +651,7 @@ def main():
         print(('Usage: %s' +
                ' [-d(ataOnly)]' +
                ' [-i timeInterval ]' +
+               ' [-j numProcesses ]' +
                ' [-v(erbose)]' +
                ' (moniDir | moniFile [...])') % sys.argv[0], file=sys.stderr)
         sys.exit(1)
@@ -578,7 +671,7 @@ def main():
     else:
         for dname in dir_list:
             print('Directory ' + dname)
-            all_data = process_dir(dname, time_interval)
+            all_data = process_dir(dname, time_interval, processes=processes)
             report_rates(all_data, time_interval,
                          print_secondary=print_secondary, verbose=verbose)
 
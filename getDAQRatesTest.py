@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"getDAQRates unit tests"
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import getDAQRates
+from getDAQRates import Component, compute_rates, process_dir, \
+    process_file, to_series
+from MonitorTask import MonitorToFile
+
+
+class GetDAQRatesTest(unittest.TestCase):
+    BASE_TIME = datetime.datetime(2021, 7, 13, 12, 0, 0, 123456)
+    NUM_REPORTS = 12
+
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+
+        self.__write_moni("eventBuilder-0", {
+            "glblTrig": ("RecordsReceived", 7),
+            "rdoutReq": ("RecordsSent", 7),
+            "rdoutData": ("RecordsReceived", 53),
+            "backEnd": ("NumEventsSent", 5),
+        })
+        for num in (1, 2, 3):
+            self.__write_moni("stringHub-%d" % num, {
+                "stringHit": ("RecordsSent", 100 + num),
+                "rdoutData": ("RecordsSent", 11 * num),
+                "tcalData": ("RecordsSent", 0),
+            })
+
+    def tearDown(self):
+        shutil.rmtree(self.__temp_dir, ignore_errors=True)
+
+    def __write_moni(self, basename, beans):
+        """
+        Write a .moni file where each bean's counter grows unevenly, so
+        every interval has a different rate
+        """
+        mtf = MonitorToFile(self.__temp_dir, basename)
+        for idx in range(self.NUM_REPORTS):
+            now = self.BASE_TIME + datetime.timedelta(seconds=idx * 10 +
+                                                      idx % 3)
+            for bean, (field, step) in sorted(beans.items()):
+                mtf.send(now, bean, {field: step * idx * (idx + 1)})
+        mtf.close()
+
+    def __expected_rates(self):
+        "Compute rates from each file's {time: value} dictionaries"
+        expected = {}
+        for entry in os.listdir(self.__temp_dir):
+            if not entry.endswith(".moni"):
+                continue
+            comp = Component(entry)
+            data = process_file(os.path.join(self.__temp_dir, entry), comp,
+                                None)
+            for sect, values in data.items():
+                expected[(str(comp), sect)] = compute_rates(values)
+        return expected
+
+    def __check_rates(self, expected, all_data):
+        found = {}
+        for comp, data in all_data.items():
+            for sect, series in data.items():
+                if getDAQRates.numpy is not None:
+                    self.assertTrue(isinstance(series, tuple),
+                                    "%s %s was not converted to a series" %
+                                    (comp, sect))
+                found[(str(comp), sect)] = compute_rates(series)
+
+        self.assertEqual(sorted(expected.keys()), sorted(found.keys()))
+        for key, (tot_rate, rates) in expected.items():
+            (found_tot, found_rates) = found[key]
+            if tot_rate is None:
+                self.assertTrue(found_tot is None,
+                                "Expected no total rate for %s, not %s" %
+                                (key, found_tot))
+            else:
+                self.assertAlmostEqual(tot_rate, found_tot)
+
+            if rates is None:
+                self.assertTrue(found_rates is None,
+                                "Expected no rates for %s, not %s" %
+                                (key, found_rates))
+            else:
+                self.assertEqual(len(rates), len(found_rates))
+                for exp, act in zip(rates, found_rates):
+                    self.assertAlmostEqual(exp, act)
+
+    def test_series_rates(self):
+        data = {10.0: 5, 20.5: 12, 31.0: 40, 40.0: 41}
+        self.assertEqual(compute_rates(data), compute_rates(to_series(data)))
+
+        # two points give a single rate; an unchanged value gives none
+        data = {1.0: 10, 3.0: 20}
+        self.assertEqual((5.0, None), compute_rates(to_series(data)))
+        data = {1.0: 10, 3.0: 10}
+        self.assertEqual((None, None), compute_rates(to_series(data)))
+        self.assertEqual((None, None), compute_rates(to_series({1.0: 10})))
+
+    def test_process_dir_serial(self):
+        expected = self.__expected_rates()
+        self.assertEqual(4 + 3 * 3, len(expected))
+        self.__check_rates(expected, process_dir(self.__temp_dir, None,
+                                                 processes=1))
+
+    def test_process_dir_parallel(self):
+        self.__check_rates(self.__expected_rates(),
+                           process_dir(self.__temp_dir, None, processes=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -171,12 +171,11 @@ def process_moni(dom_dict, moniname):
                 # only want ASCII records
                 continue
 
-            key = "%012x" % pay.dom_id
-            if key not in dom_dict:
-                logging.error("Ignoring unknown DOM %012x", key)
+            if pay.dom_id not in dom_dict:
+                logging.error("Ignoring unknown DOM %012x", pay.dom_id)
                 continue
 
-            dom = dom_dict[key]
+            dom = dom_dict[pay.dom_id]
             if not dom.is_icetop:
                 continue
 
@@ -368,8 +367,8 @@ def main():
     # read in default-dom-geometry.xml
     ddg = DefaultDomGeometryReader.parse(translate_doms=True)
 
-    # cache the DOM ID -> DOM dictionary
-    ddict = ddg.get_dom_id_to_dom_dict()
+    # cache the mainboard ID -> DOM dictionary
+    ddict = ddg.get_mbid_to_dom_dict()
 
     count = 0
     total = len(args.files)
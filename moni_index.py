@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+"""
+Byte-offset index for pDAQ .moni files.
+
+Each section in a .moni file starts with a "beanName: date:" header line.
+The index maps every (bean, timestamp) pair to the byte offset of its header
+so readers can seek directly to the sections they want instead of scanning
+the whole file.  Indices are stored next to the .moni file in a sidecar file
+(`component-0.moni.idx`) containing one tab-separated line per section:
+
+    offset<TAB>bean<TAB>date_string
+
+While a .moni file is being written, its MoniIndexWriter holds a lock on
+the index file, and readers which rebuild an index leave it alone.
+"""
+
+from __future__ import print_function
+
+import bisect
+import os
+import re
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # no file locking on this platform
+
+from timeparse import parse_datetime
+
+
+INDEX_SUFFIX = ".idx"
+
+SECTION_PAT = re.compile(r"^([^:\s][^:]*):\s(\d+-\d+-\d+\s\d+:\d+:\d+"
+                         r"(?:\.\d+)?):\s*$")
+
+
+def index_path(filename):
+    "Return the path of the index file for the .moni file 'filename'"
+    return filename + INDEX_SUFFIX
+
+
+class MoniIndexException(Exception):
+    "General MoniIndex exception"
+
+
+class MoniIndexWriter(object):
+    "Append index entries for a .moni file as it is being written"
+
+    def __init__(self, filename):
+        "Create (or truncate) the index file for 'filename'"
+        self.__fd = open(index_path(filename), "w")
+
+        # let readers know this index is still being written
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.__fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                pass  # another writer owns it; nothing more we can do
+
+    def add(self, offset, bean_name, datestr):
+        "Record the offset of a section header"
+        if self.__fd is not None:
+            print("%d\t%s\t%s" % (offset, bean_name, datestr), file=self.__fd)
+
+    def close(self):
+        "Close the index file"
+        if self.__fd is not None:
+            self.__fd.close()
+            self.__fd = None
+
+    def flush(self):
+        "Flush buffered index entries to disk"
+        if self.__fd is not None:
+            self.__fd.flush()
+
+
+class MoniIndex(object):
+    "In-memory index of the sections in a single .moni file"
+
+    def __init__(self, filename):
+        "Create an empty index for 'filename'"
+        self.__filename = filename
+
+        # list of (offset, bean, datestr) in file order
+        self.__entries = []
+        # bean name -> ([datetime, ...], [entry_number, ...]), in time order
+        self.__beans = {}
+
+    def __add(self, offset, bean_name, datestr):
+        "Add a single entry to the in-memory tables"
+        try:
+            when = parse_datetime(datestr)
+        except ValueError:
+            return
+
+        entry_num = len(self.__entries)
+        self.__entries.append((offset, bean_name, datestr))
+
+        if bean_name not in self.__beans:
+            self.__beans[bean_name] = ([], [])
+        times, nums = self.__beans[bean_name]
+
+        if len(times) == 0 or when >= times[-1]:
+            times.append(when)
+            nums.append(entry_num)
+        else:
+            # clocks can step backward; keep the per-bean lists sorted
+            pos = bisect.bisect_right(times, when)
+            times.insert(pos, when)
+            nums.insert(pos, entry_num)
+
+    def __read_index_file(self, path):
+        "Load entries from an index file"
+        with open(path, "r") as fin:
+            for line in fin:
+                flds = line.rstrip("\n").split("\t")
+                if len(flds) != 3:
+                    raise MoniIndexException("Bad line in %s: %s" %
+                                             (path, line.rstrip()))
+                try:
+                    offset = int(flds[0])
+                except ValueError:
+                    raise MoniIndexException("Bad offset in %s: %s" %
+                                             (path, line.rstrip()))
+                self.__add(offset, flds[1], flds[2])
+
+    def __scan(self, start=0):
+        "Yield (offset, bean, datestr) for each section header after 'start'"
+        with open(self.__filename, "rb") as fin:
+            fin.seek(start)
+            offset = start
+            for raw in fin:
+                line = raw.decode("utf-8", "replace").rstrip()
+                mtch = SECTION_PAT.match(line)
+                if mtch is not None:
+                    yield (offset, mtch.group(1), mtch.group(2))
+                offset += len(raw)
+
+    def __extend(self):
+        """
+        Verify that the last loaded entry still matches the .moni file and
+        add any sections written after it.  Return False if the index is
+        stale and must be rebuilt.
+        """
+        last = self.__entries[-1]
+        first = True
+        for entry in self.__scan(last[0]):
+            if first:
+                if entry != last:
+                    return False
+                first = False
+                continue
+            self.__add(*entry)
+        return not first
+
+    @property
+    def beans(self):
+        "Return the list of bean names found in this file"
+        return sorted(self.__beans.keys())
+
+    @property
+    def filename(self):
+        "Return the name of the indexed .moni file"
+        return self.__filename
+
+    def find(self, start=None, end=None, beans=None):
+        """
+        Return a sorted list of offsets for all sections whose bean is in
+        'beans' (or any bean, if 'beans' is None) and whose timestamp lies
+        in the inclusive range ['start', 'end'].  'start' and 'end' may be
+        datetime objects, moni date strings, or None for an open range.
+        """
+        if isinstance(start, str):
+            start = parse_datetime(start)
+        if isinstance(end, str):
+            end = parse_datetime(end)
+
+        if beans is None:
+            names = list(self.__beans.keys())
+        else:
+            names = [x for x in beans if x in self.__beans]
+
+        offsets = []
+        for name in names:
+            times, nums = self.__beans[name]
+            if start is None:
+                lo_idx = 0
+            else:
+                lo_idx = bisect.bisect_left(times, start)
+            if end is None:
+                hi_idx = len(times)
+            else:
+                hi_idx = bisect.bisect_right(times, end)
+            for idx in range(lo_idx, hi_idx):
+                offsets.append(self.__entries[nums[idx]][0])
+
+        offsets.sort()
+        return offsets
+
+    @classmethod
+    def load(cls, filename, save=True):
+        """
+        Return the index for 'filename', reading the sidecar index file if
+        it matches the .moni file and otherwise (re)building it by scanning
+        the .moni file.
+        If 'save' is True, a freshly built index is written to disk.
+        """
+        idx = cls(filename)
+
+        path = index_path(filename)
+        if os.path.exists(path):
+            try:
+                idx.__read_index_file(path)
+            except MoniIndexException:
+                idx = cls(filename)
+            else:
+                if len(idx) > 0 and \
+                   idx.__extend():  # pylint: disable=len-as-condition
+                    return idx
+                idx = cls(filename)
+
+        for entry in idx.__scan():
+            idx.__add(*entry)
+        if save:
+            idx.save()
+        return idx
+
+    @classmethod
+    def __is_being_written(cls, path):
+        "Return True if a MoniIndexWriter has 'path' open"
+        if fcntl is None:
+            return False
+
+        try:
+            fin = open(path, "r")
+        except (IOError, OSError):
+            return False  # no index file
+
+        try:
+            fcntl.flock(fin.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            return True
+        finally:
+            fin.close()
+        return False
+
+    def save(self):
+        """
+        Replace the sidecar file with this index, unless the .moni file is
+        still being written (or the directory is unwritable).  Return True
+        if the index was saved.
+        """
+        path = index_path(self.__filename)
+        if self.__is_being_written(path):
+            return False
+
+        # write a new file so readers never see a partial index
+        tmp_path = "%s.%d" % (path, os.getpid())
+        try:
+            with open(tmp_path, "w") as fout:
+                for entry in self.__entries:
+                    print("%d\t%s\t%s" % entry, file=fout)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.__entries)
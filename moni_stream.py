@@ -10,15 +10,33 @@ Also contains parse_date() which is a method to convert date strings into
 from __future__ import print_function
 
 import ast
-import datetime
 import re
 import sys
 
+from moni_index import MoniIndex
+from timeparse import parse_datetime
+
 CATTIME_PAT = re.compile(r"^([^:]+):\s(\d+-\d+-\d+\s\d+:\d+:\d+\.\d+):\s*$")
 
 
+def __read_sections(filename, offsets):
+    "Yield the lines of each section starting at one of the byte 'offsets'"
+    with open(filename, "rb") as fin:
+        for offset in offsets:
+            fin.seek(offset)
+            first = True
+            for raw in fin:
+                line = raw.decode("utf-8", "replace")
+                if not first and (line.strip() == "" or
+                                  CATTIME_PAT.match(line.rstrip())):
+                    break
+                first = False
+                yield line
+
+
 def moni_stream(filename, fix_values=True, fix_profile=False,
-                ignored_func=None, total_fields=None):
+                ignored_func=None, total_fields=None, start=None, end=None,
+                beans=None):
     """
     Read a pDAQ .moni file and return a stream of tuples containing
     (date_string, category, field, value).
@@ -30,12 +48,22 @@ def moni_stream(filename, fix_values=True, fix_profile=False,
       returns True if this category field should be ignored
     * if a field name is in the 'total_fields' list and the value is a
       dictionary, a 'Total' entry will be added
+    * if 'start', 'end', or 'beans' are specified, only sections for those
+      beans within that (inclusive) time range are returned, using the
+      file's MoniIndex to seek directly to the matching sections
 
     """
+    if start is None and end is None and beans is None:
+        lines = open(filename, "r")
+    else:
+        idx = MoniIndex.load(filename)
+        lines = __read_sections(filename, idx.find(start=start, end=end,
+                                                   beans=beans))
+
     cur_cat = None
     cur_date = None
 
-    for line in open(filename, "r"):
+    for line in lines:
         line = line.rstrip()
 
         if line == "":
@@ -99,12 +127,7 @@ def moni_stream(filename, fix_values=True, fix_profile=False,
 
 def parse_date(datestr):
     "Parse a DAQ moni date string and return a datetime object"
-    date_fmt = "%Y-%m-%d %H:%M:%S.%f"
-    if date_fmt.find(".") > 0:
-        return datetime.datetime.strptime(datestr, date_fmt)
-
-    no_subsec_fmt = "%Y-%m-%d %H:%M:%S"
-    return datetime.datetime.strptime(datestr, no_subsec_fmt)
+    return parse_datetime(datestr)
 
 
 def compute_delta(delta_values, category, field, value):
@@ -135,6 +158,14 @@ def main():
     parser.add_argument("-t", "--total", dest="total_fields", action="append",
                         help=("Names of fields whose dictionary values should"
                               " include a 'Total' field"))
+    parser.add_argument("-b", "--bean", dest="beans", action="append",
+                        help="Only report data from these MBeans")
+    parser.add_argument("-S", "--start", dest="start",
+                        help=("Only report data at or after this time"
+                              " (YYYY-MM-DD HH:MM:SS[.ffffff])"))
+    parser.add_argument("-E", "--end", dest="end",
+                        help=("Only report data at or before this time"
+                              " (YYYY-MM-DD HH:MM:SS[.ffffff])"))
     parser.add_argument("-x", "--debug", dest="debug",
                         action="store_true", default=False,
                         help="Enable debugging")
@@ -171,7 +202,9 @@ def main():
             delta_values = {}
 
         for fields in moni_stream(fname, fix_profile=args.fix_profile,
-                                  total_fields=total_fields):
+                                  total_fields=total_fields,
+                                  start=args.start, end=args.end,
+                                  beans=args.beans):
             datestr, category, field, value = fields
             if prev_date != datestr or prev_cat != category:
                 if first:
@@ -825,6 +825,37 @@ class CmdTest(CmdStdTest):
         return "test"
 
 
+@command
+class CmdTimeline(BaseCmd):
+    @classmethod
+    def add_arguments(cls, parser):
+        from RunTimeline import add_arguments
+        add_arguments(parser)
+
+    @classmethod
+    def cmdtype(cls):
+        return cls.CMDTYPE_FONLY
+
+    @classproperty
+    def description(cls):  # pylint: disable=no-self-argument
+        "One-line description of this subcommand"
+        return "Summarize where run start/stop/switch time was spent"
+
+    @classmethod
+    def is_valid_host(cls, args):
+        "This can be run wherever there are 'daqrunXXXXXX' directories"
+        return True
+
+    @classproperty
+    def name(cls):  # pylint: disable=no-self-argument
+        return "timeline"
+
+    @classmethod
+    def run(cls, args):
+        from RunTimeline import summarize_timelines
+        summarize_timelines(args)
+
+
 @command
 class CmdUpdateLeapseconds(BaseCmd):
     @classmethod
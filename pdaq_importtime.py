@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Measure how long `pdaq` takes to start each subcommand, using Python's
+`-X importtime` option (Python 3.7 or later) to find the slowest imports
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+import pdaq_commands
+
+
+def parse_importtime(text):
+    """
+    Parse `-X importtime` output and return a list of
+    (cumulative_usec, self_usec, module_name) tuples for top-level imports
+    """
+    imports = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        flds = line[12:].split("|")
+        if len(flds) != 3:
+            continue
+
+        try:
+            self_usec = int(flds[0])
+            cumulative = int(flds[1])
+        except ValueError:
+            # skip the header line
+            continue
+
+        name = flds[2].rstrip()
+        if name.startswith("  "):
+            # only report modules which were imported directly
+            continue
+
+        imports.append((cumulative, self_usec, name.strip()))
+
+    return imports
+
+
+def time_command(name, reps=3):
+    """
+    Run `pdaq <name> -h` several times and return a tuple containing the
+    fastest wall-clock time (in seconds) and the parsed import times
+    """
+    pdaq_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "pdaq")
+    cmd = [sys.executable, "-X", "importtime", pdaq_path, name, "-h"]
+
+    best = None
+    imports = None
+    for _ in range(reps):
+        start = time.time()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        _, errtext = proc.communicate()
+        secs = time.time() - start
+
+        if best is None or secs < best:
+            best = secs
+            imports = parse_importtime(errtext)
+
+    return best, imports
+
+
+def main():
+    "Main program"
+
+    import argparse
+
+    names = [cmd.name for cmd in pdaq_commands.COMMANDS]
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num-imports", type=int, dest="num_imports",
+                        default=5,
+                        help="Number of slowest imports to list per command")
+    parser.add_argument("-r", "--repetitions", type=int, dest="reps",
+                        default=3,
+                        help="Number of times to run each command")
+    parser.add_argument("command", nargs="*",
+                        help="Subcommand(s) to time (default: all)")
+    args = parser.parse_args()
+
+    if sys.version_info < (3, 7):
+        raise SystemExit("'-X importtime' requires Python 3.7 or later")
+
+    for name in args.command:
+        if name not in names:
+            parser.error("Unknown command \"%s\"" % (name, ))
+
+    if len(args.command) > 0:  # pylint: disable=len-as-condition
+        commands = args.command
+    else:
+        commands = names
+
+    for name in commands:
+        secs, imports = time_command(name, reps=args.reps)
+        print("%-20s %6.3f secs" % (name, secs))
+        for cumulative, _, modname in sorted(imports,
+                                             reverse=True)[:args.num_imports]:
+            print("    %8.3f  %s" % (cumulative / 1000000.0, modname))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Fast parser for the "YYYY-MM-DD HH:MM:SS[.fraction]" date strings found in
+pDAQ .moni and log files.
+
+Consecutive lines in these files almost always share the same date and
+second, so the parsed date/second prefix is memoized and only the
+fractional part is converted for each string.  Well-formed strings are
+split with fixed-position slices; anything else falls back to strptime().
+"""
+
+from __future__ import print_function
+
+import datetime
+import time
+
+
+BASE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class TimeParser(object):
+    "Parse date strings, memoizing the date/second prefix"
+
+    # maximum number of date/second prefixes to remember
+    MAX_CACHED = 4096
+
+    def __init__(self):
+        # date/second prefix -> [(Y, M, D, h, m, s), epoch_seconds]
+        self.__cache = {}
+
+        # most recently used (prefix, cache entry), stored as a single
+        # tuple so threads sharing this parser never see a mismatched pair
+        self.__last = (None, None)
+
+    @classmethod
+    def __parse_prefix(cls, prefix):
+        "Return a (year, month, day, hour, minute, second) tuple"
+        if len(prefix) == 19 and prefix[4] == "-" and prefix[7] == "-" and \
+           prefix[10] == " " and prefix[13] == ":" and prefix[16] == ":":
+            try:
+                fields = (int(prefix[0:4]), int(prefix[5:7]),
+                          int(prefix[8:10]), int(prefix[11:13]),
+                          int(prefix[14:16]), int(prefix[17:19]))
+            except ValueError:
+                fields = None
+
+            if fields is not None and 1 <= fields[1] <= 12 and \
+               1 <= fields[2] <= 31 and fields[3] <= 23 and \
+               fields[4] <= 59 and fields[5] <= 61:
+                return fields
+
+        return tuple(time.strptime(prefix, BASE_FORMAT)[0:6])
+
+    def __lookup(self, datestr):
+        "Return the cache entry and fractional-second string for 'datestr'"
+        dot = datestr.find(".")
+        if dot < 0:
+            prefix = datestr
+            frac = ""
+        else:
+            prefix = datestr[:dot]
+            frac = datestr[dot + 1:]
+
+        last = self.__last
+        if prefix == last[0]:
+            return last[1], frac
+
+        entry = self.__cache.get(prefix)
+        if entry is None:
+            entry = [self.__parse_prefix(prefix), None]
+            if len(self.__cache) >= self.MAX_CACHED:
+                self.__cache.clear()
+            self.__cache[prefix] = entry
+
+        self.__last = (prefix, entry)
+        return entry, frac
+
+    def datetime(self, datestr):
+        "Return a datetime.datetime object for 'datestr'"
+        entry, frac = self.__lookup(datestr)
+        if frac == "":
+            usec = 0
+        else:
+            usec = int(frac[:6].ljust(6, "0"))
+        year, month, day, hour, minute, second = entry[0]
+        return datetime.datetime(year, month, day, hour, minute, second, usec)
+
+    def epoch(self, datestr):
+        """
+        Return the number of seconds since the epoch for 'datestr',
+        interpreted as local time (like time.mktime(time.strptime(...)))
+        """
+        entry, frac = self.__lookup(datestr)
+        if entry[1] is None:
+            entry[1] = time.mktime(entry[0] + (0, 0, -1))
+        if frac == "":
+            return entry[1]
+        return entry[1] + float(frac) / 10.0 ** len(frac)
+
+    def fields(self, datestr):
+        """
+        Return a tuple containing the year, month, day, hour, minute, and
+        second fields, plus the (possibly empty) string of fractional digits
+        """
+        entry, frac = self.__lookup(datestr)
+        return entry[0] + (frac, )
+
+
+# shared parser used by the module-level functions
+PARSER = TimeParser()
+
+
+def parse_datetime(datestr):
+    "Parse a DAQ date string and return a datetime object"
+    return PARSER.datetime(datestr)
+
+
+def parse_epoch(datestr):
+    "Parse a DAQ date string and return seconds since the epoch"
+    return PARSER.epoch(datestr)
+
+
+def parse_fields(datestr):
+    "Parse a DAQ date string and return its fields (see TimeParser.fields)"
+    return PARSER.fields(datestr)
+
+
+def main():
+    "Benchmark cached parsing against strptime()"
+
+    import argparse
+    import timeit
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, dest="number",
+                        default=100000,
+                        help="Number of date strings to parse")
+    parser.add_argument("-p", "--per-second", type=int, dest="per_second",
+                        default=100,
+                        help="Number of date strings sharing each second")
+    args = parser.parse_args()
+
+    base = datetime.datetime(2021, 7, 13, 12, 0, 0)
+    datestrs = []
+    for idx in range(args.number):
+        now = base + datetime.timedelta(seconds=idx // args.per_second,
+                                        microseconds=idx % 1000000)
+        datestrs.append(str(now))
+
+    def run_strptime():
+        for dstr in datestrs:
+            if dstr.find(".") > 0:
+                datetime.datetime.strptime(dstr, BASE_FORMAT + ".%f")
+            else:
+                datetime.datetime.strptime(dstr, BASE_FORMAT)
+
+    def run_cached():
+        tparse = TimeParser()
+        for dstr in datestrs:
+            tparse.datetime(dstr)
+
+    def run_mktime():
+        for dstr in datestrs:
+            time.mktime(time.strptime(dstr[:19], BASE_FORMAT))
+
+    def run_epoch():
+        tparse = TimeParser()
+        for dstr in datestrs:
+            tparse.epoch(dstr)
+
+    for name, func in (("strptime", run_strptime), ("datetime", run_cached),
+                       ("mktime", run_mktime), ("epoch", run_epoch)):
+        secs = min(timeit.repeat(func, number=1, repeat=3))
+        print("%-8s %8.3f secs  %8.2f usec/string" %
+              (name, secs, secs * 1000000.0 / len(datestrs)))
+
+
+if __name__ == "__main__":
+    main()
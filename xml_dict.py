@@ -45,21 +45,120 @@ def get_value(xdict):
 
 class XMLDict(object):
     def __init__(self, fname):
-        parser = etree.XMLParser(remove_blank_text=True)
-        tree = etree.parse(fname, parser)
+        self.xml_dict, self.encoding = XMLDict.parse(fname)
 
-        root = tree.getroot()
+    @staticmethod
+    def parse(fname):
+        """
+        Incrementally parse an XML file into the dictionary format produced
+        by xml_fmt(), discarding each top-level subtree as soon as it has
+        been converted.  Returns a tuple containing the dictionary and the
+        document encoding.
+        """
+
+        # Only the ends of top-level subtrees are needed, so ask the parser
+        # to report a single tag (that of the root's first child) rather
+        # than generating events for every element in the file
+        # pass open files to the parser so they're closed even if we stop
+        # reading early
+        child_tag = None
+        with open(fname, "rb") as fin:
+            starts = etree.iterparse(fin, events=("start", ))
+            for num, (_, elem) in enumerate(starts):
+                if num == 1:
+                    child_tag = elem.tag
+                    break
+
+        children = {}
+        with open(fname, "rb") as fin:
+            context = etree.iterparse(fin, tag=child_tag,
+                                      remove_blank_text=True)
+            for _, elem in context:
+                root = elem.getparent()
+                if root is None or root.getparent() is not None:
+                    # ignore the root element and nested elements
+                    continue
+
+                # convert this subtree (and any preceding siblings), then
+                # throw it away
+                while True:
+                    kid = root[0]
+                    XMLDict.__add_child(children, kid,
+                                        XMLDict.__fmt_node(kid))
+                    del root[0]
+                    if kid is elem:
+                        break
+
+        root = context.root
+
+        # pick up anything following the final subtree
+        for kid in root:
+            XMLDict.__add_child(children, kid, XMLDict.__fmt_node(kid))
+
+        attribs = dict(list(root.items()))
+        if len(attribs) == 0 and \
+          len(children) == 0:  # pylint: disable=len-as-condition
+            result = root.text
+        else:
+            result = {root.tag: XMLDict.__fmt_body(root, attribs, children)}
+            XMLDict.__add_root_comments(result, root)
+
+        return result, root.getroottree().docinfo.encoding
+
+    @staticmethod
+    def __add_root_comments(xdict, root):
+        "Save any comments preceding the root element"
+        comments = []
+        for prev in root.itersiblings(preceding=True):
+            if prev.tag == Comment:
+                comments.insert(0, prev.text)
+        if len(comments) > 0:  # pylint: disable=len-as-condition
+            xdict['__root_comments__'] = comments
+
+    @staticmethod
+    def __add_child(children, kid, kid_value):
+        "Add a converted child node to an xml_fmt() '__children__' dict"
+        if kid.tag not in children:
+            children[kid.tag] = []
+        if kid_value:
+            if isinstance(kid_value, dict):
+                children[kid.tag].append(kid_value[kid.tag])
+            else:
+                children[kid.tag].append(kid_value)
+
+    @staticmethod
+    def __fmt_body(elem, attribs, children):
+        "Build the xml_fmt() dictionary describing an element's contents"
+        body = {}
+        if len(attribs) > 0:  # pylint: disable=len-as-condition
+            body['__attribs__'] = attribs
+        if elem.text is not None and not elem.text.isspace():
+            body['__contents__'] = elem.text
+        if len(children) > 0:  # pylint: disable=len-as-condition
+            body['__children__'] = children
+        return body
 
-        self.xml_dict = XMLDict.xml_fmt(root)
-        self.encoding = tree.docinfo.encoding
+    @staticmethod
+    def __fmt_node(elem):
+        "Convert an element to the xml_fmt() format, ignoring root comments"
+        attribs = dict(list(elem.items()))
+        if len(attribs) == 0 and \
+          len(elem) == 0:  # pylint: disable=len-as-condition
+            return elem.text
+
+        children = {}
+        for kid in elem:
+            XMLDict.__add_child(children, kid, XMLDict.__fmt_node(kid))
+
+        return {elem.tag: XMLDict.__fmt_body(elem, attribs, children)}
 
     @staticmethod
     def xml_fmt(parent_element):
         """Take an xml element tree and produce a specially formatted
         python dictionary.
 
-        To see how to parse the an xml file and get the element tree root
-        see the __init__ method above
+        To parse an xml file directly into this format, see the parse method
+        above
 
         >>> from StringIO import StringIO
         >>> xml = '<runCfg><domConfigList hub="5">spts-something</domConfigList></runCfg>'
@@ -69,51 +168,12 @@ class XMLDict(object):
         '__contents__': 'spts-something'}]}}}
         """
 
-        ret = {}
-        attribs = dict(list(parent_element.items()))
-
-        # if the parent element has no children,
-        # no attributes and only content, just set it to
-        # be the contents
-        # pylint: disable=len-as-condition
-        if len(attribs) == 0 and \
-          len(parent_element) == 0:  # pylint: disable=len-as-condition
-            return parent_element.text
-        # pylint: enable=len-as-condition
-
-        ret[parent_element.tag] = {}
+        ret = XMLDict.__fmt_node(parent_element)
 
         # if the root element add root comments
-        if parent_element.getroottree().getroot() == parent_element:
-            tmp = []
-            prev = parent_element.getprevious()
-            while prev is not None:
-                if prev.tag == Comment:
-                    tmp.insert(0, prev.text)
-                prev = prev.getprevious()
-            if len(tmp) > 0:  # pylint: disable=len-as-condition
-                ret['__root_comments__'] = tmp
-
-        if len(attribs) > 0:  # pylint: disable=len-as-condition
-            ret[parent_element.tag]['__attribs__'] = attribs
-
-        if parent_element.text is not None and \
-                not parent_element.text.isspace():
-            ret[parent_element.tag]['__contents__'] = parent_element.text
-
-        tmp = {}
-        for child in parent_element:
-            child_dict = XMLDict.xml_fmt(child)
-            if child.tag not in tmp:
-                tmp[child.tag] = []
-            if child_dict:
-                if isinstance(child_dict, dict):
-                    tmp[child.tag].append(child_dict[child.tag])
-                else:
-                    tmp[child.tag].append(child_dict)
-
-        if len(tmp) > 0:  # pylint: disable=len-as-condition
-            ret[parent_element.tag]['__children__'] = tmp
+        if isinstance(ret, dict) and \
+          parent_element.getroottree().getroot() == parent_element:
+            XMLDict.__add_root_comments(ret, parent_element)
 
         return ret
 